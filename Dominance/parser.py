@@ -4,6 +4,8 @@ a control-flow graph of instructions plus an environment mapping variables to
 integer values.
 """
 
+import mmap
+
 from lang import *
 
 
@@ -27,11 +29,33 @@ def line2env(line):
     return env_lang
 
 
+def read_lines(source):
+    """
+    Iterates over the lines of 'source', which can be any iterable of
+    strings, such as a list or a text file, or an object that has a readline
+    method, such as a binary file or an mmap. Lines in bytes are decoded as
+    UTF-8.
+
+    Example:
+        >>> import io
+        >>> list(read_lines(io.BytesIO(b"a = add b c\\nbt a 0\\n")))
+        ['a = add b c\\n', 'bt a 0\\n']
+    """
+    if isinstance(source, mmap.mmap) or (
+        hasattr(source, "readline") and not hasattr(source, "__next__")
+    ):
+        source = iter(source.readline, b"")
+    for line in source:
+        yield line.decode("utf-8") if isinstance(line, bytes) else line
+
+
 def file2cfg_and_env(lines):
     """
     Builds a control-flow graph representation for the strings stored in
-    `lines`. The first string represents the environment. The other strings
-    represent instructions.
+    `lines`, which can be any source accepted by `read_lines`. The first
+    string represents the environment. The other strings represent
+    instructions. Try to build the instructions as the lines are read, so
+    that the program never needs to be in memory as a list of strings.
 
     Example:
         >>> l0 = '{"a": 0, "b": 3}'
@@ -57,6 +81,7 @@ def file2cfg_and_env(lines):
         9
     """
     # TODO: Imlement this method.
-    env = line2env(lines[0])
+    lines = read_lines(lines)
+    env = line2env(next(lines))
     insts = []
     return (env, insts)
@@ -0,0 +1,817 @@
+"""
+This file implements a compact binary format for the programs produced by the
+parser, so that a program can be saved once and loaded again without parsing
+its text. A file has the following layout, with integers in little endian:
+
+    [Header] The magic b"DCFG", the version, and the number of opcodes,
+        variable names and instructions, plus the sizes of the environment
+        and of the instructions.
+    [Opcodes] The mnemonic of each opcode, e.g., "add" or "bt".
+    [Names] Every variable name of the program, stored only once.
+    [Environment] The initial environment, as a JSON dictionary.
+    [Chunks] The offset of every 64th instruction, as a 32-bit integer.
+    [Instructions] One record per instruction.
+
+A record holds the opcode of the instruction, in one byte, followed by four
+fields for a binary instruction: the indices of its three names (dst, src0
+and src1) and its successor; or by three fields for a branch: the index of
+the name of its condition, and its true and false successors. Then come
+the number of predecessors of the instruction, and each predecessor, in the
+order of its list 'preds'. Predecessors are stored as they are, rather than
+rebuilt from the successors, because parsers differ on which edges they
+record there. Fields are varints: seven bits per byte, and the high bit set
+in every byte but the last one. A successor or a predecessor is stored as
+its distance to the instruction right after the record, with the sign in the
+lowest bit, plus one; zero stands for a missing successor. Hence, a
+fall-through edge takes a single byte at each of its ends, and so does every
+name, in programs with less than 128 variables.
+
+Records have different sizes, but the i-th one can be found from the offset
+of its chunk, reading at most 63 records. Hence, `load` can map the file
+into memory and decode instructions only when they are accessed (see
+LazyProgram).
+
+This file does not depend on the parser of the lab: it only needs the
+classes of lang.py. The examples below use a program built by hand (see
+`_example`).
+
+Example:
+    >>> import os, tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), "sum.cfg")
+    >>> env, prog = _example(4)
+    >>> save(path, prog, env)
+    >>> env, prog = load(path)
+    >>> interp(prog[0], env).get("s")
+    10
+"""
+
+import json
+import mmap
+import struct
+
+from lang import (
+    Env,
+    Inst,
+    RegisterFile,
+    Add,
+    Mul,
+    Lth,
+    Geq,
+    Bt,
+    interp,
+    assign_slots,
+)
+
+
+MAGIC = b"DCFG"
+VERSION = 3
+
+_HEADER = struct.Struct("<4sHHIIII")
+_CHUNK = 64
+_OPCODES = {"add": Add, "mul": Mul, "lth": Lth, "geq": Geq, "bt": Bt}
+_MNEMONICS = {cls: name for name, cls in _OPCODES.items()}
+
+
+def _example(n):
+    """
+    A program that adds up the numbers from 1 to 'n' into "s", and its
+    initial environment, built without a parser, for the examples of this
+    file. In the text format, it would read:
+
+        {"zero": 0, "one": 1, "n": n}
+        s = add zero zero
+        i = add zero zero
+        i = add i one
+        s = add s i
+        c = lth i n
+        bt c 2
+        r = add s zero
+    """
+    insts = [
+        Add("s", "zero", "zero"),
+        Add("i", "zero", "zero"),
+        Add("i", "i", "one"),
+        Add("s", "s", "i"),
+        Lth("c", "i", "n"),
+        Bt("c"),
+        Add("r", "s", "zero"),
+    ]
+    for inst, next_inst in zip(insts, insts[1:]):
+        inst.add_next(next_inst)
+    insts[5].add_true_next(insts[2])
+    return (Env({"zero": 0, "one": 1, "n": n}), insts)
+
+
+def _make_env(text, journal=False, slots=None):
+    """
+    The initial environment stored in the JSON dictionary 'text'. It is built
+    like the parser builds the environment in the first line of a program:
+    an Env whose history is given by 'journal' (see lang.Env), or, if a slot
+    table is given, a RegisterFile that uses these slots.
+
+    Example:
+        >>> _make_env('{"a": 1}', journal=True).get("a")
+        1
+        >>> _make_env('{"a": 1}', slots={"b": 0, "a": 1}).regs
+        [None, 1]
+    """
+    bindings = json.loads(text)
+    if slots is not None:
+        return RegisterFile(slots, bindings)
+    env = Env(journal=journal)
+    for var, value in bindings.items():
+        env.set(var, value)
+    return env
+
+
+def _env_dict(env):
+    """
+    The current bindings of an Env or a RegisterFile, as a dictionary.
+
+    Example:
+        >>> _env_dict(RegisterFile({"a": 0, "b": 1}, {"b": 2}))
+        {'b': 2}
+    """
+    if isinstance(env, RegisterFile):
+        return {
+            var: env.regs[slot]
+            for var, slot in env.slots.items()
+            if env.regs[slot] is not None
+        }
+    return dict(env.bindings)
+
+
+def _varint(value, out):
+    """
+    Appends the non-negative integer 'value' to the bytearray 'out', seven
+    bits per byte, from the lowest ones.
+
+    Example:
+        >>> out = bytearray()
+        >>> _varint(5, out); _varint(300, out)
+        >>> bytes(out)
+        b'\\x05\\xac\\x02'
+    """
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(buffer, offset):
+    """
+    Reads a varint written by `_varint` from 'offset' onwards. Returns its
+    value and the offset right after it.
+
+    Example:
+        >>> _read_varint(b'\\x05\\xac\\x02', 1)
+        (300, 3)
+    """
+    value = 0
+    shift = 0
+    while True:
+        byte = buffer[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def _successor(target, i):
+    """
+    The field that stores 'target', the index of a successor of the i-th
+    instruction, or None.
+
+    Example:
+        >>> [_successor(t, 4) for t in [5, 6, 4, None]]
+        [1, 3, 2, 0]
+    """
+    if target is None:
+        return 0
+    delta = target - i - 1
+    return (2 * delta if delta >= 0 else -2 * delta - 1) + 1
+
+
+def _target(field, i):
+    """
+    The index of the successor stored in 'field' by the i-th instruction, or
+    -1, if there is no successor (see `_successor`).
+
+    Example:
+        >>> [_target(f, 4) for f in [1, 3, 2, 0]]
+        [5, 6, 4, -1]
+    """
+    if field == 0:
+        return -1
+    field -= 1
+    return i + 1 + (-(field >> 1) - 1 if field & 1 else field >> 1)
+
+
+def _pack_strings(strings):
+    """
+    Packs each string as its length, a varint, followed by its bytes in
+    UTF-8.
+
+    Example:
+        >>> _pack_strings(["bt", "add"])
+        b'\\x02bt\\x03add'
+    """
+    out = bytearray()
+    for string in strings:
+        data = string.encode("utf-8")
+        _varint(len(data), out)
+        out += data
+    return bytes(out)
+
+
+def _unpack_strings(buffer, offset, count):
+    """
+    Reads 'count' strings packed by `_pack_strings`, from 'offset' onwards.
+    Returns the strings and the offset right after the last one.
+
+    Example:
+        >>> _unpack_strings(b'\\x02bt\\x03add', 0, 2)
+        (['bt', 'add'], 7)
+    """
+    strings = []
+    for _ in range(count):
+        size, offset = _read_varint(buffer, offset)
+        strings.append(bytes(buffer[offset : offset + size]).decode("utf-8"))
+        offset += size
+    return strings, offset
+
+
+def _varints(buffer, start, end):
+    """
+    Reads every varint in buffer[start:end]. As opcodes take a single byte
+    below 128, a sequence of records is also a sequence of varints. Most
+    fields also take a single byte; if all of them do, then the bytes are
+    the values themselves.
+
+    Example:
+        >>> _varints(b'\\x00\\x05\\xac\\x02\\x01', 1, 5)
+        [5, 300, 1]
+    """
+    data = bytes(buffer[start:end])
+    if not data or max(data) < 0x80:
+        return list(data)
+    values = []
+    value = 0
+    shift = 0
+    for byte in data:
+        if byte < 0x80:
+            values.append(value | byte << shift)
+            value = 0
+            shift = 0
+        else:
+            value |= (byte & 0x7F) << shift
+            shift += 7
+    return values
+
+
+def _decode_records(values, first, branches):
+    """
+    Decodes the records in 'values', a list of varints (see `_varints`), the
+    first of which is the record of instruction 'first'. 'branches' is the
+    set of opcodes of branches. Each record becomes a tuple (opcode, a, b, c,
+    d, preds), where a, b and c are the names of a binary instruction and d
+    its successor, or a is the name of the condition of a branch, b and c its
+    successors, and d is -1. Missing successors become -1. 'preds' is the
+    tuple of the indices of the predecessors.
+
+    Example:
+        >>> _decode_records([0, 1, 2, 3, 1, 0, 1, 4, 0, 4, 2, 4, 2], 7, {1})
+        [(0, 1, 2, 3, 8, ()), (1, 4, -1, 7, -1, (7, 8))]
+    """
+    records = []
+    append = records.append
+    i = first
+    k = 0
+    size = len(values)
+    while k < size:
+        op = values[k]
+        if op in branches:
+            a, true_field, false_field = values[k + 1 : k + 4]
+            b = _target(true_field, i)
+            c = _target(false_field, i)
+            d = -1
+            k += 4
+        else:
+            a, b, c, succ = values[k + 1 : k + 5]
+            # Fall-through edges, the most common ones, are decoded inline.
+            d = i + 1 if succ == 1 else _target(succ, i)
+            k += 5
+        num_preds = values[k]
+        fields = values[k + 1 : k + 1 + num_preds]
+        k += 1 + num_preds
+        if num_preds != len(fields):
+            raise ValueError("truncated record")
+        preds = tuple(i - 1 if f == 4 else _target(f, i) for f in fields)
+        append((op, a, b, c, d, preds))
+        i += 1
+    return records
+
+
+def _mnemonic(inst):
+    """
+    The mnemonic of the opcode of 'inst', or None, if it cannot be saved.
+    Subclasses of the instructions, such as those of LazyProgram, share the
+    mnemonic of their base class.
+    """
+    for cls in type(inst).__mro__:
+        if cls in _MNEMONICS:
+            return _MNEMONICS[cls]
+    return None
+
+
+def save(path, insts, env):
+    """
+    Writes the program 'insts', as produced by the parser, and its initial
+    environment 'env', which can be an Env or a RegisterFile, into the file
+    'path'. Every successor of an instruction must be in 'insts'; otherwise,
+    a ValueError is raised.
+
+    Example:
+        >>> import os, tempfile
+        >>> from lang import Env
+        >>> path = os.path.join(tempfile.mkdtemp(), "x.cfg")
+        >>> a = Add("x", "a", "b")
+        >>> a.add_next(Add("y", "x", "x"))
+        >>> save(path, [a], Env({"a": 1, "b": 2}))
+        Traceback (most recent call last):
+        ...
+        ValueError: successor of instruction 0 is not in the program
+    """
+    index = {id(inst): i for i, inst in enumerate(insts)}
+    names = {}
+    opcodes = {}
+    classes = {}
+    values = []
+    starts = []
+    for i, inst in enumerate(insts):
+        if i % _CHUNK == 0:
+            starts.append(len(values))
+        kind = classes.get(type(inst))
+        if kind is None:
+            mnemonic = _mnemonic(inst)
+            if mnemonic is None:
+                raise ValueError(f"cannot save a {type(inst).__name__} instruction")
+            op = opcodes.setdefault(mnemonic, len(opcodes))
+            kind = classes[type(inst)] = (op, mnemonic == "bt")
+        op, is_branch = kind
+        if is_branch:
+            variables = (inst.cond,)
+            targets = inst.nexts
+        else:
+            if inst.more_nexts:
+                raise ValueError(f"instruction {i} has more than one successor")
+            variables = (inst.dst, inst.src0, inst.src1)
+            targets = (inst.next_inst,)
+        values.append(op)
+        for var in variables:
+            n = names.get(var)
+            if n is None:
+                n = names[var] = len(names)
+            values.append(n)
+        for target in targets:
+            if target is None:
+                values.append(0)
+                continue
+            t = index.get(id(target))
+            if t is None:
+                raise ValueError(f"successor of instruction {i} is not in the program")
+            # The same field as `_successor(t, i)`, without the call.
+            delta = t - i - 1
+            values.append(2 * delta + 1 if delta >= 0 else -2 * delta)
+        values.append(len(inst.preds))
+        for pred in inst.preds:
+            t = index.get(id(pred))
+            if t is None:
+                raise ValueError(f"predecessor of instruction {i} is not in the program")
+            delta = t - i - 1
+            values.append(2 * delta + 1 if delta >= 0 else -2 * delta)
+
+    # Most programs have less than 128 names, and fall through most of the
+    # time, so every field usually fits in a single byte.
+    if not values or max(values) < 0x80:
+        records = bytes(values)
+        chunks = starts
+    else:
+        records = bytearray()
+        offsets = []
+        for value in values:
+            offsets.append(len(records))
+            _varint(value, records)
+        chunks = [offsets[start] for start in starts]
+
+    env_data = json.dumps(_env_dict(env)).encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(
+            _HEADER.pack(
+                MAGIC,
+                VERSION,
+                len(opcodes),
+                len(names),
+                len(insts),
+                len(env_data),
+                len(records),
+            )
+        )
+        f.write(_pack_strings(opcodes))
+        f.write(_pack_strings(names))
+        f.write(env_data)
+        f.write(struct.pack(f"<{len(chunks)}I", *chunks))
+        f.write(records)
+
+
+class LazyProgram:
+    """
+    A read-only list of instructions that are decoded from the records of a
+    binary program only when they are accessed. Reading an instruction
+    decodes its record alone; its successors and predecessors are decoded
+    the first time that one of them is read, through 'next_inst', 'nexts' or
+    'preds'. Until then, the instruction belongs to a subclass of its class,
+    whose fields do the decoding; once its neighbours are linked, it goes
+    back to its own class, so that running the program costs the same as
+    running a parsed one. Thus, interpreting a program decodes only the instructions
+    that run. The records of a chunk (see the format) are read together, the
+    first time that one of them is needed. Decoded instructions are kept, so
+    that each record is decoded at most once.
+
+    IDs are reserved for every instruction when the program is opened, and
+    each instruction receives the one of its record, as in the parser,
+    whatever the order in which instructions are decoded. The predecessors
+    of an instruction are those of the program that was saved, in the same
+    order, whichever edges the parser recorded there.
+
+    The file is mapped into memory while the program is open. It must be
+    closed (see `close`) once it is no longer needed; the instructions that
+    were decoded and linked can still be used afterwards.
+
+    Example:
+        >>> import os, tempfile
+        >>> _, prog = _example(4)
+        >>> path = os.path.join(tempfile.mkdtemp(), "sum.cfg")
+        >>> save(path, prog, Env())
+        >>> _, lazy = load(path, lazy=True)
+        >>> len(lazy), lazy.num_decoded()
+        (7, 0)
+        >>> lazy[6].dst, lazy.num_decoded()
+        ('r', 1)
+        >>> lazy[5].nexts[0] is lazy[2], lazy.num_decoded()
+        (True, 4)
+        >>> [pred.ID - lazy[2].ID for pred in lazy[2].preds]
+        [-1, 3]
+        >>> lazy[2].ID - lazy[6].ID
+        -4
+        >>> lazy.close()
+        >>> lazy[0]
+        Traceback (most recent call last):
+        ...
+        ValueError: the program is closed
+    """
+
+    def __init__(s, buffer, offset, size, chunks, count, opcodes, names):
+        s.buffer = buffer
+        s.offset = offset
+        s.size = size
+        s.chunks = chunks
+        s.opcodes = [_OPCODES[mnemonic] for mnemonic in opcodes]
+        s.branches = {op for op, cls in enumerate(s.opcodes) if cls is Bt}
+        s.names = names
+        s.insts = [None] * count
+        s.records = {}
+        s.unlinked = {}
+        s.lazy_classes = None
+        s.first_ID = Inst.next_index
+        Inst.next_index += count
+
+    def __len__(s):
+        return len(s.insts)
+
+    def __iter__(s):
+        for i in range(len(s.insts)):
+            yield s[i]
+
+    def __getitem__(s, i):
+        if isinstance(i, slice):
+            return [s[k] for k in range(*i.indices(len(s.insts)))]
+        if i < 0:
+            i += len(s.insts)
+        if not 0 <= i < len(s.insts):
+            raise IndexError("instruction index out of range")
+        inst = s.insts[i]
+        if inst is None:
+            inst = s._create(i, s._record(i))
+        return inst
+
+    def __enter__(s):
+        return s
+
+    def __exit__(s, *exc):
+        s.close()
+
+    def close(s):
+        """
+        Unmaps the file. Instructions that were not decoded, or whose
+        successors were not linked, can no longer be read.
+        """
+        if isinstance(s.buffer, mmap.mmap):
+            s.buffer.close()
+        s.buffer = None
+        s.records = {}
+
+    def num_decoded(s):
+        """
+        The number of instructions decoded so far.
+        """
+        return sum(inst is not None for inst in s.insts)
+
+    def decode_all(s):
+        """
+        Decodes every instruction that is not decoded yet, and links every
+        instruction to its successors. Returns the list of all the
+        instructions. If nothing was decoded yet, then the records are read
+        in one pass, and instructions are created without the lazy classes.
+        """
+        if s.buffer is None:
+            raise ValueError("the program is closed")
+        if all(inst is None for inst in s.insts):
+            values = _varints(s.buffer, s.offset, s.offset + s.size)
+            s._build(_decode_records(values, 0, s.branches))
+        else:
+            for i in range(len(s.insts)):
+                s[i]
+            for inst in list(s.insts):
+                if id(inst) in s.unlinked:
+                    s._link_lazy(inst)
+        s.records = {}
+        return list(s.insts)
+
+    def _record(s, i):
+        """
+        The record of the i-th instruction. The records of its chunk are
+        decoded and kept, as the neighbours of an instruction are likely to
+        be needed next.
+        """
+        record = s.records.get(i)
+        if record is None:
+            if s.buffer is None:
+                raise ValueError("the program is closed")
+            chunk = i // _CHUNK
+            first = chunk * _CHUNK
+            start = s.offset + s.chunks[chunk]
+            if chunk + 1 < len(s.chunks):
+                end = s.offset + s.chunks[chunk + 1]
+            else:
+                end = s.offset + s.size
+            values = _varints(s.buffer, start, end)
+            records = _decode_records(values, first, s.branches)
+            s.records.update(zip(range(first, first + len(records)), records))
+            record = s.records[i]
+        return record
+
+    def _build(s, records):
+        """
+        Creates every instruction, from the list of all the 'records', and
+        links them, without the lazy classes. The instructions are allocated
+        without calling their constructors, which would take most of the time
+        of a load, and their fields are filled in directly.
+        """
+        insts = s.insts
+        names = s.names
+        opcodes = s.opcodes
+        branches = s.branches
+        for i, (op, a, b, c, _, _) in enumerate(records, s.first_ID):
+            cls = opcodes[op]
+            inst = cls.__new__(cls)
+            inst.ID = i
+            if op in branches:
+                inst.cond = names[a]
+            else:
+                inst.dst = names[a]
+                inst.src0 = names[b]
+                inst.src1 = names[c]
+                inst.more_nexts = None
+            insts[i - s.first_ID] = inst
+        for inst, (op, _, b, c, d, preds) in zip(insts, records):
+            if op in branches:
+                inst.nexts = [
+                    insts[b] if b >= 0 else None,
+                    insts[c] if c >= 0 else None,
+                ]
+            else:
+                inst.next_inst = insts[d] if d >= 0 else None
+            inst.preds = [insts[j] for j in preds]
+
+    def _create(s, i, record):
+        """
+        Creates the i-th instruction, without successors, and gives it the
+        ID reserved for it. The instruction is lazy: it links its successors
+        when they are first read.
+        """
+        op, a, b, c, _, _ = record
+        cls = s.opcodes[op]
+        names = s.names
+        next_index = Inst.next_index
+        if cls is Bt:
+            inst = Bt(names[a])
+        else:
+            inst = cls(names[a], names[b], names[c])
+        Inst.next_index = next_index
+        inst.ID = s.first_ID + i
+        if s.lazy_classes is None:
+            s.lazy_classes = _lazy_classes(s)
+        inst.__class__ = s.lazy_classes[cls]
+        s.unlinked[id(inst)] = i
+        s.insts[i] = inst
+        return inst
+
+    def _link_lazy(s, inst):
+        """
+        Links the lazy instruction 'inst' to its successors and to its
+        predecessors, decoding them if needed, and turns it back into an
+        instruction of its own class. The neighbours are decoded first, so
+        that 'inst' stays lazy if they cannot be.
+        """
+        op, _, b, c, d, preds = s._record(s.unlinked[id(inst)])
+        if op in s.branches:
+            true_dst = s[b] if b >= 0 else None
+            false_dst = s[c] if c >= 0 else None
+        else:
+            next_inst = s[d] if d >= 0 else None
+        pred_insts = [s[j] for j in preds]
+        del s.unlinked[id(inst)]
+        inst.__class__ = type(inst).__mro__[1]
+        if op in s.branches:
+            inst.nexts[0] = true_dst
+            inst.nexts[1] = false_dst
+        else:
+            inst.next_inst = next_inst
+        inst.preds = pred_insts
+
+
+def _lazy_classes(program):
+    """
+    Creates, for each class of instruction in the LazyProgram 'program', a
+    subclass whose successor field and 'preds' link the neighbours of the
+    instruction the first time that one of them is read or written. The
+    subclasses have no slots of their own, so that an instruction can switch
+    between its class and the subclass.
+    """
+
+    def lazy_field(field):
+        def getter(inst):
+            program._link_lazy(inst)
+            return getattr(inst, field)
+
+        def setter(inst, value):
+            program._link_lazy(inst)
+            setattr(inst, field, value)
+
+        return property(getter, setter)
+
+    classes = {}
+    for cls in set(program.opcodes):
+        successors = "nexts" if cls is Bt else "next_inst"
+        attrs = {
+            "__slots__": (),
+            successors: lazy_field(successors),
+            "preds": lazy_field("preds"),
+        }
+        classes[cls] = type("Lazy" + cls.__name__, (cls,), attrs)
+    return classes
+
+
+def load(path, journal=False, slots=False, lazy=False):
+    """
+    Reads a program written by `save` from the file 'path'. Returns the
+    initial environment and the list of instructions, like
+    the parser, whose arguments 'journal' and 'slots' have the same meaning
+    here. If 'lazy' is true, then the file is mapped into memory
+    and the list is a LazyProgram, which should be closed once the program
+    has run; otherwise, every instruction is decoded at once. Assigning slots
+    decodes the whole program. A ValueError is raised if the file is not a
+    program in this format.
+
+    Example:
+        >>> import os, tempfile
+        >>> path = os.path.join(tempfile.mkdtemp(), "x.cfg")
+        >>> save(path, *reversed(_example(3)))
+        >>> env, prog = load(path, slots=True, lazy=True)
+        >>> with prog:
+        ...     interp(prog[0], env).get("s"), type(env).__name__
+        (6, 'RegisterFile')
+
+        >>> with open(path, "wb") as f:
+        ...     _ = f.write(b"{}")
+        >>> load(path)
+        Traceback (most recent call last):
+        ...
+        ValueError: not a binary program: x.cfg
+    """
+    import os
+
+    name = os.path.basename(path)
+    with open(path, "rb") as f:
+        if lazy:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            buffer = f.read()
+    try:
+        if len(buffer) < _HEADER.size or buffer[:4] != MAGIC:
+            raise ValueError(f"not a binary program: {name}")
+        header = _HEADER.unpack_from(buffer)
+        _, version, num_opcodes, num_names, count, env_size, size = header
+        if version != VERSION:
+            raise ValueError(f"unsupported version {version} of the binary format")
+        opcodes, offset = _unpack_strings(buffer, _HEADER.size, num_opcodes)
+        for mnemonic in opcodes:
+            if mnemonic not in _OPCODES:
+                raise ValueError(f"unknown opcode {mnemonic!r} in {name}")
+        names, offset = _unpack_strings(buffer, offset, num_names)
+        env_text = bytes(buffer[offset : offset + env_size]).decode("utf-8")
+        offset += env_size
+        num_chunks = (count + _CHUNK - 1) // _CHUNK
+        if len(buffer) < offset + 4 * num_chunks + size:
+            raise ValueError(f"truncated binary program: {name}")
+        chunks = struct.unpack_from(f"<{num_chunks}I", buffer, offset)
+        offset += 4 * num_chunks
+        insts = LazyProgram(buffer, offset, size, chunks, count, opcodes, names)
+        if not lazy:
+            insts = insts.decode_all()
+        env = _make_env(env_text, journal, assign_slots(list(insts)) if slots else None)
+    except BaseException:
+        if lazy:
+            buffer.close()
+        raise
+    return (env, insts)
+
+
+def _pred_offsets(insts):
+    """
+    Lists the predecessors of each instruction in 'insts', as offsets within
+    the program, in the order in which the instruction stores them.
+
+    Example:
+        >>> env, prog = _example(2)
+        >>> _pred_offsets(prog)
+        [[], [0], [1, 5], [2], [3], [4], [5]]
+    """
+    first_ID = insts[0].ID if insts else 0
+    return [[pred.ID - first_ID for pred in inst.preds] for inst in insts]
+
+
+def roundtrip(insts, env, binary_path):
+    """
+    Saves the program 'insts', whose initial environment is 'env', into
+    'binary_path', and checks that the program loaded from the binary file,
+    both eagerly and lazily, has the same predecessors as 'insts' and that
+    interpreting it produces the same environment as interpreting 'insts'.
+    Returns the final bindings.
+
+    Example:
+        >>> import os, tempfile
+        >>> out = os.path.join(tempfile.mkdtemp(), "prog.cfg")
+        >>> env, prog = _example(5)
+        >>> roundtrip(prog, env, out)["s"]
+        15
+
+    Every program in the tests folder survives the round trip:
+        >>> import glob
+        >>> from parser import file2cfg_and_env
+        >>> for name in sorted(glob.glob("tests/*.txt")):
+        ...     with open(name) as f:
+        ...         env, prog = file2cfg_and_env(f)
+        ...     _ = roundtrip(prog, env, out)
+    """
+    save(binary_path, insts, env)
+    expected_preds = _pred_offsets(insts)
+    expected = interp(insts[0], env).bindings if insts else env.bindings
+    for lazy in [False, True]:
+        env, prog = load(binary_path, lazy=lazy)
+        result = interp(prog[0], env).bindings if prog else env.bindings
+        if lazy:
+            lazy_prog, prog = prog, prog.decode_all()
+            lazy_prog.close()
+        preds = _pred_offsets(prog)
+        if preds != expected_preds:
+            raise ValueError(f"{binary_path}: {preds} != {expected_preds}")
+        if result != expected:
+            raise ValueError(f"{binary_path}: {result} != {expected}")
+    return expected
+
+
+if __name__ == "__main__":
+    """
+    Converts a program from the text format into the binary format, e.g.:
+    "python3 cfgfile.py tests/fib.txt fib.cfg".
+    """
+    import sys
+
+    from parser import file2cfg_and_env
+
+    with open(sys.argv[1]) as f:
+        env, prog = file2cfg_and_env(f)
+    save(sys.argv[2], prog, env)
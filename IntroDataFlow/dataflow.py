@@ -178,6 +178,74 @@ class ReachingDefs_Bt_OUT_Eq(OUT_Eq):
         return f"{self.name()}: {gen_set}{kill_set}"
 
 
+class ReachingDefs_Block_OUT_Eq(OUT_Eq):
+    """
+    This concrete class implements the equations that affect OUT facts of the
+    reaching-definitions analysis for basic blocks (see lang.basic_blocks). A
+    block generates the last definition of each variable that it defines, and
+    kills any other definition of these variables.
+    """
+
+    def gen_set(self):
+        """
+        The definitions that reach the end of the block. Ex.:
+            >>> from lang import Add, basic_blocks
+            >>> Inst.next_index = 0
+            >>> i0 = Add('x', 'a', 'b')
+            >>> i1 = Add('y', 'x', 'b')
+            >>> i2 = Add('x', 'x', 'y')
+            >>> i0.add_next(i1)
+            >>> i1.add_next(i2)
+            >>> df = ReachingDefs_Block_OUT_Eq(basic_blocks([i0, i1, i2])[0])
+            >>> sorted(df.gen_set())
+            [('x', 2), ('y', 1)]
+        """
+        gen = {}
+        for inst in self.inst.insts:
+            for v in inst.definition():
+                gen[v] = inst.ID
+        return set(gen.items())
+
+    def eval_aux(self, data_flow_env):
+        """
+        Evaluates this equation, where:
+        OUT[b] = gen(b) + (IN[b] - kill(b))
+
+        Example:
+            >>> from lang import Add, basic_blocks
+            >>> Inst.next_index = 0
+            >>> i0 = Add('x', 'a', 'b')
+            >>> i1 = Add('x', 'x', 'b')
+            >>> i0.add_next(i1)
+            >>> df = ReachingDefs_Block_OUT_Eq(basic_blocks([i0, i1])[0])
+            >>> sorted(df.eval_aux({'IN_0': {('x', 5), ('y', 2)}}))
+            [('x', 1), ('y', 2)]
+        """
+        gen = self.gen_set()
+        kill = {v for (v, _) in gen}
+        in_set = data_flow_env[name_in(self.inst.ID)]
+        new_set = {(v, p) for (v, p) in in_set if v not in kill}
+        return new_set.union(gen)
+
+    def __str__(self):
+        """
+        A string representation of a reaching-defs equation representing a
+        basic block. Eg.:
+            >>> from lang import Add, basic_blocks
+            >>> Inst.next_index = 0
+            >>> i0 = Add('x', 'a', 'b')
+            >>> i1 = Add('y', 'x', 'b')
+            >>> i0.add_next(i1)
+            >>> df = ReachingDefs_Block_OUT_Eq(basic_blocks([i0, i1])[0])
+            >>> str(df)
+            'OUT_0: (x, 0), (y, 1) + (IN_0 - (x, _), (y, _))'
+        """
+        gen = sorted(self.gen_set())
+        gen_set = ", ".join(f"({v}, {p})" for (v, p) in gen)
+        kill_set = ", ".join(f"({v}, _)" for (v, _) in gen)
+        return f"{self.name()}: {gen_set} + ({name_in(self.inst.ID)} - {kill_set})"
+
+
 class ReachingDefs_IN_Eq(IN_Eq):
     """
     This concrete class implements the meet operation for reaching-definition
@@ -316,6 +384,37 @@ def reaching_defs_constraint_gen(insts):
     return in0 + in1 + out
 
 
+def reaching_defs_block_constraint_gen(blocks):
+    """
+    Builds a list of equations to solve Reaching-Definition Analysis for the
+    given list of basic blocks. There are two equations per block, rather than
+    two per instruction. The OUT set of a block is the OUT set of its last
+    instruction in the instruction-level analysis.
+
+    Example:
+        >>> from lang import Add, Lth, basic_blocks
+        >>> Inst.next_index = 0
+        >>> i0 = Add('x', 'a', 'b')
+        >>> i1 = Add('c', 'x', 'b')
+        >>> i2 = Lth('d', 'c', 'b')
+        >>> i3 = Add('c', 'x', 'x')
+        >>> i0.add_next(i1)
+        >>> i1.add_next(i2)
+        >>> i2.add_next(i3)
+        >>> i3.add_next(i1)
+        >>> blocks = basic_blocks([i0, i1, i2, i3])
+        >>> eqs = reaching_defs_block_constraint_gen(blocks)
+        >>> [str(eq) for eq in eqs][1]
+        'OUT_1: (c, 3), (d, 2) + (IN_1 - (c, _), (d, _))'
+        >>> sol = abstract_interp(eqs)
+        >>> sorted(sol['OUT_1'])
+        [('c', 3), ('d', 2), ('x', 0)]
+    """
+    out = [ReachingDefs_Block_OUT_Eq(block) for block in blocks]
+    ins = [ReachingDefs_IN_Eq(block) for block in blocks]
+    return out + ins
+
+
 def liveness_constraint_gen(insts: list[Inst]) -> list[DataFlowEq]:
     """
     Builds a list of liness-analysis equations extracted from the instructions
@@ -335,6 +434,44 @@ def liveness_constraint_gen(insts: list[Inst]) -> list[DataFlowEq]:
     return []
 
 
+def liveness_block_constraint_gen(blocks):
+    """
+    Builds a list of liveness-analysis equations for the given list of basic
+    blocks. There are two equations per block, rather than two per
+    instruction. A block exposes the same `uses` and `definition` methods as
+    an instruction: its uses are the variables that it reads before defining
+    them, and its definitions are all the variables that it writes. Hence,
+    the equations of `liveness_constraint_gen` also hold for blocks: the IN
+    set of a block is the IN set of its first instruction in the
+    instruction-level analysis, and its OUT set is the OUT set of its last
+    instruction.
+
+    Example:
+        >>> from lang import Add, Lth, basic_blocks
+        >>> Inst.next_index = 0
+        >>> i0 = Add('x', 'a', 'b')
+        >>> i1 = Add('x', 'x', 'c')
+        >>> i2 = Lth('x', 'x', 'a')
+        >>> i3 = Bt('x')
+        >>> i4 = Add('y', 'a', 'a')
+        >>> i0.add_next(i1)
+        >>> i1.add_next(i2)
+        >>> i2.add_next(i3)
+        >>> i3.add_true_next(i1)
+        >>> i3.add_next(i4)
+        >>> eqs = liveness_block_constraint_gen(basic_blocks([i0, i1, i2, i3, i4]))
+        >>> for eq in eqs[:4]:
+        ...     print(eq)
+        IN_0: (OUT_0 - {'x'}) + ['a', 'b']
+        IN_1: (OUT_1 - {'x'}) + ['a', 'c', 'x']
+        IN_4: (OUT_4 - {'y'}) + ['a']
+        OUT_0: Union( IN_1 )
+    """
+    ins = [LivenessAnalysisIN_Eq(block) for block in blocks]
+    outs = [LivenessAnalysisOUT_Eq(block) for block in blocks]
+    return ins + outs
+
+
 def abstract_interp(equations):
     """
     This function iterates on the equations, solving them in the order in which
@@ -1,6 +1,6 @@
 import sys
 import lang
-import parser
+import batch
 import dataflow
 
 from lang import interp
@@ -34,6 +34,17 @@ def print_instructions(instructions):
         print(inst)
 
 
+def analyse(env, program):
+    """
+    Runs liveness analysis on the program, and checks if every variable that
+    is alive at the beginning of the program is defined in the environment.
+    """
+    equations = dataflow.liveness_constraint_gen(program)
+    df_env = dataflow.abstract_interp(equations)
+    init_in = df_env[dataflow.name_in(program[0].ID)]
+    check_environment(env, init_in)
+
+
 if __name__ == "__main__":
     """
     If you want to see the program, you can use the function call
@@ -44,11 +55,15 @@ if __name__ == "__main__":
         >>> l3 = 'x = add x z'
         >>> _, program = file2cfg_and_env([l0, l1, l2, l3])
         >>> print_instructions(program)
+
+    The option "--cache=DIR" keeps parsed programs in the directory DIR (see
+    parsecache.py), and "--no-cache" turns it off again.
     """
+    args, cache_dir = batch.cache_option(sys.argv[1:])
+    if args:
+        sys.exit(1 if batch.run_batch(args, analyse, cache_dir=cache_dir) else 0)
     lang.Inst.next_index = 0
-    lines = sys.stdin.readlines()
-    env, program = parser.file2cfg_and_env(lines)
-    equations = dataflow.liveness_constraint_gen(program)
-    df_env = dataflow.abstract_interp(equations)
-    init_in = df_env[dataflow.name_in(program[0].ID)]
-    check_environment(env, init_in)
+    env, program = batch.parse_program(sys.stdin, cache_dir)
+    analyse(env, program)
+    if cache_dir is not None:
+        print(batch.parse_cache(cache_dir).stats(), file=sys.stderr)
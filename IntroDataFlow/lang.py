@@ -1,10 +1,11 @@
 """
 This file contains the implementation of a simple interpreter of low-level
 instructions. The interpreter takes a program, represented as its first
-instruction, plus an environment, which is a stack of bindings. Bindings are
-pairs of variable names and values. New bindings are added to the stack
-whenever new variables are defined. Bindings are never removed from the stack.
-In this way, we can inspect the history of state transformations caused by the
+instruction, plus an environment, which maps variable names to values. The
+environment can also keep a journal: a stack of bindings. Bindings are pairs
+of variable names and values. New bindings are added to the stack whenever
+new variables are defined. Bindings are never removed from the stack. In this
+way, we can inspect the history of state transformations caused by the
 interpretation of a program.
 
 This file uses doctests all over. To test it, just run python 3 as follows:
@@ -18,9 +19,17 @@ from abc import ABC, abstractmethod
 
 class Env:
     """
-    A table that associates variables with values. The environment is
-    implemented as a stack, so that previous bindings of a variable V remain
-    available in the environment if V is overassigned.
+    A table that associates variables with values. The current binding of
+    each variable is kept in a dictionary, so that reading and updating a
+    variable takes constant time. The 'journal' argument selects how much of
+    the history of bindings the environment keeps:
+
+        False: only the current binding of each variable (the default).
+        True: every binding is pushed onto a stack, so that previous bindings
+            of a variable V remain available if V is overassigned.
+        K, a positive integer: the last K bindings of each variable are kept
+            in a ring buffer, so that memory does not grow with the number of
+            assignments.
 
     Example:
         >>> e = Env()
@@ -33,19 +42,40 @@ class Env:
         >>> e.set("a", 2)
         >>> e.get("a") + e.get("b")
         7
+
+        >>> e = Env({"a": 1}, journal=True)
+        >>> e.set("b", 2)
+        >>> e.set("a", 3)
+        >>> list(e.journal)
+        [('a', 3), ('b', 2), ('a', 1)]
+
+        >>> e = Env({"a": 1}, journal=2)
+        >>> for i in range(2, 100):
+        ...     e.set("a", i)
+        >>> e.history("a")
+        [99, 98]
     """
 
-    def __init__(s, initial_args={}):
-        s.env = deque()
+    def __init__(s, initial_args={}, journal=False):
+        s.bindings = {}
+        s.journal = None
+        s.rings = None
+        if journal is True:
+            s.journal = deque()
+        elif journal is not False:
+            if journal < 1:
+                raise ValueError(f"Invalid history size {journal}")
+            s.rings = {}
+            s.ring_size = journal
         for var, value in initial_args.items():
-            s.env.appendleft((var, value))
+            s.set(var, value)
 
     def get(self, var):
         """
-        Finds the first occurrence of variable 'var' in the environment stack,
-        and returns the value associated with it.
+        Finds the current binding of variable 'var' in the environment, and
+        returns the value associated with it.
         """
-        val = next((value for (e_var, value) in self.env if e_var == var), None)
+        val = self.bindings.get(var)
         if val is not None:
             return val
         else:
@@ -53,20 +83,189 @@ class Env:
 
     def set(s, var, value):
         """
-        This method adds 'var' to the environment, by placing the binding
-        '(var, value)' onto the top of the environment stack.
+        This method binds 'var' to 'value' in the environment. The binding is
+        moved to the end of the dictionary, so that the dictionary is ordered
+        from the oldest to the newest binding. If the environment keeps a
+        journal, then the binding '(var, value)' is also placed onto the top
+        of the journal stack. If it keeps ring buffers, then 'value' is placed
+        onto the ring of 'var', pushing the oldest value out if it is full.
+        """
+        s.bindings.pop(var, None)
+        s.bindings[var] = value
+        if s.journal is not None:
+            s.journal.appendleft((var, value))
+        elif s.rings is not None:
+            ring = s.rings.get(var)
+            if ring is None:
+                ring = s.rings[var] = deque(maxlen=s.ring_size)
+            ring.appendleft(value)
+
+    def history(s, var):
         """
-        s.env.appendleft((var, value))
+        Returns the values that 'var' has had, from the newest to the oldest,
+        as far as the environment remembers them.
+
+        Example:
+            >>> e = Env({"a": 1, "b": 2}, journal=True)
+            >>> e.set("a", 3)
+            >>> e.history("a"), e.history("c")
+            ([3, 1], [])
+
+            >>> e = Env({"a": 1, "b": 2})
+            >>> e.set("a", 3)
+            >>> e.history("a")
+            [3]
+        """
+        if s.journal is not None:
+            return [value for (v, value) in s.journal if v == var]
+        if s.rings is not None:
+            return list(s.rings.get(var, ()))
+        return [s.bindings[var]] if var in s.bindings else []
 
     def dump(s):
         """
-        Prints the contents of the environment. This method is mostly used for
-        debugging purposes.
+        Prints the contents of the environment, from the newest to the oldest
+        binding. If the environment keeps a journal, then all the bindings in
+        the history are printed. If it keeps ring buffers, then the bindings
+        are grouped by variable. Otherwise, only the current bindings are
+        printed. This method is mostly used for debugging purposes.
+
+        Example:
+            >>> e = Env({"a": 1}, journal=True)
+            >>> e.set("a", 2)
+            >>> e.dump()
+            a: 2
+            a: 1
+
+            >>> e = Env({"a": 1, "b": 2})
+            >>> e.set("a", 3)
+            >>> e.dump()
+            a: 3
+            b: 2
+
+            >>> e = Env({"a": 1, "b": 2}, journal=2)
+            >>> e.set("a", 3)
+            >>> e.set("a", 4)
+            >>> e.dump()
+            a: 4
+            a: 3
+            b: 2
         """
-        for var, value in s.env:
+        if s.journal is not None:
+            bindings = s.journal
+        elif s.rings is not None:
+            bindings = [
+                (var, value) for var in reversed(s.bindings) for value in s.rings[var]
+            ]
+        else:
+            bindings = reversed(s.bindings.items())
+        for var, value in bindings:
             print(f"{var}: {value}")
 
 
+class RegisterFile:
+    """
+    An environment where the values of variables are stored in a flat list of
+    registers. Each variable is identified by its slot: a dense integer index
+    into this list. Slots are assigned once per program by `assign_slots`, so
+    that the interpreter does not need to hash variable names while it runs.
+    Variables that are not yet in the slot table receive a new slot when the
+    register file is created.
+
+    Example:
+        >>> r = RegisterFile({"a": 0, "b": 1}, {"b": 5, "c": 1})
+        >>> r.set("a", 2)
+        >>> r.get("a") + r.get("b")
+        7
+        >>> r.regs
+        [2, 5, 1]
+        >>> r.slots["c"]
+        2
+    """
+
+    def __init__(s, slots, initial_args={}):
+        s.slots = slots
+        for var in initial_args:
+            slot_of(slots, var)
+        s.regs = [None] * len(slots)
+        for var, value in initial_args.items():
+            s.set(var, value)
+
+    def get(s, var):
+        """
+        Returns the value stored in the register of variable 'var'.
+        """
+        slot = s.slots.get(var)
+        val = s.regs[slot] if slot is not None else None
+        if val is not None:
+            return val
+        else:
+            raise LookupError(f"Absent key {var}")
+
+    def set(s, var, value):
+        """
+        Stores 'value' in the register of variable 'var'.
+        """
+        slot = s.slots.get(var)
+        if slot is None:
+            raise LookupError(f"Variable {var} has no slot")
+        s.regs[slot] = value
+
+    def dump(s):
+        """
+        Prints the variables that have a value, in the order of their slots.
+        This method is mostly used for debugging purposes.
+
+        Example:
+            >>> r = RegisterFile({"a": 0, "b": 1, "c": 2}, {"a": 1, "c": 3})
+            >>> r.dump()
+            a: 1
+            c: 3
+        """
+        for var, slot in s.slots.items():
+            if s.regs[slot] is not None:
+                print(f"{var}: {s.regs[slot]}")
+
+
+def slot_of(slots, var):
+    """
+    Returns the slot of variable 'var' in the table 'slots', creating a new
+    slot, at the end of the table, if 'var' is not there yet.
+
+    Example:
+        >>> slots = {"a": 0}
+        >>> slot_of(slots, "b"), slot_of(slots, "a"), slot_of(slots, "b")
+        (1, 0, 1)
+    """
+    slot = slots.get(var)
+    if slot is None:
+        slot = slots[var] = len(slots)
+    return slot
+
+
+def assign_slots(insts, slots=None):
+    """
+    Resolves every variable that the instructions in 'insts' read or write to
+    a slot: an index into a RegisterFile. The slots are stored in the
+    instructions themselves, and the slot table, which maps variable names to
+    slots, is returned.
+
+    Example:
+        >>> a = Add("x", "a", "b")
+        >>> m = Mul("y", "x", "a")
+        >>> a.add_next(m)
+        >>> assign_slots([a, m])
+        {'x': 0, 'a': 1, 'b': 2, 'y': 3}
+        >>> (m.dst_slot, m.src0_slot, m.src1_slot)
+        (3, 0, 1)
+    """
+    if slots is None:
+        slots = {}
+    for inst in insts:
+        inst.assign_slots(slots)
+    return slots
+
+
 class Inst(ABC):
     """
     The representation of instructions. All that an instruction has, that is
@@ -74,18 +273,50 @@ class Inst(ABC):
     attribute determines the next instruction that will be fetched after this
     instruction runs. Also, every instruction has an index, which is always
     different. The index is incremented whenever a new instruction is created.
+
+    Instructions declare their attributes in __slots__, so that they do not
+    carry a dictionary each. Instructions that are not branches keep their
+    successor in the next_inst field, and the list 'nexts' is built only when
+    it is read. In the rare case where a non-branch instruction has more than
+    one successor, the extra successors are kept in the more_nexts list.
     """
 
+    __slots__ = ("ID", "preds", "compiled")
+
     next_index = 0
 
     def __init__(self):
-        self.nexts = []
         self.preds = []
         self.ID = Inst.next_index
         Inst.next_index += 1
 
+    @property
+    def nexts(self):
+        """
+        The list of successors of this instruction.
+
+        Example:
+            >>> a = Add("a", "b", "c")
+            >>> m = Mul("m", "a", "a")
+            >>> a.nexts
+            []
+            >>> a.add_next(m)
+            >>> a.nexts == [m] and m.preds == [a]
+            True
+        """
+        if self.next_inst is None:
+            return []
+        if self.more_nexts is None:
+            return [self.next_inst]
+        return [self.next_inst] + self.more_nexts
+
     def add_next(self, next_inst):
-        self.nexts.append(next_inst)
+        if self.next_inst is None:
+            self.next_inst = next_inst
+        elif self.more_nexts is None:
+            self.more_nexts = [next_inst]
+        else:
+            self.more_nexts.append(next_inst)
         next_inst.preds.append(self)
 
     @classmethod
@@ -98,11 +329,30 @@ class Inst(ABC):
     def uses(self):
         raise NotImplementedError
 
+    @classmethod
+    @abstractmethod
+    def assign_slots(self, slots):
+        raise NotImplementedError
+
     def get_next(self):
-        if len(self.nexts) > 0:
-            return self.nexts[0]
-        else:
-            return None
+        return self.next_inst
+
+    def step(self, env):
+        """
+        Evaluates this instruction and returns the instruction that must run
+        next. Unlike the pair 'eval' and 'get_next', this method does not store
+        anything in the instruction; hence, the same program can be run by
+        many interpreters at the same time.
+        """
+        self.eval(env)
+        return self.get_next()
+
+    def step_slots(self, regs):
+        """
+        Same as 'step', but for programs whose variables live in slots.
+        """
+        self.eval_slots(regs)
+        return self.get_next()
 
 
 class BinOp(Inst):
@@ -112,10 +362,23 @@ class BinOp(Inst):
     defined value, and the list of used values.
     """
 
+    __slots__ = (
+        "dst",
+        "src0",
+        "src1",
+        "next_inst",
+        "more_nexts",
+        "dst_slot",
+        "src0_slot",
+        "src1_slot",
+    )
+
     def __init__(s, dst, src0, src1):
         s.dst = dst
         s.src0 = src0
         s.src1 = src1
+        s.next_inst = None
+        s.more_nexts = None
         super().__init__()
 
     @classmethod
@@ -129,6 +392,11 @@ class BinOp(Inst):
     def uses(s):
         return set([s.src0, s.src1])
 
+    def assign_slots(s, slots):
+        s.dst_slot = slot_of(slots, s.dst)
+        s.src0_slot = slot_of(slots, s.src0)
+        s.src1_slot = slot_of(slots, s.src1)
+
     def __str__(self):
         op = self.get_opcode()
         inst_s = f"{self.ID}: {self.dst} = {self.src0}{op}{self.src1}"
@@ -151,9 +419,14 @@ class Add(BinOp):
         True
     """
 
+    __slots__ = ()
+
     def eval(self, env):
         env.set(self.dst, env.get(self.src0) + env.get(self.src1))
 
+    def eval_slots(self, regs):
+        regs[self.dst_slot] = regs[self.src0_slot] + regs[self.src1_slot]
+
     def get_opcode(self):
         return "+"
 
@@ -168,9 +441,14 @@ class Mul(BinOp):
         6
     """
 
+    __slots__ = ()
+
     def eval(s, env):
         env.set(s.dst, env.get(s.src0) * env.get(s.src1))
 
+    def eval_slots(s, regs):
+        regs[s.dst_slot] = regs[s.src0_slot] * regs[s.src1_slot]
+
     def get_opcode(self):
         return "*"
 
@@ -185,9 +463,14 @@ class Lth(BinOp):
         True
     """
 
+    __slots__ = ()
+
     def eval(s, env):
         env.set(s.dst, env.get(s.src0) < env.get(s.src1))
 
+    def eval_slots(s, regs):
+        regs[s.dst_slot] = regs[s.src0_slot] < regs[s.src1_slot]
+
     def get_opcode(self):
         return "<"
 
@@ -202,9 +485,14 @@ class Geq(BinOp):
         False
     """
 
+    __slots__ = ()
+
     def eval(s, env):
         env.set(s.dst, env.get(s.src0) >= env.get(s.src1))
 
+    def eval_slots(s, regs):
+        regs[s.dst_slot] = regs[s.src0_slot] >= regs[s.src1_slot]
+
     def get_opcode(self):
         return ">="
 
@@ -223,8 +511,13 @@ class Bt(Inst):
         >>> b.eval(e)
         >>> b.get_next() == a
         True
+
+        >>> b.step(Env({"t": False})) == m
+        True
     """
 
+    __slots__ = ("cond", "nexts", "next_iter", "cond_slot")
+
     def __init__(s, cond, true_dst=None, false_dst=None):
         super().__init__()
         s.cond = cond
@@ -240,6 +533,9 @@ class Bt(Inst):
     def uses(s):
         return set([s.cond])
 
+    def assign_slots(s, slots):
+        s.cond_slot = slot_of(slots, s.cond)
+
     def add_true_next(s, true_dst):
         s.nexts[0] = true_dst
         true_dst.preds.append(s)
@@ -260,9 +556,31 @@ class Bt(Inst):
         else:
             s.next_iter = 1
 
+    def eval_slots(s, regs):
+        if regs[s.cond_slot]:
+            s.next_iter = 0
+        else:
+            s.next_iter = 1
+
     def get_next(s):
         return s.nexts[s.next_iter]
 
+    def step(s, env):
+        """
+        Returns the successor chosen by the condition, without storing the
+        choice in the branch (see Inst.step).
+        """
+        if env.get(s.cond):
+            return s.nexts[0]
+        else:
+            return s.nexts[1]
+
+    def step_slots(s, regs):
+        if regs[s.cond_slot]:
+            return s.nexts[0]
+        else:
+            return s.nexts[1]
+
     def __str__(self):
         inst_s = f"{self.ID}: bt {self.cond}"
         pred_s = f"\n  P: {', '.join([str(inst.ID) for inst in self.preds])}"
@@ -270,10 +588,464 @@ class Bt(Inst):
         return inst_s + pred_s + next_s
 
 
-def interp(instruction, environment):
+class BasicBlock(Inst):
+    """
+    A basic block is a maximal sequence of instructions that always run one
+    after the other: only the first instruction can be the target of a jump,
+    and only the last one can have more than one successor. A block shares the
+    ID of its first instruction, so that data-flow facts about a block are
+    named after that instruction. Blocks have 'nexts' and 'preds', like
+    instructions; thus, they can be interpreted, and they can be given to the
+    data-flow equations, in place of instructions.
+
+    Example:
+        >>> env = Env({"m": 3, "n": 2, "zero": 0})
+        >>> m_min = Add("answer", "m", "zero")
+        >>> n_min = Add("answer", "n", "zero")
+        >>> p = Lth("p", "n", "m")
+        >>> b = Bt("p", n_min, m_min)
+        >>> p.add_next(b)
+        >>> blocks = basic_blocks([p, b, n_min, m_min])
+        >>> [len(block.insts) for block in blocks]
+        [2, 1, 1]
+        >>> interp(blocks[0], env).get("answer")
+        2
+    """
+
+    __slots__ = ("insts", "nexts", "body", "branch", "next_block")
+
+    def __init__(s, insts):
+        s.insts = insts
+        s.ID = insts[0].ID
+        s.nexts = []
+        s.preds = []
+        s.next_block = None
+        if isinstance(insts[-1], Bt):
+            s.body = insts[:-1]
+            s.branch = insts[-1]
+        else:
+            s.body = insts
+            s.branch = None
+
+    def definition(s):
+        return set().union(*[inst.definition() for inst in s.insts])
+
+    def uses(s):
+        """
+        The upward-exposed uses of the block: the variables that are read
+        before being defined within the block.
+
+        Example:
+            >>> a = Add("x", "a", "b")
+            >>> m = Mul("y", "x", "c")
+            >>> a.add_next(m)
+            >>> sorted(basic_blocks([a, m])[0].uses())
+            ['a', 'b', 'c']
+        """
+        uses = set()
+        defs = set()
+        for inst in s.insts:
+            uses |= inst.uses() - defs
+            defs |= inst.definition()
+        return uses
+
+    def assign_slots(s, slots):
+        for inst in s.insts:
+            inst.assign_slots(slots)
+
+    def add_next(s, next_block):
+        """
+        Adds 'next_block' to the successors of the block. The successors of a
+        block that ends in a branch are the target of the branch, followed by
+        the fall-through block, like the 'nexts' of Bt.
+
+        Example:
+            >>> b0 = BasicBlock([Add("x", "a", "b")])
+            >>> b1 = BasicBlock([Mul("y", "x", "x")])
+            >>> b0.add_next(b1)
+            >>> b0.nexts == [b1] and b1.preds == [b0]
+            True
+        """
+        s.nexts.append(next_block)
+        next_block.preds.append(s)
+
+    def eval(s, env):
+        """
+        Runs the instructions of the block, and keeps the block that must run
+        next for `get_next` (see `step`).
+
+        Example:
+            >>> b = BasicBlock([Lth("p", "a", "b"), Bt("p")])
+            >>> t = BasicBlock([Add("x", "a", "a")])
+            >>> f = BasicBlock([Add("x", "b", "b")])
+            >>> b.add_next(t)
+            >>> b.add_next(f)
+            >>> b.eval(Env({"a": 2, "b": 1}))
+            >>> b.get_next() is f
+            True
+        """
+        s.next_block = s.step(env)
+
+    def eval_slots(s, regs):
+        s.next_block = s.step_slots(regs)
+
+    def get_next(s):
+        return s.next_block
+
+    def step(s, env):
+        for inst in s.body:
+            inst.eval(env)
+        if s.branch is not None:
+            return s.nexts[0] if env.get(s.branch.cond) else s.nexts[1]
+        return s.nexts[0] if len(s.nexts) > 0 else None
+
+    def step_slots(s, regs):
+        for inst in s.body:
+            inst.eval_slots(regs)
+        if s.branch is not None:
+            return s.nexts[0] if regs[s.branch.cond_slot] else s.nexts[1]
+        return s.nexts[0] if len(s.nexts) > 0 else None
+
+    def __str__(self):
+        inst_s = f"{self.ID}: [{', '.join(str(i.ID) for i in self.insts)}]"
+        pred_s = f"\n  P: {', '.join([str(blk.ID) for blk in self.preds])}"
+        next_s = ", ".join(str(blk.ID) for blk in self.nexts if blk is not None)
+        return inst_s + pred_s + f"\n  N: {next_s}"
+
+
+def basic_blocks(insts):
+    """
+    Groups the instructions in 'insts' into basic blocks. The first block
+    starts with the first instruction. A new block starts at every target of a
+    branch, and at every instruction that can be reached from more than one
+    place. The successors and predecessors of each block are filled in.
+
+    Example:
+        >>> Inst.next_index = 0
+        >>> c = Add("c", "c", "one")
+        >>> p = Lth("p", "c", "n")
+        >>> b = Bt("p", c)
+        >>> e = Add("e", "c", "c")
+        >>> c.add_next(p)
+        >>> p.add_next(b)
+        >>> b.add_next(e)
+        >>> blocks = basic_blocks([c, p, b, e])
+        >>> print(blocks[0])
+        0: [0, 1, 2]
+          P: 0
+          N: 0, 3
+        >>> [inst.ID for inst in blocks[1].insts]
+        [3]
+    """
+    num_preds = {}
+    for inst in insts:
+        for n in inst.nexts:
+            if n is not None:
+                num_preds[id(n)] = num_preds.get(id(n), 0) + 1
+    leaders = set()
+    if len(insts) > 0:
+        leaders.add(id(insts[0]))
+    for inst in insts:
+        if isinstance(inst, Bt) or len(inst.nexts) > 1:
+            leaders.update(id(n) for n in inst.nexts if n is not None)
+        if num_preds.get(id(inst), 0) != 1:
+            leaders.add(id(inst))
+    blocks = []
+    block_of = {}
+    for inst in insts:
+        if id(inst) not in leaders:
+            continue
+        body = [inst]
+        while len(inst.nexts) == 1 and not isinstance(inst, Bt):
+            inst = inst.nexts[0]
+            if inst is None or id(inst) in leaders:
+                break
+            body.append(inst)
+        block = BasicBlock(body)
+        block_of[id(body[0])] = block
+        blocks.append(block)
+    for block in blocks:
+        for n in block.insts[-1].nexts:
+            succ = block_of[id(n)] if n is not None else None
+            block.nexts.append(succ)
+            if succ is not None:
+                succ.preds.append(block)
+    return blocks
+
+
+def freeze_preds(insts):
+    """
+    Replaces the list of predecessors of each instruction in 'insts' with a
+    tuple, which takes less memory. Once this is done, no new edges can be
+    added to these instructions.
+
+    Example:
+        >>> a = Add("a", "b", "c")
+        >>> m = Mul("m", "a", "a")
+        >>> a.add_next(m)
+        >>> freeze_preds([a, m])
+        >>> m.preds == (a,)
+        True
+    """
+    for inst in insts:
+        inst.preds = tuple(inst.preds)
+
+
+class ExecutionAborted(RuntimeError):
+    """
+    The error raised when the interpreter stops a program before its end.
+    Besides the message, the error carries:
+
+        reason: why the program was stopped: "fuel", if it ran out of its
+            step budget, "deadline", if it ran out of time, or "cycle", if it
+            entered a loop that would never end.
+        env: the environment, with the values that the program had computed
+            when it was stopped.
+        inst: the instruction that would run next.
+        steps: the number of instructions that ran.
+
+    Example:
+        >>> env = Env({"t": True})
+        >>> b = Bt("t")
+        >>> b.add_true_next(b)
+        >>> try:
+        ...     interp(b, env, max_steps=10)
+        ... except ExecutionAborted as e:
+        ...     print(e.reason, e.inst is b, e.steps, e.env.get("t"))
+        fuel True 10 True
+    """
+
+    def __init__(s, reason, message, env, inst, steps):
+        super().__init__(message)
+        s.reason = reason
+        s.env = env
+        s.inst = inst
+        s.steps = steps
+
+
+def _out_of_fuel(max_steps, env, inst):
+    message = f"step budget of {max_steps} instructions exhausted"
+    return ExecutionAborted("fuel", message, env, inst, max_steps)
+
+
+def _live_reads(header):
+    """
+    Returns the variables that can be read by the code reachable from the
+    instruction (or basic block) 'header', sorted by name. No other variable
+    can influence the execution of the program from 'header' on.
+
+    Example:
+        >>> a = Add("x", "y", "z")
+        >>> b = Bt("x", a)
+        >>> m = Mul("w", "x", "x")
+        >>> a.add_next(b)
+        >>> b.add_next(m)
+        >>> _live_reads(b)
+        ['x', 'y', 'z']
+    """
+    names = set()
+    seen = set()
+    stack = [header]
+    while stack:
+        inst = stack.pop()
+        if inst is None or id(inst) in seen:
+            continue
+        seen.add(id(inst))
+        names |= inst.uses()
+        stack.extend(inst.nexts)
+    return sorted(names)
+
+
+def _guard(environment, max_seconds, detect_cycles):
+    """
+    Returns a function check(inst, nxt, steps), which is called after 'inst'
+    runs, and raises an ExecutionAborted error if the program must be stopped
+    before 'nxt' runs (see `interp_guarded`). Returns None if there is no
+    guard to check.
+    """
+    from time import monotonic
+
+    if max_seconds is None and not detect_cycles:
+        return None
+    slots = isinstance(environment, RegisterFile)
+    deadline = None if max_seconds is None else monotonic() + max_seconds
+    live = {}
+    seen = {}
+
+    def check(inst, nxt, steps):
+        if deadline is not None and steps % 1024 == 0 and monotonic() > deadline:
+            message = f"time budget of {max_seconds}s exhausted after {steps} steps"
+            raise ExecutionAborted("deadline", message, environment, nxt, steps)
+        if detect_cycles and nxt is not None and nxt.ID <= inst.ID:
+            header = id(nxt)
+            if header not in live:
+                names = _live_reads(nxt)
+                if slots:
+                    live[header] = [slot_of(environment.slots, v) for v in names]
+                else:
+                    live[header] = names
+                seen[header] = set()
+            if slots:
+                values = environment.regs
+                current = tuple(values[k] for k in live[header])
+            else:
+                values = environment.bindings
+                current = tuple(values.get(v) for v in live[header])
+            if current in seen[header]:
+                message = f"state at instruction {nxt.ID} repeats after {steps} steps"
+                raise ExecutionAborted("cycle", message, environment, nxt, steps)
+            seen[header].add(current)
+
+    return check
+
+
+def _recorder(profile):
+    """
+    Returns a function record(inst, nxt, elapsed), which adds to 'profile'
+    one run of 'inst', which took 'elapsed' seconds and was followed by
+    'nxt' (see `interp_profiled`).
+    """
+    counts = profile.counts
+    times = profile.times
+    edges = profile.edges
+    branches = profile.branches
+
+    def record(inst, nxt, elapsed):
+        ID = inst.ID
+        counts[ID] = counts.get(ID, 0) + 1
+        times[ID] = times.get(ID, 0.0) + elapsed
+        edge = (ID, None if nxt is None else nxt.ID)
+        edges[edge] = edges.get(edge, 0) + 1
+        if _is_branch(inst):
+            taken = branches.setdefault(ID, [0, 0])
+            taken[0 if nxt is inst.nexts[0] else 1] += 1
+
+    return record
+
+
+def interp_guarded(
+    instruction,
+    environment,
+    max_steps=None,
+    max_seconds=None,
+    detect_cycles=False,
+    profile=None,
+):
+    """
+    This function evaluates a program, like `interp`, but with guards that
+    stop programs that run for too long. The clock is checked once every 1024
+    instructions, so the program might run a bit longer than 'max_seconds'.
+
+    If 'detect_cycles' is True, then the state of the program is recorded
+    whenever it goes back to a loop header. We consider that an edge goes
+    back if its target is not younger than its source (e.g., its ID is not
+    larger). Every cycle in the control-flow graph contains such an edge. The
+    state is the tuple of values of the variables that the code after the
+    header can read (see `_live_reads`). As the interpreter is deterministic,
+    if the program reaches a header twice with the same state, then it will
+    never end. The states are stored in sets, so the memory used by this
+    guard grows with the number of iterations.
+
+    In every case, an ExecutionAborted error is raised when the program is
+    stopped. If a Profile 'profile' is given, then the instructions that ran
+    before the program was stopped are recorded in it.
+
+    Example:
+        >>> env = Env({"c": 0, "one": 1, "zero": 0, "n": 5})
+        >>> c = Add("c", "c", "one")
+        >>> r = Add("c", "zero", "zero")
+        >>> p = Lth("p", "c", "n")
+        >>> b = Bt("p", c)
+        >>> c.add_next(r)
+        >>> r.add_next(p)
+        >>> p.add_next(b)
+        >>> prof = Profile()
+        >>> try:
+        ...     interp(c, env, detect_cycles=True, profile=prof)
+        ... except ExecutionAborted as e:
+        ...     print(e.reason, e.steps, e.inst is c, e.env.get("p"))
+        cycle 8 True True
+        >>> prof.counts[c.ID], prof.branches[b.ID]
+        (2, [2, 0])
+
+        >>> regs = RegisterFile(assign_slots([c, r, p, b]), {"c": 0, "one": 1})
+        >>> regs.set("zero", 0)
+        >>> regs.set("n", 5)
+        >>> interp(c, regs, detect_cycles=True)  # doctest: +ELLIPSIS
+        Traceback (most recent call last):
+        ...
+        lang.ExecutionAborted: state at instruction ... repeats after 8 steps
+
+        >>> env = Env({"c": 0, "one": 1, "zero": 0, "n": 5})
+        >>> interp(c, env, max_seconds=0.01)  # doctest: +ELLIPSIS
+        Traceback (most recent call last):
+        ...
+        lang.ExecutionAborted: time budget of 0.01s exhausted after ... steps
+    """
+    from time import perf_counter
+
+    if isinstance(environment, RegisterFile):
+        state, step = environment.regs, "step_slots"
+    else:
+        state, step = environment, "step"
+    check = _guard(environment, max_seconds, detect_cycles)
+    record = None if profile is None else _recorder(profile)
+    steps = 0
+    while instruction:
+        if max_steps is not None and steps >= max_steps:
+            raise _out_of_fuel(max_steps, environment, instruction)
+        if record is None:
+            nxt = getattr(instruction, step)(state)
+        else:
+            start = perf_counter()
+            nxt = getattr(instruction, step)(state)
+            record(instruction, nxt, perf_counter() - start)
+        steps += 1
+        if check is not None:
+            check(instruction, nxt, steps)
+        instruction = nxt
+    return environment
+
+
+def interp(
+    instruction,
+    environment,
+    max_steps=None,
+    profile=None,
+    max_seconds=None,
+    detect_cycles=False,
+    observers=None,
+):
     """
     This function evaluates a program until there is no more instructions to
-    evaluate.
+    evaluate. The interpreter is a flat dispatch loop: it fetches the next
+    instruction after evaluating the current one, instead of calling itself
+    recursively. Thus, the number of instructions that it can run is not
+    bounded by the recursion limit of Python. The interpreter keeps all its
+    state in the environment and in local variables (see Inst.step); thus,
+    the same program can be run by many threads at once, each one with its
+    own environment.
+
+    Parameters:
+    -----------
+        instruction: the first instruction that will be interpreted
+        environment: the environment that associates variables with values
+        max_steps: the maximum number of instructions that can be evaluated.
+            If the program does not end within this budget, then a
+            ExecutionAborted error is raised. No limit is imposed if it is
+            None.
+        profile: a Profile that records how many times each instruction and
+            each edge runs (see `interp_profiled`). Programs run at full
+            speed if it is None.
+        max_seconds: the maximum wall-clock time, in seconds, that the
+            program can take. See `interp_guarded`, which also fills the
+            profile, if there is one.
+        detect_cycles: if True, then the program is stopped as soon as it
+            reaches the same loop header twice with the same state. See
+            `interp_guarded`.
+        observers: a list of Observer objects, which are notified of each
+            instruction and branch (see `interp_observed`). The other options
+            still apply when there are observers.
 
     Example:
         >>> env = Env({"m": 3, "n": 2, "zero": 0})
@@ -284,9 +1056,483 @@ def interp(instruction, environment):
         >>> p.add_next(b)
         >>> interp(p, env).get("answer")
         2
+
+        >>> env = Env({"c": 0, "one": 1, "n": 700})
+        >>> c = Add("c", "c", "one")
+        >>> p = Lth("p", "c", "n")
+        >>> b = Bt("p", c)
+        >>> c.add_next(p)
+        >>> p.add_next(b)
+        >>> interp(c, env).get("c")
+        700
+
+        >>> from concurrent.futures import ThreadPoolExecutor
+        >>> def run(n):
+        ...     return interp(c, Env({"c": 0, "one": 1, "n": n})).get("c")
+        >>> with ThreadPoolExecutor(max_workers=4) as pool:
+        ...     list(pool.map(run, [10, 200, 30, 400]))
+        [10, 200, 30, 400]
+
+        >>> env = Env({"t": True})
+        >>> b = Bt("t")
+        >>> b.add_true_next(b)
+        >>> interp(b, env, max_steps=100)
+        Traceback (most recent call last):
+        ...
+        lang.ExecutionAborted: step budget of 100 instructions exhausted
+    """
+    if observers:
+        return interp_observed(
+            instruction,
+            environment,
+            observers,
+            max_steps,
+            max_seconds,
+            detect_cycles,
+            profile,
+        )
+    if max_seconds is not None or detect_cycles:
+        return interp_guarded(
+            instruction, environment, max_steps, max_seconds, detect_cycles, profile
+        )
+    if profile is not None:
+        return interp_profiled(instruction, environment, profile, max_steps)
+    if isinstance(environment, RegisterFile):
+        return interp_slots(instruction, environment, max_steps)
+    steps = 0
+    while instruction:
+        if max_steps is not None and steps >= max_steps:
+            raise _out_of_fuel(max_steps, environment, instruction)
+        instruction = instruction.step(environment)
+        steps += 1
+    return environment
+
+
+def interp_slots(instruction, registers, max_steps=None):
+    """
+    This function evaluates a program whose variables have been resolved to
+    slots (see `assign_slots`). Instructions read and write the list of
+    registers directly, instead of looking variables up by name. The `interp`
+    function calls this one whenever it receives a RegisterFile.
+
+    Example:
+        >>> m_min = Add("answer", "m", "zero")
+        >>> n_min = Add("answer", "n", "zero")
+        >>> p = Lth("p", "n", "m")
+        >>> b = Bt("p", n_min, m_min)
+        >>> p.add_next(b)
+        >>> slots = assign_slots([p, b, m_min, n_min])
+        >>> regs = RegisterFile(slots, {"m": 3, "n": 2, "zero": 0})
+        >>> interp(p, regs).get("answer")
+        2
+    """
+    regs = registers.regs
+    steps = 0
+    while instruction:
+        if max_steps is not None and steps >= max_steps:
+            raise _out_of_fuel(max_steps, registers, instruction)
+        instruction = instruction.step_slots(regs)
+        steps += 1
+    return registers
+
+
+class Profile:
+    """
+    The execution profile of a program, as collected by `interp_profiled`.
+    The profile contains four dictionaries:
+
+        counts: maps the ID of each instruction to the number of times it ran.
+        times: maps the ID of each instruction to the total time, in seconds,
+            spent running it.
+        edges: maps each pair (ID of source, ID of target) to the number of
+            times the program went from source to target. The target is None
+            when the program ends after the source.
+        branches: maps the ID of each branch to a list [T, F], where T is the
+            number of times the branch was taken, and F is the number of
+            times it was not.
+
+    The same profile can be passed to many runs; counts are accumulated.
+
+    Example:
+        >>> env = Env({"c": 0, "one": 1, "n": 3})
+        >>> c = Add("c", "c", "one")
+        >>> p = Lth("p", "c", "n")
+        >>> b = Bt("p", c)
+        >>> c.add_next(p)
+        >>> p.add_next(b)
+        >>> prof = Profile()
+        >>> interp(c, env, profile=prof).get("c")
+        3
+        >>> prof.counts[b.ID], prof.branches[b.ID]
+        (3, [2, 1])
+        >>> prof.edges[(b.ID, c.ID)], prof.edges[(b.ID, None)]
+        (2, 1)
+    """
+
+    def __init__(s):
+        s.counts = {}
+        s.times = {}
+        s.edges = {}
+        s.branches = {}
+
+    def rows(s):
+        """
+        Returns the profile as a list of dictionaries, one per instruction,
+        sorted by time, from the hottest instruction to the coldest. Each
+        dictionary contains the ID of the instruction, its count, its time,
+        and, for branches, how many times the branch was taken or not.
+
+        Example:
+            >>> prof = Profile()
+            >>> prof.counts = {0: 2, 1: 4}
+            >>> prof.times = {0: 0.5, 1: 0.25}
+            >>> prof.branches = {1: [3, 1]}
+            >>> for row in prof.rows():
+            ...     print(row)
+            {'id': 0, 'count': 2, 'time': 0.5, 'taken': None, 'not_taken': None}
+            {'id': 1, 'count': 4, 'time': 0.25, 'taken': 3, 'not_taken': 1}
+        """
+        rows = []
+        for ID in sorted(s.counts, key=lambda ID: (-s.times.get(ID, 0.0), ID)):
+            taken, not_taken = s.branches.get(ID, (None, None))
+            rows.append(
+                {
+                    "id": ID,
+                    "count": s.counts[ID],
+                    "time": s.times.get(ID, 0.0),
+                    "taken": taken,
+                    "not_taken": not_taken,
+                }
+            )
+        return rows
+
+    def to_csv(s, file):
+        """
+        Writes the profile, as returned by `rows`, into the file object
+        'file', in CSV format.
+
+        Example:
+            >>> import sys
+            >>> prof = Profile()
+            >>> prof.counts, prof.times = {0: 2}, {0: 0.5}
+            >>> prof.to_csv(sys.stdout)
+            id,count,time,taken,not_taken
+            0,2,0.5,,
+        """
+        import csv
+
+        fields = ["id", "count", "time", "taken", "not_taken"]
+        writer = csv.DictWriter(file, fields, lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(s.rows())
+
+    def to_json(s, file):
+        """
+        Writes the profile into the file object 'file', in JSON format. The
+        instructions are listed as in `rows`, and the edges as a list of
+        dictionaries with the IDs of the source and target, and the count.
+
+        Example:
+            >>> import sys
+            >>> prof = Profile()
+            >>> prof.counts, prof.times = {0: 2}, {0: 0.5}
+            >>> prof.edges = {(0, 0): 1, (0, None): 1}
+            >>> prof.to_json(sys.stdout)
+            {"instructions": [{"id": 0, "count": 2, "time": 0.5, "taken": null, \
+"not_taken": null}], "edges": [{"src": 0, "dst": 0, "count": 1}, \
+{"src": 0, "dst": null, "count": 1}]}
+        """
+        import json
+
+        edges = [
+            {"src": src, "dst": dst, "count": n}
+            for (src, dst), n in s.edges.items()
+        ]
+        json.dump({"instructions": s.rows(), "edges": edges}, file)
+
+    def to_dot(s, insts):
+        """
+        Produces a dot graph of the instructions in 'insts' (or of basic
+        blocks), in the same format that ControlFlowGraphs/inst2dot.py uses.
+        Nodes are filled with a color that goes from white, for instructions
+        that did not run, to red, for the instruction where the program spent
+        more time. Each edge is labeled with the number of times it was
+        traversed, and its width grows with that number. The graph can be
+        rendered with "dot -Tpdf".
+
+        Example:
+            >>> a = Add("x", "y", "z")
+            >>> b = Bt("x", a)
+            >>> a.add_next(b)
+            >>> a.ID, b.ID = 0, 1
+            >>> prof = Profile()
+            >>> prof.counts = {0: 2, 1: 2}
+            >>> prof.times = {0: 0.1, 1: 0.2}
+            >>> prof.edges = {(0, 1): 2, (1, 0): 1, (1, None): 1}
+            >>> prof.branches = {1: [1, 1]}
+            >>> print(prof.to_dot([a, b]))
+            digraph cfg {
+                fontname="Courier New"
+                node [shape=box style=filled];
+            <BLANKLINE>
+                0 [fontname="Courier New" fillcolor="0.000 0.500 1.000" label="x = y + z\\n2 runs, 0.100000s"];
+                1 [fontname="Courier New" fillcolor="0.000 1.000 1.000" label="bt x\\n2 runs, 0.200000s"];
+                0 -> 1 [fontname="Courier New" label="2" penwidth=5.0];
+                1 -> 0 [fontname="Courier New" label="True: 1" penwidth=3.0];
+            }
+        """
+        hottest = max(s.times.values(), default=0.0) or 1.0
+        most_run = max(s.edges.values(), default=0) or 1
+        lines = ["digraph cfg {", '    fontname="Courier New"']
+        lines += ["    node [shape=box style=filled];", ""]
+        for inst in insts:
+            heat = s.times.get(inst.ID, 0.0) / hottest
+            label = _dot_label(inst)
+            runs = s.counts.get(inst.ID, 0)
+            lines.append(
+                f'    {inst.ID} [fontname="Courier New" '
+                f'fillcolor="0.000 {heat:.3f} 1.000" '
+                f'label="{label}\\n{runs} runs, {s.times.get(inst.ID, 0.0):.6f}s"];'
+            )
+        for inst in insts:
+            branch = _is_branch(inst)
+            for k, nxt in enumerate(inst.nexts):
+                if nxt is None:
+                    continue
+                n = s.edges.get((inst.ID, nxt.ID), 0)
+                if branch:
+                    n = s.branches.get(inst.ID, [0, 0])[k]
+                    label = f"{'True' if k == 0 else 'False'}: {n}"
+                else:
+                    label = str(n)
+                if n == 0:
+                    continue
+                lines.append(
+                    f"    {inst.ID} -> {nxt.ID} "
+                    f'[fontname="Courier New" label="{label}" '
+                    f"penwidth={1 + 4 * n / most_run:.1f}];"
+                )
+        lines.append("}")
+        return "\n".join(lines)
+
+
+def _dot_label(inst):
+    """
+    The text of an instruction, or of the instructions in a basic block, as
+    shown in the nodes of the graphs produced by `Profile.to_dot`.
+
+    Example:
+        >>> _dot_label(Lth("p", "c", "n"))
+        'p = c < n'
+    """
+    if isinstance(inst, BasicBlock):
+        return "\\n".join(_dot_label(i) for i in inst.insts)
+    if isinstance(inst, Bt):
+        return f"bt {inst.cond}"
+    return f"{inst.dst} = {inst.src0} {inst.get_opcode()} {inst.src1}"
+
+
+def _is_branch(inst):
+    """
+    Checks if 'inst' ends with a conditional branch, i.e., if it is a Bt or a
+    basic block that ends with a Bt.
+    """
+    return isinstance(inst, Bt) or (
+        isinstance(inst, BasicBlock) and inst.branch is not None
+    )
+
+
+def interp_profiled(instruction, environment, profile, max_steps=None):
+    """
+    This function evaluates a program, like `interp`, but records, in the
+    Profile 'profile', how many times each instruction runs, how long it
+    takes, and how many times each edge of the control-flow graph is
+    traversed. The program can be made of instructions or of basic blocks,
+    and the environment can be an Env or a RegisterFile. The `interp`
+    function calls this one whenever it receives a profile.
+
+    Example:
+        >>> env = Env({"m": 3, "n": 2, "zero": 0})
+        >>> m_min = Add("answer", "m", "zero")
+        >>> n_min = Add("answer", "n", "zero")
+        >>> p = Lth("p", "n", "m")
+        >>> b = Bt("p", n_min, m_min)
+        >>> p.add_next(b)
+        >>> prof = Profile()
+        >>> interp_profiled(p, env, prof).get("answer")
+        2
+        >>> [prof.counts.get(i.ID, 0) for i in [p, b, m_min, n_min]]
+        [1, 1, 0, 1]
+        >>> sorted(prof.edges.values())
+        [1, 1, 1]
     """
-    if instruction:
-        instruction.eval(environment)
-        return interp(instruction.get_next(), environment)
+    from time import perf_counter
+
+    if isinstance(environment, RegisterFile):
+        state, step = environment.regs, "step_slots"
     else:
-        return environment
+        state, step = environment, "step"
+    record = _recorder(profile)
+    steps = 0
+    while instruction:
+        if max_steps is not None and steps >= max_steps:
+            raise _out_of_fuel(max_steps, environment, instruction)
+        start = perf_counter()
+        nxt = getattr(instruction, step)(state)
+        record(instruction, nxt, perf_counter() - start)
+        instruction = nxt
+        steps += 1
+    return environment
+
+
+class Observer:
+    """
+    The base class of the objects that watch the interpreter as it runs a
+    program, e.g., to collect coverage or to track the flow of values. An
+    observer overrides the methods of the events that it wants to see; the
+    other methods are never called. The methods receive the environment, or
+    the list of registers, if the program runs on a RegisterFile.
+
+    Example:
+        >>> class Coverage(Observer):
+        ...     def __init__(self):
+        ...         self.covered = set()
+        ...     def before(self, inst, env):
+        ...         self.covered.add(inst.ID)
+        >>> env = Env({"m": 3, "n": 2, "zero": 0})
+        >>> m_min = Add("answer", "m", "zero")
+        >>> n_min = Add("answer", "n", "zero")
+        >>> p = Lth("p", "n", "m")
+        >>> b = Bt("p", n_min, m_min)
+        >>> p.add_next(b)
+        >>> cov = Coverage()
+        >>> interp(p, env, observers=[cov]).get("answer")
+        2
+        >>> m_min.ID in cov.covered, n_min.ID in cov.covered
+        (False, True)
+    """
+
+    def before(self, inst, env):
+        """
+        Called before 'inst' runs.
+        """
+        pass
+
+    def after(self, inst, env, next_inst):
+        """
+        Called after 'inst' runs. 'next_inst' is the instruction that will
+        run next, or None, if the program ends.
+        """
+        pass
+
+    def on_branch(self, inst, taken, env):
+        """
+        Called after a branch (or a basic block that ends with a branch)
+        runs. 'taken' is True if the program jumps to the first successor of
+        the branch, and False if it falls through to the second one.
+        """
+        pass
+
+
+def _hooks(observers, name):
+    """
+    The bound methods 'name' of the observers that override it.
+    """
+    default = getattr(Observer, name)
+    return [
+        getattr(obs, name)
+        for obs in observers
+        if getattr(type(obs), name, default) is not default
+    ]
+
+
+def interp_observed(
+    instruction,
+    environment,
+    observers,
+    max_steps=None,
+    max_seconds=None,
+    detect_cycles=False,
+    profile=None,
+):
+    """
+    This function evaluates a program, like `interp`, but notifies the
+    observers in the list 'observers' of each event. The `interp` function
+    calls this one whenever it receives observers, so the plain dispatch loop
+    never checks whether there is someone watching. Only the methods that the
+    observers override are called. The guards of `interp_guarded` and the
+    profile of `interp_profiled` work here as they do there; the time taken
+    by the observers is not counted in the profile.
+
+    Example:
+        >>> class Branches(Observer):
+        ...     def __init__(self):
+        ...         self.log = []
+        ...     def on_branch(self, inst, taken, env):
+        ...         self.log.append(taken)
+        >>> env = Env({"c": 0, "one": 1, "n": 3})
+        >>> c = Add("c", "c", "one")
+        >>> p = Lth("p", "c", "n")
+        >>> b = Bt("p", c)
+        >>> c.add_next(p)
+        >>> p.add_next(b)
+        >>> obs = Branches()
+        >>> interp(c, env, observers=[obs]).get("c")
+        3
+        >>> obs.log
+        [True, True, False]
+
+        >>> obs = Branches()
+        >>> regs = RegisterFile(assign_slots([c, p, b]), {"c": 0, "one": 1})
+        >>> regs.set("n", 2)
+        >>> interp(basic_blocks([c, p, b])[0], regs, observers=[obs]).get("c")
+        2
+        >>> obs.log
+        [True, False]
+
+        >>> env = Env({"t": True})
+        >>> b = Bt("t")
+        >>> b.add_true_next(b)
+        >>> prof = Profile()
+        >>> opts = dict(observers=[Branches()], detect_cycles=True, profile=prof)
+        >>> interp(b, env, **opts)  # doctest: +ELLIPSIS
+        Traceback (most recent call last):
+        ...
+        lang.ExecutionAborted: state at instruction ... repeats after 2 steps
+        >>> list(prof.counts.values())
+        [2]
+    """
+    from time import perf_counter
+
+    if isinstance(environment, RegisterFile):
+        state, step = environment.regs, "step_slots"
+    else:
+        state, step = environment, "step"
+    befores = _hooks(observers, "before")
+    afters = _hooks(observers, "after")
+    branches = _hooks(observers, "on_branch")
+    check = _guard(environment, max_seconds, detect_cycles)
+    record = None if profile is None else _recorder(profile)
+    steps = 0
+    while instruction:
+        if max_steps is not None and steps >= max_steps:
+            raise _out_of_fuel(max_steps, environment, instruction)
+        for hook in befores:
+            hook(instruction, state)
+        if record is None:
+            nxt = getattr(instruction, step)(state)
+        else:
+            start = perf_counter()
+            nxt = getattr(instruction, step)(state)
+            record(instruction, nxt, perf_counter() - start)
+        if branches and _is_branch(instruction):
+            taken = nxt is instruction.nexts[0]
+            for hook in branches:
+                hook(instruction, taken, state)
+        for hook in afters:
+            hook(instruction, state, nxt)
+        steps += 1
+        if check is not None:
+            check(instruction, nxt, steps)
+        instruction = nxt
+    return environment
@@ -0,0 +1,435 @@
+"""
+This file contains micro-benchmarks for the interpreter of our toy language.
+The benchmarks build synthetic programs in the same text format that the
+parser reads (see todo.py), and measure how long it takes to run them. To
+run all the benchmarks, do:
+
+    python3 bench.py
+
+The number of iterations of the synthetic loops can be passed as an argument,
+e.g.: "python3 bench.py 500".
+"""
+
+import sys
+import timeit
+import tracemalloc
+
+from lang import Env, interp, basic_blocks, freeze_preds
+from todo import file2cfg_and_env
+from compiler import compile_program
+
+
+def loop_program(bound):
+    """
+    Produces the lines of a program that counts from zero up to `bound`. The
+    loop body has the same shape as the program in tests/loop.txt.
+
+    Example:
+        >>> env, prog = file2cfg_and_env(loop_program(4))
+        >>> interp(prog[0], env).get("sum")
+        8
+    """
+    return [
+        f'{{"zero": 0, "one": 1, "bound": {bound}}}',
+        "count = add zero one",
+        "sum = add zero zero",
+        "sum = add sum one",
+        "sum = add sum one",
+        "count = add count one",
+        "repeat = geq bound count",
+        "bt repeat 2",
+        "end = add zero zero",
+    ]
+
+
+def straight_program(size):
+    """
+    Produces the lines of a program with `size` instructions. One in every
+    ten instructions is a branch; the others are additions over a pool of
+    fifty variables.
+
+    Example:
+        >>> env, prog = file2cfg_and_env(straight_program(20))
+        >>> len(prog)
+        20
+    """
+    lines = ['{"zero": 0, "one": 1}']
+    for i in range(size):
+        if i % 10 == 9:
+            lines.append(f"bt zero {min(i + 3, size - 1)}")
+        else:
+            lines.append(f"x{i % 50} = add x{(i + 1) % 50} one")
+    return lines
+
+
+def interp_recursive(instruction, environment):
+    """
+    The recursive interpreter that we used before the flat dispatch loop. It
+    is kept here only as a baseline for the benchmarks.
+
+    Example:
+        >>> env, prog = file2cfg_and_env(loop_program(4))
+        >>> interp_recursive(prog[0], env).get("sum")
+        8
+    """
+    if instruction:
+        instruction.eval(environment)
+        return interp_recursive(instruction.get_next(), environment)
+    else:
+        return environment
+
+
+def time_run(run, lines, repeat=3, prepare=None, **parse_args):
+    """
+    Parses `lines` and returns the best wall-clock time, in seconds, that
+    `run(entry, env)` takes, out of `repeat` executions. The entry is the
+    first instruction, or whatever `prepare(program)` returns, if `prepare` is
+    given; the time spent in `prepare` is not measured. Each run gets a
+    freshly parsed program, so that no state leaks between runs. The keyword
+    arguments are forwarded to the parser.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        env, prog = file2cfg_and_env(lines, **parse_args)
+        entry = prepare(prog) if prepare else prog[0]
+        start = timeit.default_timer()
+        run(entry, env)
+        best = min(best, timeit.default_timer() - start)
+    return best
+
+
+def bench_interp(bound):
+    """
+    Compares the flat interpreter against the recursive one. The recursion
+    limit is raised for the recursive version, as it would not be able to run
+    long loops otherwise.
+    """
+    lines = loop_program(bound)
+    steps = 3 + 5 * bound
+    old_limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(old_limit, 2 * steps + 100))
+    try:
+        t_rec = time_run(interp_recursive, lines)
+    finally:
+        sys.setrecursionlimit(old_limit)
+    t_flat = time_run(interp, lines)
+    print(f"interp, {steps} steps:")
+    print(f"  recursive: {t_rec:.4f}s")
+    print(f"  flat:      {t_flat:.4f}s ({t_rec / t_flat:.2f}x)")
+
+
+def bench_slots(bound):
+    """
+    Compares the interpretation of a program with variables looked up by name
+    in an Env against variables resolved to slots in a RegisterFile.
+    """
+    lines = loop_program(bound)
+    t_env = time_run(interp, lines)
+    t_slots = time_run(interp, lines, slots=True)
+    print(f"interp, {3 + 5 * bound} steps:")
+    print(f"  Env:          {t_env:.4f}s")
+    print(f"  RegisterFile: {t_slots:.4f}s ({t_env / t_slots:.2f}x)")
+
+
+def bench_compiler(bound):
+    """
+    Compares the interpreter against a program compiled into a Python
+    function. The time to compile the program is reported separately.
+    """
+    lines = loop_program(bound)
+    t_interp = time_run(interp, lines)
+    env, prog = file2cfg_and_env(lines)
+    start = timeit.default_timer()
+    run = compile_program(prog)
+    t_compile = timeit.default_timer() - start
+    t_run = float("inf")
+    for _ in range(3):
+        env, _ = file2cfg_and_env(lines)
+        start = timeit.default_timer()
+        run(env)
+        t_run = min(t_run, timeit.default_timer() - start)
+    print(f"interp, {3 + 5 * bound} steps:")
+    print(f"  interp:   {t_interp:.4f}s")
+    print(f"  compiled: {t_run:.4f}s ({t_interp / t_run:.2f}x)")
+    print(f"  compile:  {t_compile:.4f}s")
+
+
+def bench_blocks(bound):
+    """
+    Compares the interpretation of instructions against the interpretation of
+    basic blocks, which dispatches once per block.
+    """
+    lines = loop_program(bound)
+    t_insts = time_run(interp, lines)
+    t_blocks = time_run(interp, lines, prepare=lambda prog: basic_blocks(prog)[0])
+    print(f"interp, {3 + 5 * bound} steps:")
+    print(f"  instructions: {t_insts:.4f}s")
+    print(f"  blocks:       {t_blocks:.4f}s ({t_insts / t_blocks:.2f}x)")
+
+
+class DictBinOp:
+    """
+    A binary instruction laid out as before instructions had __slots__: its
+    fields live in a __dict__, and it has a list of successors. It is kept
+    here only as a baseline for the benchmarks (see `dict_program`).
+    """
+
+    def __init__(s, ID, dst, src0, src1):
+        s.dst = dst
+        s.src0 = src0
+        s.src1 = src1
+        s.nexts = []
+        s.preds = []
+        s.ID = ID
+
+
+class DictBt:
+    """
+    A branch laid out as before instructions had __slots__ (see DictBinOp).
+    """
+
+    def __init__(s, ID, cond):
+        s.nexts = [None, None]
+        s.preds = []
+        s.ID = ID
+        s.cond = cond
+
+
+def dict_program(lines):
+    """
+    Builds the instructions of a program made by `straight_program` as the
+    parser built them before instructions had __slots__: with DictBinOp and
+    DictBt, and without interning the names of variables. As in the parser,
+    only fall-through edges are recorded in the predecessors. It is kept
+    here only as a baseline for `bench_memory`.
+
+    Example:
+        >>> prog = dict_program(straight_program(20))
+        >>> len(prog), prog[9].nexts[0] is prog[12], prog[1].preds == [prog[0]]
+        (20, True, True)
+    """
+    insts = []
+    targets = []
+    for ID, line in enumerate(lines[1:]):
+        tokens = line.split()
+        if tokens[0] == "bt":
+            inst = DictBt(ID, tokens[1])
+            targets.append((inst, int(tokens[2])))
+        else:
+            inst = DictBinOp(ID, tokens[0], tokens[3], tokens[4])
+        if insts and isinstance(insts[-1], DictBt):
+            insts[-1].nexts[1] = inst
+        elif insts:
+            insts[-1].nexts.append(inst)
+            inst.preds.append(insts[-1])
+        insts.append(inst)
+    for inst, target in targets:
+        inst.nexts[0] = insts[target]
+    return insts
+
+
+def bench_memory(size):
+    """
+    Reports how many bytes each instruction of a program takes: with the
+    layout that instructions had before __slots__ (see `dict_program`), as
+    the parser builds them now, and after their lists of predecessors are
+    frozen into tuples.
+    """
+    import gc
+
+    lines = straight_program(size)
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    prog = dict_program(lines)
+    before = tracemalloc.get_traced_memory()[0] - base
+    del prog
+    gc.collect()
+    base = tracemalloc.get_traced_memory()[0]
+    env, prog = file2cfg_and_env(lines)
+    parsed = tracemalloc.get_traced_memory()[0] - base
+    freeze_preds(prog)
+    frozen = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    print(f"memory, {size} instructions:")
+    print(f"  __dict__: {before / size:.1f} bytes per instruction")
+    print(f"  parsed:   {parsed / size:.1f} bytes per instruction")
+    print(f"  frozen:   {frozen / size:.1f} bytes per instruction")
+
+
+def bench_vectorized(num_inputs):
+    """
+    Compares running a program once per input, with interp, against running
+    it over all the inputs at once, with the vectorized interpreter.
+    """
+    from vectorized import interp_vectorized
+
+    inputs = [{"zero": 0, "one": 1, "bound": 1 + i % 20} for i in range(num_inputs)]
+    _, prog = file2cfg_and_env(loop_program(0))
+    start = timeit.default_timer()
+    for env_dict in inputs:
+        interp(prog[0], Env(env_dict))
+    t_interp = timeit.default_timer() - start
+    start = timeit.default_timer()
+    interp_vectorized(prog, inputs)
+    t_vector = timeit.default_timer() - start
+    print(f"loop program, {num_inputs} inputs:")
+    print(f"  interp:     {1e6 * t_interp / num_inputs:.2f}us per input")
+    print(f"  vectorized: {1e6 * t_vector / num_inputs:.2f}us per input")
+
+
+def bench_overflow(num_inputs):
+    """
+    Runs the factorial of small numbers over many inputs with the vectorized
+    interpreter: first with results that fit into 64 bits, and then with a
+    few inputs whose factorials do not, so that the variable that holds the
+    factorial falls back to Python integers.
+    """
+    from vectorized import interp_vectorized
+
+    lines = [
+        '{"zero": 0, "one": 1, "n": 0}',
+        "c = add zero zero",
+        "f = add one zero",
+        "c = add c one",
+        "f = mul f c",
+        "p = lth c n",
+        "bt p 2",
+    ]
+    _, prog = file2cfg_and_env(lines)
+    print(f"factorial, {num_inputs} inputs:")
+    for top in [20, 25]:
+        inputs = [{"zero": 0, "one": 1, "n": 1 + i % top} for i in range(num_inputs)]
+        start = timeit.default_timer()
+        result = interp_vectorized(prog, inputs)
+        t = timeit.default_timer() - start
+        print(f"  n <= {top}: {1e6 * t / num_inputs:.2f}us per input", end=" ")
+        print(f"(f is {result['f'].dtype})")
+
+
+def bench_parser(num_lines):
+    """
+    Compares the speed of the parser, in lines per second, when it splits
+    each line once (todo.tokenize) and when it searches each line with the
+    regular expression (todo.tokenize_regex). The program is generated in
+    memory, so that the time to read it from disk is not measured.
+    """
+    import todo
+
+    lines = straight_program(num_lines)
+    print(f"parser, {num_lines} lines:")
+    for name in ["tokenize_regex", "tokenize"]:
+        old_tokenize = todo.tokenize
+        todo.tokenize = getattr(todo, name)
+        try:
+            start = timeit.default_timer()
+            file2cfg_and_env(lines)
+            t = timeit.default_timer() - start
+        finally:
+            todo.tokenize = old_tokenize
+        print(f"  {name + ':':15} {num_lines / t:,.0f} lines/s")
+
+
+def bench_loader(num_lines):
+    """
+    Compares parsing a program from its text against loading it from the
+    binary format of cfgfile.py, with every instruction decoded at once, and
+    with the file mapped into memory: once with only the entry decoded, and
+    once running the program, which decodes the instructions that run.
+    """
+    import json
+    import os
+    import tempfile
+
+    import cfgfile
+
+    def lazy_load(path, run):
+        env, prog = cfgfile.load(path, lazy=True)
+        with prog:
+            if run:
+                interp(prog[0], env)
+            else:
+                prog[0]
+
+    lines = straight_program(num_lines)
+    # Binds the variables of the program, so that it can run.
+    lines[0] = json.dumps({"zero": 0, "one": 1, **{f"x{i}": i for i in range(50)}})
+    env, prog = file2cfg_and_env(lines)
+    with tempfile.TemporaryDirectory() as tmp:
+        text_path = os.path.join(tmp, "prog.txt")
+        binary_path = os.path.join(tmp, "prog.cfg")
+        with open(text_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        cfgfile.save(binary_path, prog, env)
+        runs = [
+            ("text", lambda: file2cfg_and_env(open(text_path))),
+            ("binary", lambda: cfgfile.load(binary_path)),
+            ("lazy", lambda: lazy_load(binary_path, run=False)),
+            ("lazy+run", lambda: lazy_load(binary_path, run=True)),
+        ]
+        print(f"loader, {num_lines} instructions:")
+        for name, run in runs:
+            t = min(timeit.repeat(run, number=1, repeat=3))
+            print(f"  {name + ':':9} {num_lines / t:,.0f} instructions/s")
+        print(f"  sizes:   {os.path.getsize(text_path):,} bytes of text,", end=" ")
+        print(f"{os.path.getsize(binary_path):,} bytes of binary")
+
+
+def bench_cache(num_lines):
+    """
+    Compares parsing a program with parsing it through the cache of
+    parsecache.py: once when the program is not in the cache yet, and once
+    when it is.
+    """
+    import tempfile
+
+    from parsecache import ParseCache
+
+    lines = straight_program(num_lines)
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ParseCache(tmp, file2cfg_and_env)
+        print(f"parse cache, {num_lines} lines:")
+        t = min(timeit.repeat(lambda: file2cfg_and_env(lines), number=1, repeat=3))
+        print(f"  no cache: {t:.4f}s")
+        run = lambda: file2cfg_and_env(lines, cache=cache)
+        t = timeit.timeit(run, number=1)
+        print(f"  miss:     {t:.4f}s")
+        t = min(timeit.repeat(run, number=1, repeat=3))
+        print(f"  hit:      {t:.4f}s")
+        print(f"  {cache.stats()}")
+
+
+def bench_incremental(num_lines):
+    """
+    Compares parsing a program again after one of its lines changes, against
+    patching the program that was parsed before the change.
+    """
+    from incremental import update
+
+    old = straight_program(num_lines)
+    new = list(old)
+    new[num_lines // 2] = "x0 = mul x1 one"
+    t_parse = min(timeit.repeat(lambda: file2cfg_and_env(new), number=1, repeat=3))
+    t_patch = float("inf")
+    for _ in range(3):
+        _, prog = file2cfg_and_env(old)
+        start = timeit.default_timer()
+        update(prog, old, new)
+        t_patch = min(t_patch, timeit.default_timer() - start)
+    print(f"one line changed, {num_lines} lines:")
+    print(f"  parse again: {t_parse:.4f}s")
+    print(f"  patch:       {t_patch:.4f}s ({t_parse / t_patch:.2f}x)")
+
+
+if __name__ == "__main__":
+    bound = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    bench_interp(bound)
+    bench_slots(100 * bound)
+    bench_compiler(100 * bound)
+    bench_blocks(100 * bound)
+    bench_memory(1000 * bound)
+    bench_vectorized(100 * bound)
+    bench_overflow(100 * bound)
+    bench_parser(10000 * bound)
+    bench_loader(1000 * bound)
+    bench_cache(1000 * bound)
+    bench_incremental(1000 * bound)
@@ -0,0 +1,365 @@
+"""
+This file implements a compiler from our toy language to Python. Instead of
+interpreting one instruction at a time, the compiler translates a whole
+program, as produced by `todo.file2cfg_and_env`, into the source code of a
+single Python function, which is then passed through `compile()`. Variables of
+the toy program become local variables of that function, so that binary
+instructions become plain Python arithmetic.
+
+Branches become real `if` and `while` statements whenever the program is
+structured: every forward branch skips a region of code, every backward branch
+closes a loop, and these regions nest properly. Otherwise, the compiler falls
+back to a dispatch loop over basic blocks, which handles any control-flow
+graph.
+
+Example:
+    >>> from todo import file2cfg_and_env
+    >>> lines = ['{"a": 1, "b": 3, "c": 5}', 'x = add a b', 'x = add x c']
+    >>> env, prog = file2cfg_and_env(lines)
+    >>> run = compile_program(prog)
+    >>> run(env).get("x")
+    9
+"""
+
+from lang import BinOp, Bt
+
+
+class _Unstructured(Exception):
+    """
+    Raised when the control-flow graph cannot be written with if/while.
+    """
+
+
+class _Unbound:
+    """
+    The value of the local of a variable that has no binding. Using it, in
+    arithmetic, in a comparison or as the condition of a branch, raises the
+    LookupError that the interpreter raises when it reads the variable;
+    hence, the compiled code needs no check of its own until then.
+
+    Example:
+        >>> x = _Unbound("x")
+        >>> 1 < x
+        Traceback (most recent call last):
+        ...
+        LookupError: Absent key x
+    """
+
+    __slots__ = ("name",)
+
+    def __init__(s, name):
+        s.name = name
+
+    def _absent(s, *args):
+        raise LookupError(f"Absent key {s.name}")
+
+    __add__ = __radd__ = __mul__ = __rmul__ = _absent
+    __lt__ = __le__ = __gt__ = __ge__ = __bool__ = _absent
+
+
+def _read(env, name):
+    """
+    The value of variable 'name' in 'env', which can be an Env or a
+    RegisterFile, or an _Unbound, if the variable has no binding.
+
+    Example:
+        >>> from lang import Env, RegisterFile
+        >>> _read(Env({"a": 1}), "a"), _read(RegisterFile({}, {"a": 2}), "a")
+        (1, 2)
+        >>> _read(RegisterFile({"b": 0}), "b").name
+        'b'
+    """
+    try:
+        return env.get(name)
+    except LookupError:
+        return _Unbound(name)
+
+
+def _write_back(env, pairs):
+    """
+    Binds in 'env' each variable of the list 'pairs', of names and values,
+    whose value is not an _Unbound.
+    """
+    for var, val in pairs:
+        if not isinstance(val, _Unbound):
+            env.set(var, val)
+
+
+def _var(name):
+    """
+    The name of the Python local that holds variable 'name'. The prefix avoids
+    clashes with Python keywords and with the names used by the compiler.
+
+    Example:
+        >>> _var("if")
+        'v_if'
+    """
+    return f"v_{name}"
+
+
+def _binop(inst):
+    """
+    The Python statement that implements a binary instruction.
+
+    Example:
+        >>> from lang import Lth
+        >>> _binop(Lth("p", "a", "b"))
+        'v_p = v_a < v_b'
+    """
+    op = inst.get_opcode()
+    return f"{_var(inst.dst)} = {_var(inst.src0)} {op} {_var(inst.src1)}"
+
+
+def _variables(insts):
+    """
+    The variables read or written by the instructions, in order of first
+    appearance.
+    """
+    names = {}
+    for inst in insts:
+        if isinstance(inst, BinOp):
+            for name in (inst.dst, inst.src0, inst.src1):
+                names.setdefault(name, None)
+        else:
+            names.setdefault(inst.cond, None)
+    return list(names)
+
+
+def _is_linear(insts):
+    """
+    Checks if the fall-through successor of each instruction is the next
+    instruction in the list, as it is the case for programs built by the
+    parser. Only such programs can be structured.
+    """
+    index = {id(inst): i for i, inst in enumerate(insts)}
+    for i, inst in enumerate(insts):
+        fall = inst.nexts[1] if isinstance(inst, Bt) else inst.get_next()
+        expected = insts[i + 1] if i + 1 < len(insts) else None
+        if fall is not expected:
+            return False
+        if isinstance(inst, Bt) and id(inst.nexts[0]) not in index:
+            return False
+    return True
+
+
+def _structured_body(insts):
+    """
+    Produces the lines of Python code that implement the instructions in
+    'insts' using only if/while statements. Raises _Unstructured if the
+    branches do not nest properly.
+
+    Example:
+        >>> from todo import file2cfg_and_env
+        >>> lines = ['{"a": 1, "b": 3, "x": 42, "z": 0}', 'bt a 2',
+        ...          'x = add a b', 'x = add x z']
+        >>> _, prog = file2cfg_and_env(lines)
+        >>> print("\\n".join(_structured_body(prog)))
+        if not v_a:
+            v_x = v_a + v_b
+        v_x = v_x + v_z
+    """
+    index = {id(inst): i for i, inst in enumerate(insts)}
+    target = {}
+    latch = {}
+    for i, inst in enumerate(insts):
+        if isinstance(inst, Bt):
+            t = index[id(inst.nexts[0])]
+            target[i] = t
+            if t <= i:
+                if t in latch:
+                    raise _Unstructured(f"two loops share the header {t}")
+                latch[t] = i
+
+    def emit(lo, hi, depth, code, opened=None):
+        """
+        Emits the instructions in [lo, hi). If 'opened' is given, then it is
+        the header of the loop whose body starts at 'lo'.
+        """
+        pad = "    " * depth
+        i = lo
+        while i < hi:
+            if i in latch and i != opened:
+                b = latch[i]
+                if b >= hi:
+                    raise _Unstructured(f"loop at {i} crosses a region")
+                code.append(f"{pad}while True:")
+                emit(i, b, depth + 1, code, opened=i)
+                code.append(f"{pad}    if not {_var(insts[b].cond)}:")
+                code.append(f"{pad}        break")
+                i = b + 1
+            elif i in target:
+                t = target[i]
+                if t <= i or t > hi:
+                    raise _Unstructured(f"branch at {i} leaves its region")
+                code.append(f"{pad}if not {_var(insts[i].cond)}:")
+                mark = len(code)
+                emit(i + 1, t, depth + 1, code)
+                if len(code) == mark:
+                    code.append(f"{pad}    pass")
+                i = t
+            else:
+                code.append(pad + _binop(insts[i]))
+                i += 1
+
+    code = []
+    emit(0, len(insts), 0, code)
+    return code
+
+
+def _dispatch_body(insts):
+    """
+    Produces the lines of Python code that implement the instructions in
+    'insts' as a loop that dispatches on the label of basic blocks. This
+    translation works for any control-flow graph.
+    """
+    reachable = []
+    seen = set()
+    stack = [insts[0]]
+    while stack:
+        inst = stack.pop()
+        if inst is None or id(inst) in seen:
+            continue
+        seen.add(id(inst))
+        reachable.append(inst)
+        stack.extend(reversed(inst.nexts))
+    num_preds = {}
+    for inst in reachable:
+        for n in inst.nexts:
+            if n is not None:
+                num_preds[id(n)] = num_preds.get(id(n), 0) + 1
+    leaders = {id(insts[0])}
+    for inst in reachable:
+        if isinstance(inst, Bt):
+            leaders.update(id(n) for n in inst.nexts if n is not None)
+        elif num_preds.get(id(inst), 0) > 1:
+            leaders.add(id(inst))
+    label = {}
+    for inst in reachable:
+        if id(inst) in leaders:
+            label[id(inst)] = len(label)
+
+    def goto(inst):
+        return "-1" if inst is None else str(label[id(inst)])
+
+    code = ["pc = 0", "while pc >= 0:"]
+    for inst in reachable:
+        if id(inst) not in leaders:
+            continue
+        code.append(f"    if pc == {label[id(inst)]}:")
+        while True:
+            if isinstance(inst, Bt):
+                t, f = goto(inst.nexts[0]), goto(inst.nexts[1])
+                code.append(f"        pc = {t} if {_var(inst.cond)} else {f}")
+                break
+            code.append("        " + _binop(inst))
+            inst = inst.get_next()
+            if inst is None or id(inst) in leaders:
+                code.append(f"        pc = {goto(inst)}")
+                break
+        code.append("        continue")
+    return code
+
+
+def program_source(insts, name="compiled"):
+    """
+    Produces the source code of a Python function that implements the program
+    'insts'. The function receives an Env, or a RegisterFile, reads the
+    variables of the program into locals, runs the program, and writes the
+    final values back into the environment, which is then returned. The
+    locals of variables that have no binding hold an _Unbound, so that the
+    program raises a LookupError where it reads them, like `lang.interp`.
+
+    Example:
+        >>> from todo import file2cfg_and_env
+        >>> lines = ['{"zero": 0, "one": 1, "n": 3}', 'c = add zero zero',
+        ...          'c = add c one', 'p = lth c n', 'bt p 1']
+        >>> _, prog = file2cfg_and_env(lines)
+        >>> print(program_source(prog))
+        def compiled(env):
+            v_c = _read(env, 'c')
+            v_zero = _read(env, 'zero')
+            v_one = _read(env, 'one')
+            v_p = _read(env, 'p')
+            v_n = _read(env, 'n')
+            v_c = v_zero + v_zero
+            while True:
+                v_c = v_c + v_one
+                v_p = v_c < v_n
+                if not v_p:
+                    break
+            _write_back(env, [('c', v_c), ('p', v_p)])
+            return env
+    """
+    names = _variables(insts)
+    defs = []
+    for inst in insts:
+        if isinstance(inst, BinOp) and inst.dst not in defs:
+            defs.append(inst.dst)
+    if not insts:
+        body = []
+    elif _is_linear(insts):
+        try:
+            body = _structured_body(insts)
+        except _Unstructured:
+            body = _dispatch_body(insts)
+    else:
+        body = _dispatch_body(insts)
+    code = [f"def {name}(env):"]
+    code += [f"    {_var(n)} = _read(env, {n!r})" for n in names]
+    code += ["    " + ln for ln in body]
+    if defs:
+        pairs = ", ".join(f"({n!r}, {_var(n)})" for n in defs)
+        code.append(f"    _write_back(env, [{pairs}])")
+    code.append("    return env")
+    return "\n".join(code)
+
+
+def compile_program(insts):
+    """
+    Compiles the program 'insts' into a Python function that receives an Env
+    and returns it, after running the program. The function is cached in the
+    first instruction of the program, so that compiling the same program
+    again is free.
+
+    Example:
+        >>> from todo import file2cfg_and_env
+        >>> lines = ['{"zero": 0, "one": 1, "three": 3, "iter": 9}',
+        ...          'count = add zero three', 'pred = add zero one',
+        ...          'fib = add zero one', 'aux = add zero fib',
+        ...          'fib = add pred fib', 'pred = add zero aux',
+        ...          'count = add count one', 'repeat = geq iter count',
+        ...          'bt repeat 3', 'end = add zero zero']
+        >>> env, prog = file2cfg_and_env(lines)
+        >>> run = compile_program(prog)
+        >>> run(env).get("fib")
+        34
+        >>> compile_program(prog) is run
+        True
+
+        The program can also run on a RegisterFile, and a variable that has
+        no binding stops it where it is read:
+        >>> from lang import RegisterFile, assign_slots
+        >>> slots = assign_slots(prog)
+        >>> args = {"zero": 0, "one": 1, "three": 3, "iter": 9}
+        >>> run(RegisterFile(slots, args)).get("fib")
+        34
+        >>> regs = RegisterFile(slots, {"zero": 0, "one": 1, "three": 3})
+        >>> run(regs)
+        Traceback (most recent call last):
+        ...
+        LookupError: Absent key iter
+        >>> regs.get("fib")
+        Traceback (most recent call last):
+        ...
+        LookupError: Absent key fib
+    """
+    if insts and getattr(insts[0], "compiled", None) is not None:
+        return insts[0].compiled
+    source = program_source(insts)
+    namespace = {"_read": _read, "_write_back": _write_back}
+    exec(compile(source, "<toy program>", "exec"), namespace)
+    run = namespace["compiled"]
+    run.source = source
+    if insts:
+        insts[0].compiled = run
+    return run
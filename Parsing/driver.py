@@ -3,8 +3,63 @@ import todo
 
 from lang import interp
 
+
+def history_policy(arg):
+    """
+    Converts the argument of the --history option into the 'journal'
+    argument of lang.Env: "full" keeps every binding, "latest" keeps only the
+    current ones, and a number K keeps the last K bindings of each variable.
+
+    Example:
+        >>> [history_policy(arg) for arg in ["full", "latest", "3"]]
+        [True, False, 3]
+    """
+    if arg == "full":
+        return True
+    if arg == "latest":
+        return False
+    return int(arg)
+
+
 if __name__ == "__main__":
-    lines = sys.stdin.readlines()
-    env, program = todo.file2cfg_and_env(lines)
+    """
+    This function reads a program from the standard input, runs it, and
+    prints the final environment, e.g.: "python3 driver.py < tests/fib.txt".
+    By default, the whole history of bindings is printed. The option
+    "--history=latest" prints only the final values, and "--history=K" prints
+    the last K values of each variable; these modes use constant memory.
+    The option "--load=prog.cfg" reads the program from a file in the binary
+    format of cfgfile.py, instead of parsing the standard input. The option
+    "--cache=DIR" keeps parsed programs in the directory DIR, so that the same
+    program is not parsed twice (see parsecache.py); the counters of the
+    cache are printed on stderr. The option "--no-cache" turns it off again.
+    """
+    journal = True
+    binary = None
+    cache_dir = None
+    for arg in sys.argv[1:]:
+        if arg.startswith("--history="):
+            journal = history_policy(arg[len("--history="):])
+        elif arg.startswith("--load="):
+            binary = arg[len("--load="):]
+        elif arg.startswith("--cache="):
+            cache_dir = arg[len("--cache="):]
+        elif arg == "--no-cache":
+            cache_dir = None
+    cache = None
+    if binary is not None:
+        import cfgfile
+
+        env, program = cfgfile.load(binary, journal=journal, lazy=True)
+    else:
+        if cache_dir is not None:
+            import parsecache
+
+            cache = parsecache.ParseCache(cache_dir, todo.file2cfg_and_env)
+        env, program = todo.file2cfg_and_env(sys.stdin, journal=journal, cache=cache)
     final_env = interp(program[0], env)
+    if binary is not None:
+        program.close()
     final_env.dump()
+    if cache is not None:
+        print(cache.stats(), file=sys.stderr)
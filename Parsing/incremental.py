@@ -0,0 +1,313 @@
+"""
+This file implements the incremental parsing of programs. When a few lines of
+a large program change, the program does not need to be parsed again from
+scratch: the instructions of the lines that changed are parsed, and spliced
+into the existing control-flow graph, in place of the instructions of the
+old lines. Only the edges around the splice are fixed, plus the branches
+whose targets now refer to other instructions. The other instructions keep
+their objects and IDs, so that later stages can reuse whatever they computed
+for them, and re-analyse only the instructions that changed.
+
+The result is the same graph that `todo.file2cfg_and_env` would build for the
+new text: the target of a branch is the index in its line, in the new text,
+and every instruction falls through into the next one.
+
+Example:
+    >>> from todo import file2cfg_and_env
+    >>> old = ['{"a": 1, "b": 3, "c": 5}', 'x = add a b', 'x = add x c']
+    >>> new = ['{"a": 1, "b": 3, "c": 5}', 'x = add a b', 'x = mul x c']
+    >>> env, prog = file2cfg_and_env(old)
+    >>> first = prog[0]
+    >>> change = update(prog, old, new)
+    >>> interp(prog[0], env).get("x"), prog[0] is first
+    (20, True)
+"""
+
+import difflib
+import sys
+
+from lang import Bt, interp
+from todo import iname2inst, read_lines, tokenize
+
+
+class Patch:
+    """
+    The instructions affected by a patch, by ID:
+
+        added: the instructions that were created.
+        removed: the instructions that were taken out of the program.
+        relinked: the instructions that remained in the program, but gained
+            or lost a successor or a predecessor.
+
+    Example:
+        >>> p = Patch()
+        >>> p.added.update([7, 8]); p.relinked.add(3)
+        >>> p.changed()
+        [3, 7, 8]
+    """
+
+    def __init__(s):
+        s.added = set()
+        s.removed = set()
+        s.relinked = set()
+
+    def changed(s):
+        """
+        The IDs of the instructions in the program that must be analysed
+        again: the new ones, plus the ones with new edges.
+        """
+        return sorted(s.added | s.relinked)
+
+    def __repr__(s):
+        return (
+            f"Patch(added={sorted(s.added)}, removed={sorted(s.removed)}, "
+            f"relinked={sorted(s.relinked)})"
+        )
+
+
+def _parse(lines):
+    """
+    Parses the instruction 'lines' of a hunk into unlinked instructions.
+    Returns the instructions, and the target index of each new branch.
+    """
+    insts = []
+    targets = []
+    for ln in lines:
+        tokens = tokenize(ln)
+        if tokens is None:
+            continue
+        if len(tokens) == 5:
+            dst, _, iname, op1, op2 = tokens
+            insts.append(iname2inst(dst, iname, op1, op2))
+        else:
+            inst = Bt(sys.intern(tokens[1]), None, None)
+            insts.append(inst)
+            targets.append((inst, int(tokens[2])))
+    return insts, targets
+
+
+def _thaw(inst):
+    # Frozen predecessors (see lang.freeze_preds) become a list again.
+    if isinstance(inst.preds, tuple):
+        inst.preds = list(inst.preds)
+
+
+def _note(inst, result):
+    if inst is not None:
+        result.relinked.add(inst.ID)
+
+
+def _unlink(inst, result):
+    """
+    Takes 'inst' out of the list of predecessors of its successor. The
+    branches and fall-through edges that lead to 'inst' are fixed by `patch`.
+    """
+    if not isinstance(inst, Bt) and inst.next_inst is not None:
+        _thaw(inst.next_inst)
+        if inst in inst.next_inst.preds:
+            inst.next_inst.preds.remove(inst)
+        _note(inst.next_inst, result)
+
+
+def _set_fall_through(inst, nxt, result):
+    """
+    Makes 'nxt' the instruction that runs after 'inst', if 'inst' is not a
+    branch, or if the condition of the branch is false. As in the parser,
+    only instructions that are not branches become predecessors.
+    """
+    if isinstance(inst, Bt):
+        old = inst.nexts[1]
+        if old is nxt:
+            return
+        inst.nexts[1] = nxt
+    else:
+        old = inst.next_inst
+        if old is nxt:
+            return
+        if old is not None:
+            _thaw(old)
+            if inst in old.preds:
+                old.preds.remove(inst)
+        inst.next_inst = nxt
+        if nxt is not None:
+            _thaw(nxt)
+            nxt.preds.append(inst)
+    _note(inst, result)
+    _note(old, result)
+    _note(nxt, result)
+
+
+def patch(insts, hunks):
+    """
+    Applies the 'hunks' to the program 'insts', a list of instructions built
+    by the parser, which is updated in place. Each hunk is a triple (start,
+    end, lines): the instructions in insts[start:end] are replaced by the
+    instructions in 'lines'. Hence, a hunk with start == end inserts lines,
+    and a hunk without lines deletes instructions. Indices refer to the
+    program before the patch, and hunks must not overlap. Branch targets, in
+    the new lines and in the branches that were kept, are indices in the
+    program after the patch. Returns a Patch with the IDs of the affected
+    instructions. If a branch jumps past the end of the new program, then a
+    ValueError is raised, and the program is not changed.
+
+    Example:
+        >>> import lang
+        >>> from todo import file2cfg_and_env
+        >>> lines = ['{"a": 0, "one": 1}', 'x = add a one', 'bt a 3',
+        ...          'x = add x one', 'y = add x x']
+        >>> lang.Inst.next_index = 0
+        >>> env, prog = file2cfg_and_env(lines)
+        >>> [inst.ID for inst in prog]
+        [0, 1, 2, 3]
+        >>> patch(prog, [(1, 1, ['x = add x x'])])
+        Patch(added=[4], removed=[], relinked=[0, 1, 2, 3])
+        >>> [inst.ID for inst in prog], prog[2].nexts[0].ID
+        ([0, 4, 1, 2, 3], 2)
+        >>> interp(prog[0], env).get("y")
+        6
+
+        >>> patch(prog, [(3, 5, [])])
+        Traceback (most recent call last):
+        ...
+        ValueError: bt to missing instruction 3
+    """
+    hunks = sorted(hunks, key=lambda hunk: hunk[0])
+    index = {id(inst): i for i, inst in enumerate(insts)}
+    removed = set()
+    for start, end, _ in hunks:
+        removed.update(id(inst) for inst in insts[start:end])
+
+    # The branches that are kept jump to the index of their old target.
+    kept_targets = [
+        (inst, index[id(inst.nexts[0])])
+        for inst in insts
+        if isinstance(inst, Bt) and id(inst) not in removed and inst.nexts[0]
+    ]
+
+    # Splice the new instructions in, from the last hunk to the first one,
+    # so that the indices of the hunks still to be spliced do not move.
+    parsed = [_parse(lines) for _, _, lines in hunks]
+    size = len(insts)
+    for (start, end, _), (new, _) in zip(hunks, parsed):
+        size += len(new) - (end - start)
+    for _, targets in parsed:
+        for _, target in targets:
+            if target >= size:
+                raise ValueError(f"bt to missing instruction {target}")
+    for _, target in kept_targets:
+        if target >= size:
+            raise ValueError(f"bt to missing instruction {target}")
+
+    result = Patch()
+    old_first = insts[0] if insts else None
+    for (start, end, _), (new, _) in reversed(list(zip(hunks, parsed))):
+        for inst in insts[start:end]:
+            result.removed.add(inst.ID)
+            _unlink(inst, result)
+        insts[start:end] = new
+        result.added.update(inst.ID for inst in new)
+
+    # Fix the fall-through edges around each hunk. Positions are computed
+    # in the new program, so the hunks are walked from the first one.
+    shift = 0
+    for (start, end, _), (new, _) in zip(hunks, parsed):
+        lo = start + shift
+        for pos in range(max(lo - 1, 0), min(lo + len(new), len(insts))):
+            nxt = insts[pos + 1] if pos + 1 < len(insts) else None
+            _set_fall_through(insts[pos], nxt, result)
+        shift += len(new) - (end - start)
+
+    for _, targets in parsed:
+        for inst, target in targets:
+            inst.nexts[0] = insts[target]
+    for inst, target in kept_targets:
+        if inst.nexts[0] is not insts[target]:
+            _note(inst.nexts[0], result)
+            inst.nexts[0] = insts[target]
+            _note(inst, result)
+            _note(inst.nexts[0], result)
+
+    # The compiled version of the program (see compiler.py) is stale now.
+    for inst in (old_first, insts[0] if insts else None):
+        if getattr(inst, "compiled", None) is not None:
+            inst.compiled = None
+    result.relinked -= result.added | result.removed
+    return result
+
+
+def _key(tokens):
+    return " ".join(tokens)
+
+
+def _tokenized(lines):
+    """
+    The tokens and the text of each instruction in 'lines'; lines without
+    instructions are skipped.
+    """
+    result = []
+    for ln in lines:
+        tokens = tokenize(ln)
+        if tokens is not None:
+            result.append((_key(tokens), ln.strip()))
+    return result
+
+
+def diff(old_lines, new_lines):
+    """
+    Compares two versions of the text of a program, and returns the hunks
+    that turn the instructions of the first one into the instructions of the
+    second one (see `patch`). The first line of each text, the environment,
+    is skipped. Lines are compared by their tokens, so changes in spacing do
+    not count. The lines that both texts share at their start and at their
+    end are skipped before any line is tokenized, so that a small edit in a
+    large program is found quickly; only the shared lines at the start need
+    to be tokenized, to count the instructions among them.
+
+    Example:
+        >>> old = ['{}', 'x = add a b', 'y = add x x', '', 'z = add y y']
+        >>> new = ['{}', 'x = add a b', 'w = mul x x', 'y=add x x', 'bt z 0']
+        >>> diff(old, new)
+        [(1, 1, ['w = mul x x']), (2, 3, ['bt z 0'])]
+    """
+    old = list(read_lines(old_lines))[1:]
+    new = list(read_lines(new_lines))[1:]
+    lo = 0
+    while lo < min(len(old), len(new)) and old[lo] == new[lo]:
+        lo += 1
+    hi = 0
+    while hi < min(len(old), len(new)) - lo and old[-1 - hi] == new[-1 - hi]:
+        hi += 1
+    first = sum(1 for ln in old[:lo] if tokenize(ln) is not None)
+    old_middle = _tokenized(old[lo : len(old) - hi])
+    new_middle = _tokenized(new[lo : len(new) - hi])
+    matcher = difflib.SequenceMatcher(
+        None, [key for key, _ in old_middle], [key for key, _ in new_middle], False
+    )
+    return [
+        (first + i1, first + i2, [ln for _, ln in new_middle[j1:j2]])
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag != "equal"
+    ]
+
+
+def update(insts, old_lines, new_lines):
+    """
+    Updates the program 'insts', which the parser built from the text
+    'old_lines', so that it becomes the program of the text 'new_lines' (see
+    `diff` and `patch`). Returns a Patch with the IDs of the affected
+    instructions. The environment of the new text is not read; use
+    `todo.line2env` if it changed.
+
+    Example:
+        >>> import lang
+        >>> from todo import file2cfg_and_env
+        >>> old = open("tests/fib.txt").read().splitlines()
+        >>> new = old[:2] + ["pred = add zero zero"] + old[3:]
+        >>> lang.Inst.next_index = 0
+        >>> env, prog = file2cfg_and_env(old)
+        >>> update(prog, old, new)
+        Patch(added=[10], removed=[1], relinked=[0, 2])
+        >>> interp(prog[0], env).get("fib")
+        21
+    """
+    return patch(insts, diff(old_lines, new_lines))
@@ -6,6 +6,10 @@ integer values. The text file has the following format:
     [First line] A dictionary describing the environment
     [n-th line] The n-th instruction in our program.
 
+The parser reads the lines one by one, so the program can come from a list
+of strings, from a file object, or from a memory-mapped file, without being
+loaded into memory as a whole.
+
 As an example, the program below sums up the numbers a, b and c:
 
     {"a": 1, "b": 3, "c": 5}
@@ -13,53 +17,168 @@ As an example, the program below sums up the numbers a, b and c:
     l2 = x = add x c
 """
 
+import mmap
 import re
+import sys
 
 import lang
-from lang import Env, Inst, Add, Mul, Lth, Geq, interp
+from lang import Env, RegisterFile, Add, Mul, Lth, Geq, interp
+from lang import assign_slots
 
 
-def line2env(line: str) -> Env:
+def line2env(line: str, journal=False, slots=None):
     """
     Maps a string (the line) to a dictionary in python. This function will be
     useful to read the first line of the text file. This line contains the
     initial environment of the program that will be created. If you don't like
-    the function, feel free to drop it off.
+    the function, feel free to drop it off. The `journal` argument selects how
+    much history of its bindings the environment keeps: none (False), all of
+    it (True), or the last K bindings of each variable (K). See lang.Env. If a
+    slot table is given, then the values are stored directly into a
+    RegisterFile that uses these slots (see lang.assign_slots).
 
     Example
         >>> line2env('{"zero": 0, "one": 1, "three": 3, "iter": 9}').get('one')
         1
+
+        >>> line2env('{"zero": 0, "one": 1}', slots={"one": 0}).regs
+        [1, 0]
     """
     import json
 
     env_dict = json.loads(line)
-    env_lang = Env()
+    if slots is not None:
+        return RegisterFile(slots, env_dict)
+    env_lang = Env(journal=journal)
     for k, v in env_dict.items():
         env_lang.set(k, v)
     return env_lang
 
 
+_BINOPS = {"add": Add, "mul": Mul, "lth": Lth, "geq": Geq}
+
+
 def iname2inst(dst, iname: str, op1: str, op2: str):
-    inst: Inst
-    if iname == "add":
-        inst = Add(dst, op1, op2)
-    elif iname == "mul":
-        inst = Mul(dst, op1, op2)
-    elif iname == "lth":
-        inst = Lth(dst, op1, op2)
-    elif iname == "geq":
-        inst = Geq(dst, op1, op2)
-    else:
+    # Variable names are interned, so that all the instructions that use the
+    # same variable share one string.
+    dst, op1, op2 = sys.intern(dst), sys.intern(op1), sys.intern(op2)
+    op = _BINOPS.get(iname)
+    if op is None:
         raise ValueError("unknown inst: {}".format(iname))
+    return op(dst, op1, op2)
+
+
+_id = r"[a-zA-Z_][a-zA-Z0-9_]*"
+_num = r"[0-9]+"
+_bin_op = r"(add|mul|lth|geq)"
+_assignment = rf"({_id})\s*=\s*{_bin_op}\s+({_id})\s+({_id})"
+_branch = rf"(bt)\s+({_id})\s+({_num})"
+
+_pat = re.compile(rf"(?P<assignment>{_assignment})|(?P<bt_expr>{_branch})")
+
+
+def tokenize_regex(line):
+    """
+    Finds an instruction in 'line' with a regular expression, and returns its
+    tokens, as `tokenize` does. This function accepts any line that contains
+    an instruction somewhere, e.g., with no spaces around the '=' sign.
 
-    return inst
+    Example:
+        >>> tokenize_regex("x=add a b")
+        ['x', '=', 'add', 'a', 'b']
+        >>> tokenize_regex("  bt p 12 ")
+        ['bt', 'p', '12']
+        >>> tokenize_regex("not an instruction") is None
+        True
+    """
+    m = _pat.search(line.strip())
+    if not m:
+        return None
+    if m.group("assignment"):
+        dst, iname, op1, op2 = [g for g in m.groups() if g is not None][1:]
+        return [dst, "=", iname, op1, op2]
+    return [g for g in m.groups() if g is not None][1:]
+
+
+def tokenize(line):
+    """
+    Splits 'line' into the tokens of an instruction: [dst, "=", op, src0,
+    src1] for binary instructions, and ["bt", cond, target] for branches.
+    Returns None if the line has no instruction. The line is split once, and
+    the opcode decides what is expected. Lines that are not in this simple
+    form are handed to `tokenize_regex`, so both functions accept the same
+    lines.
 
+    Example:
+        >>> tokenize("x = add a b\\n")
+        ['x', '=', 'add', 'a', 'b']
+        >>> tokenize("bt p 12")
+        ['bt', 'p', '12']
+        >>> tokenize("x = add a b c")
+        ['x', '=', 'add', 'a', 'b']
+        >>> tokenize("") is None
+        True
+    """
+    tokens = line.split()
+    n = len(tokens)
+    if n == 5:
+        dst, eq, op, src0, src1 = tokens
+        if (
+            eq == "="
+            and op in _BINOPS
+            and dst.isidentifier()
+            and src0.isidentifier()
+            and src1.isidentifier()
+            and line.isascii()
+        ):
+            return tokens
+    elif n == 3:
+        bt, cond, target = tokens
+        if (
+            bt == "bt"
+            and cond.isidentifier()
+            and target.isdigit()
+            and line.isascii()
+        ):
+            return tokens
+    elif n == 0:
+        return None
+    return tokenize_regex(line)
+
+
+def read_lines(source):
+    """
+    Iterates over the lines of 'source', which can be any iterable of
+    strings, such as a list or a text file, or an object that has a readline
+    method, such as a binary file or an mmap. Lines in bytes are decoded as
+    UTF-8.
 
-def file2cfg_and_env(lines):
+    Example:
+        >>> import io
+        >>> list(read_lines(io.BytesIO(b"a = add b c\\nbt a 0\\n")))
+        ['a = add b c\\n', 'bt a 0\\n']
+    """
+    if isinstance(source, mmap.mmap) or (
+        hasattr(source, "readline") and not hasattr(source, "__next__")
+    ):
+        source = iter(source.readline, b"")
+    for line in source:
+        yield line.decode("utf-8") if isinstance(line, bytes) else line
+
+
+def file2cfg_and_env(lines, journal=False, slots=False, cache=None):
     """
     Builds a control-flow graph representation for the strings stored in
-    `lines`. The first string represents the environment. The other strings
-    represent instructions.
+    `lines`, which can be any source accepted by `read_lines`. The first
+    string represents the environment. The other strings represent
+    instructions. The lines are parsed as they are read, and the target of
+    each branch is resolved as soon as the instruction that it jumps to is
+    created. The `journal` flag is forwarded to `line2env`. If `slots` is
+    true, then the variables of the program are resolved to slots, and the
+    environment is a RegisterFile. If a `cache` is given (see
+    parsecache.ParseCache), then the program is looked up there first, and
+    parsed only if it is not found. The whole source is read then, to find
+    the hash of its text.
 
     Example:
         >>> l0 = '{"a": 0, "b": 3}'
@@ -83,73 +202,89 @@ def file2cfg_and_env(lines):
         >>> env, prog = file2cfg_and_env([l0, l1, l2])
         >>> interp(prog[0], env).get("x")
         9
-    """
-    insts = []
 
-    if 0 == len(lines):
-        return (Env(), insts)
+        >>> env, prog = file2cfg_and_env([l0, l1, l2], slots=True)
+        >>> interp(prog[0], env).get("x")
+        9
 
-    env = line2env(lines[0])
+        >>> import io
+        >>> text = '{"a": 0, "b": 3}\\nbt a 1\\n\\nx = add a b\\n'
+        >>> env, prog = file2cfg_and_env(io.StringIO(text))
+        >>> interp(prog[0], env).get("x")
+        3
 
-    _id = r"[a-zA-Z_][a-zA-Z0-9_]*"
-    _num = r"[0-9]+"
-    _bin_op = r"(add|mul|lth|geq)"
-    _assignment = rf"({_id})\s*=\s*{_bin_op}\s+({_id})\s+({_id})"
-    _branch = rf"(bt)\s+({_id})\s+({_num})"
+        >>> import tempfile
+        >>> from parsecache import ParseCache
+        >>> cache = ParseCache(tempfile.mkdtemp(), file2cfg_and_env)
+        >>> for _ in range(2):
+        ...     env, prog = file2cfg_and_env(io.StringIO(text), cache=cache)
+        >>> interp(prog[0], env).get("x"), cache.hits, cache.misses
+        (3, 1, 1)
+    """
+    if cache is not None:
+        lines = list(read_lines(lines))
+        return cache.parse(lines, journal=journal, slots=slots)
 
-    pat = re.compile(rf"(?P<assignment>{_assignment})|(?P<bt_expr>{_branch})")
+    insts = []
 
-    # This dict maps indices of Bt line occurrence -> line of inst to jump to
-    # if the condition is true. It seems this language assumes the false branch
-    # is always the next instruction following the 'bt' line
-    bt_if_true_children: dict[int, int] = {}
+    lines = read_lines(lines)
+    first = next(lines, None)
+    if first is None:
+        return (Env(journal=journal), insts)
 
-    for idx, ln in enumerate(lines[1:]):
+    # This dict maps the index of an instruction that does not exist yet to
+    # the branches that jump to it if their condition is true. It seems this
+    # language assumes the false branch is always the next instruction
+    # following the 'bt' line
+    pending_targets: dict[int, list] = {}
 
-        m = pat.search(ln.strip())
+    prev = None
+    for ln in lines:
 
-        if not m:
+        tokens = tokenize(ln)
+
+        if tokens is None:
             continue
             # raise ValueError(f"No match for {ln = }")
 
-        if m.group("assignment"):
-            dst, iname, op1, op2 = [g for g in m.groups() if g is not None][1:]
+        if len(tokens) == 5:
+            dst, _, iname, op1, op2 = tokens
 
             # Instantiate the instruction
             inst = iname2inst(dst, iname, op1, op2)
 
-            # Link a previous existing instruction to the current one
-            if len(insts) > 0 and type(insts[-1]) != lang.Bt:
-                insts[-1].add_next(inst)
-
-            elif len(insts) > 0 and type(insts[-1]) == lang.Bt:
-                # Set false-branch of the last inst (Bt) to the current inst
-                insts[-1].nexts[-1] = inst
-
-            insts.append(inst)
-
-        elif m.group("bt_expr"):
-            iname, op1, op2 = [g for g in m.groups() if g is not None][1:]
-
-            # We store the line that the branch will jump to if cond is true
-            bt_if_true_children[idx] = int(op2)
-
-            # The true-branch will be resolved after all instructions have been
-            # instantiated and added to `insts`
-            inst = lang.Bt(op1, None, None)
-
-            if len(insts) > 0 and type(insts[-1]) != lang.Bt:
-                insts[-1].add_next(inst)
-
-            elif len(insts) > 0 and type(insts[-1]) == lang.Bt:
+        else:
+            _, op1, op2 = tokens
+
+            # The true-branch is resolved now, if it jumps backwards, or as
+            # soon as the instruction that it jumps to is created
+            inst = lang.Bt(sys.intern(op1), None, None)
+            target = int(op2)
+            if target < len(insts):
+                inst.nexts[0] = insts[target]
+            elif target == len(insts):
+                # The branch jumps to itself
+                inst.nexts[0] = inst
+            else:
+                pending_targets.setdefault(target, []).append(inst)
+
+        if pending_targets:
+            for bt in pending_targets.pop(len(insts), ()):
+                bt.nexts[0] = inst
+
+        # Link the previous instruction to the current one
+        if prev is not None:
+            if type(prev) == lang.Bt:
                 # Set false-branch of the last inst (Bt) to the current inst
-                insts[-1].nexts[-1] = inst
+                prev.nexts[-1] = inst
+            else:
+                prev.add_next(inst)
 
-            insts.append(inst)
+        insts.append(inst)
+        prev = inst
 
-    # After all insts have been added to the list, we resolve the jump targets
-    # of `bt` insts (only the true branches need this)
-    for parent, child in bt_if_true_children.items():
-        insts[parent].nexts[0] = insts[child]
+    if pending_targets:
+        raise ValueError(f"bt to missing instruction {min(pending_targets)}")
 
+    env = line2env(first, journal, assign_slots(insts) if slots else None)
     return (env, insts)
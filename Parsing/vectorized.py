@@ -0,0 +1,322 @@
+"""
+This file implements a vectorized interpreter for our toy language. It runs
+the same program over many initial environments at once. Each environment is
+a 'lane', and each variable of the program is a NumPy vector with one entry
+per lane. Binary instructions are evaluated as vector operations.
+
+Lanes might take different paths in the program. Every lane has its own
+program counter, which is the index of the basic block it must run next. At
+each step, the interpreter picks the smallest program counter among the lanes
+that have not finished yet, and runs that block for all the lanes that are
+there, using a mask. Lanes that took different paths reconverge as soon as
+they reach the same block. As blocks are numbered in program order, lanes that
+leave a loop early wait after it, while the others finish their iterations.
+
+Values are stored as 64-bit integers; the results of comparisons become 0 or
+1. Additions and multiplications are checked for overflow. If an instruction
+overflows, then the variable that it defines switches to Python integers,
+which have no bound, and so does every variable computed from it. The other
+variables remain 64-bit integers. As in `lang.interp`, a LookupError is
+raised if a lane reads a variable that has no value. This file requires NumPy.
+
+Example:
+    >>> from todo import file2cfg_and_env
+    >>> lines = ['{"zero": 0, "one": 1, "n": 0}', 'c = add zero zero',
+    ...          'f = add one zero', 'c = add c one', 'f = mul f c',
+    ...          'p = lth c n', 'bt p 2']
+    >>> _, prog = file2cfg_and_env(lines)
+    >>> envs = [{"zero": 0, "one": 1, "n": n} for n in range(1, 7)]
+    >>> interp_vectorized(prog, envs, outputs=["f"])["f"].tolist()
+    [1, 2, 6, 24, 120, 720]
+"""
+
+import numpy as np
+
+from lang import BinOp, basic_blocks
+
+
+_UFUNCS = {"+": np.add, "*": np.multiply, "<": np.less, ">=": np.greater_equal}
+
+
+def _column(values):
+    """
+    Converts a sequence of integers into a column of 64-bit integers, or of
+    Python integers if some value does not fit into 64 bits.
+
+    Example:
+        >>> _column([1, 2]).dtype, _column([1, 2 ** 70]).dtype
+        (dtype('int64'), dtype('O'))
+    """
+    try:
+        return np.array(values, dtype=np.int64)
+    except OverflowError:
+        return np.array([int(v) for v in values], dtype=object)
+
+
+_INT64_MIN = np.iinfo(np.int64).min
+
+
+def _overflows(ufunc, a, b, result):
+    """
+    Checks if `ufunc(a, b)`, computed with 64-bit integers, overflowed in
+    some lane. Both checks are exact. A sum overflows if the operands have
+    the same sign, and the result has the other sign. A product overflows if
+    dividing the wrapped result by one operand does not give back the other
+    one. The only product that this division misses is -1 * -2^63, which is
+    checked apart.
+
+    Example:
+        >>> big = np.array([2 ** 62], dtype=np.int64)
+        >>> _overflows(np.add, big, big, big + big)
+        True
+        >>> _overflows(np.multiply, big, big - big, big * 0)
+        False
+        >>> half = np.array([2 ** 31, -(2 ** 31)], dtype=np.int64)
+        >>> _overflows(np.multiply, half, half, half * half)
+        False
+        >>> _overflows(np.multiply, half, 2 * half, half * (2 * half))
+        True
+    """
+    if ufunc is np.add:
+        return bool(np.any((a ^ result) & (b ^ result) < 0))
+    if ufunc is np.multiply:
+        a, b = np.broadcast_arrays(a, b)
+        nonzero = a != 0
+        with np.errstate(over="ignore"):
+            back = result // np.where(nonzero, a, 1)
+        wrong = nonzero & (back != b)
+        wrong |= (a == -1) & (b == _INT64_MIN)
+        return bool(np.any(wrong))
+    return False
+
+
+def _apply(ufunc, a, b, name, overflow):
+    """
+    Computes `ufunc(a, b)`. The result is a column of 64-bit integers, unless
+    an operand is a column of Python integers, or the operation overflows.
+    In the latter case, the operation is computed again with Python integers
+    if 'overflow' is "promote", and an OverflowError is raised if it is
+    "raise". The name of the variable being defined goes into the error.
+
+    Example:
+        >>> big = np.array([2 ** 62, 1], dtype=np.int64)
+        >>> _apply(np.multiply, big, big, "x", "promote").tolist()
+        [21267647932558653966460912964485513216, 1]
+        >>> _apply(np.multiply, big, big, "x", "raise")
+        Traceback (most recent call last):
+        ...
+        OverflowError: x overflows 64 bits
+    """
+    wide = a.dtype == object or b.dtype == object
+    with np.errstate(over="ignore"):
+        result = ufunc(a, b)
+    if result.dtype == bool or (wide and ufunc not in (np.add, np.multiply)):
+        return result.astype(np.int64)
+    if not wide and _overflows(ufunc, a, b, result):
+        if overflow == "raise":
+            raise OverflowError(f"{name} overflows 64 bits")
+        result = ufunc(a.astype(object), b.astype(object))
+    return result
+
+
+def lanes(envs, names=()):
+    """
+    Converts the initial environments into columns: a dictionary that maps
+    each variable to a vector with its value in every lane. 'envs' can be a
+    list of dictionaries, one per lane, or a dictionary of columns already.
+    Variables in 'names' that are missing from the environments get zeros,
+    which are only placeholders: see `_unbound`.
+
+    Example:
+        >>> cols = lanes([{"a": 1, "b": 2}, {"a": 3, "b": 4}], ["c"])
+        >>> {k: v.tolist() for k, v in sorted(cols.items())}
+        {'a': [1, 3], 'b': [2, 4], 'c': [0, 0]}
+    """
+    if isinstance(envs, dict):
+        columns = {k: _column(v) for k, v in envs.items()}
+    else:
+        keys = {}
+        for env in envs:
+            keys.update(dict.fromkeys(env))
+        columns = {k: _column([env.get(k, 0) for env in envs]) for k in keys}
+    num_lanes = len(next(iter(columns.values()))) if columns else 0
+    for name in names:
+        if name not in columns:
+            columns[name] = np.zeros(num_lanes, dtype=np.int64)
+    return columns
+
+
+def _unbound(envs, columns):
+    """
+    Finds the lanes where each variable has no value: the variables that
+    `lanes` filled with placeholders. Returns a dictionary that maps these
+    variables to a mask of such lanes. The interpreter raises a LookupError
+    when a lane reads a variable that has no value, like `lang.Env.get`.
+
+    Example:
+        >>> envs = [{"a": 1, "b": 2}, {"a": 3}]
+        >>> cols = lanes(envs, ["c"])
+        >>> {k: v.tolist() for k, v in sorted(_unbound(envs, cols).items())}
+        {'b': [False, True], 'c': [True, True]}
+    """
+    # The number of lanes that give a value to each variable.
+    if isinstance(envs, dict):
+        counts = {k: len(v) for k, v in envs.items()}
+    else:
+        counts = {}
+        for env in envs:
+            for k in env:
+                counts[k] = counts.get(k, 0) + 1
+    missing = {}
+    for k, column in columns.items():
+        if k not in counts:
+            missing[k] = np.ones(len(column), dtype=bool)
+        elif counts[k] != len(column):
+            missing[k] = np.array([k not in env for env in envs], dtype=bool)
+    return missing
+
+
+def _read(unbound, names, mask):
+    """
+    Raises the error of `lang.Env.get` if a lane in 'mask' reads one of the
+    variables in 'names' before it has a value.
+    """
+    for name in names:
+        lanes = unbound.get(name)
+        if lanes is not None and lanes[mask].any():
+            raise LookupError(f"Absent key {name}")
+
+
+def _bind(unbound, name, mask):
+    """
+    Records that the lanes in 'mask' have given a value to 'name'.
+    """
+    lanes = unbound.get(name)
+    if lanes is not None:
+        lanes[mask] = False
+        if not lanes.any():
+            del unbound[name]
+
+
+def _program_vars(insts):
+    names = {}
+    for inst in insts:
+        names.update(dict.fromkeys(inst.definition() | inst.uses()))
+    return list(names)
+
+
+def interp_vectorized(insts, envs, outputs=None, max_steps=None, overflow="promote"):
+    """
+    Runs the program 'insts', as produced by the parser, over every initial
+    environment in 'envs' (see `lanes`). Returns a dictionary that maps each
+    variable in 'outputs' (by default, all the variables) to a vector with its
+    final value in each lane. If 'max_steps' is given, then at most that many
+    blocks are dispatched, otherwise a RuntimeError is raised. If 'overflow'
+    is "promote", then variables whose values do not fit into 64 bits become
+    columns of Python integers (with dtype object); if it is "raise", then an
+    OverflowError is raised instead.
+
+    Example:
+        >>> from todo import file2cfg_and_env
+        >>> lines = ['{"m": 0, "n": 0, "zero": 0, "one": 1}', 'p = lth n m',
+        ...          'bt p 4', 'answer = add m zero', 'bt one 5',
+        ...          'answer = add n zero', 'end = add zero zero']
+        >>> _, prog = file2cfg_and_env(lines)
+        >>> cols = {"m": [3, 1, 5], "n": [2, 4, 5], "zero": [0] * 3, "one": [1] * 3}
+        >>> interp_vectorized(prog, cols, outputs=["answer"])["answer"].tolist()
+        [2, 1, 5]
+
+        >>> lines = ['{"zero": 0, "one": 1, "n": 0}', 'c = add zero zero',
+        ...          'f = add one zero', 'c = add c one', 'f = mul f c',
+        ...          'p = lth c n', 'bt p 2']
+        >>> _, prog = file2cfg_and_env(lines)
+        >>> envs = [{"zero": 0, "one": 1, "n": n} for n in [5, 25]]
+        >>> result = interp_vectorized(prog, envs)
+        >>> result["f"].tolist(), result["f"].dtype, result["c"].dtype
+        ([120, 15511210043330985984000000], dtype('O'), dtype('int64'))
+        >>> interp_vectorized(prog, envs, overflow="raise")
+        Traceback (most recent call last):
+        ...
+        OverflowError: f overflows 64 bits
+
+        >>> lines = ['{"a": 1}', 'p = lth a b', 'bt p 3', 'b = add a a',
+        ...          'c = add b a']
+        >>> _, prog = file2cfg_and_env(lines)
+        >>> interp_vectorized(prog, [{"a": 1, "b": 2}], ["c"])["c"].tolist()
+        [3]
+        >>> interp_vectorized(prog, [{"a": 1, "b": 2}, {"a": 1}])
+        Traceback (most recent call last):
+        ...
+        LookupError: Absent key b
+    """
+    blocks = basic_blocks(insts)
+    columns = lanes(envs, _program_vars(insts))
+    unbound = _unbound(envs, columns)
+    num_lanes = len(next(iter(columns.values()))) if columns else 0
+    index = {id(block): i for i, block in enumerate(blocks)}
+    done = len(blocks)
+
+    def target(block):
+        return done if block is None else index[id(block)]
+
+    # Each block becomes a list of (dst, src0, src1, ufunc), plus its branch.
+    code = []
+    for block in blocks:
+        body = [
+            (inst.dst, inst.src0, inst.src1, _UFUNCS[inst.get_opcode()])
+            for inst in block.body
+            if isinstance(inst, BinOp)
+        ]
+        if block.branch is not None:
+            succ = (block.branch.cond, target(block.nexts[0]), target(block.nexts[1]))
+        else:
+            succ = (None, target(block.nexts[0] if block.nexts else None), None)
+        code.append((body, succ))
+
+    pcs = np.zeros(num_lanes, dtype=np.int64) if blocks else np.full(num_lanes, done)
+    steps = 0
+    while True:
+        running = pcs[pcs < done]
+        if running.size == 0:
+            break
+        if max_steps is not None and steps >= max_steps:
+            raise RuntimeError(f"step budget of {max_steps} blocks exhausted")
+        steps += 1
+        pc = running.min()
+        body, (cond, true_pc, false_pc) = code[pc]
+        mask = pcs == pc
+        if mask.all():
+            for dst, src0, src1, ufunc in body:
+                if unbound:
+                    _read(unbound, (src0, src1), mask)
+                    unbound.pop(dst, None)
+                columns[dst] = _apply(
+                    ufunc, columns[src0], columns[src1], dst, overflow
+                )
+            if cond is None:
+                pcs[:] = true_pc
+            else:
+                if unbound:
+                    _read(unbound, (cond,), mask)
+                pcs[:] = np.where(columns[cond] != 0, true_pc, false_pc)
+        else:
+            for dst, src0, src1, ufunc in body:
+                if unbound:
+                    _read(unbound, (src0, src1), mask)
+                    _bind(unbound, dst, mask)
+                result = _apply(
+                    ufunc, columns[src0][mask], columns[src1][mask], dst, overflow
+                )
+                if result.dtype == object and columns[dst].dtype != object:
+                    columns[dst] = columns[dst].astype(object)
+                columns[dst][mask] = result
+            if cond is None:
+                pcs[mask] = true_pc
+            else:
+                if unbound:
+                    _read(unbound, (cond,), mask)
+                pcs[mask] = np.where(columns[cond][mask] != 0, true_pc, false_pc)
+
+    if outputs is None:
+        return columns
+    return {name: columns[name] for name in outputs}
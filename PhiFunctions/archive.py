@@ -0,0 +1,193 @@
+"""
+This file implements an archive: a single file that packs the text of many
+programs, plus an index that tells where each program starts. An archive has
+the following layout, with integers in little endian:
+
+    [Header] The magic b"DCCA", the version, the number of programs, and
+        the offsets of the index and of the names.
+    [Programs] The text of each program, in UTF-8, one after the other.
+    [Index] One entry of fixed size per program: the offset and size of its
+        text, and the offset and size of its name.
+    [Names] The name of each program, in UTF-8, e.g., the file it came from.
+
+As the entries of the index have a fixed size, program N can be found
+without reading the entries of the programs before it, and its text can be
+read without reading the texts of the others. The texts are unchanged, so an
+archive can be read by the parser of any lab. To pack the programs of a
+folder into an archive, do:
+
+    python3 archive.py programs.dca tests/
+
+Example:
+    >>> import os, tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), "progs.dca")
+    >>> write_archive(path, [("a", '{"x": 1}\\ny = add x x\\n'),
+    ...                      ("b", ['{"x": 2}', 'y = mul x x'])])
+    >>> with Archive(path) as archive:
+    ...     len(archive), archive.name(1), archive.lines(1)
+    (2, 'b', ['{"x": 2}', 'y = mul x x'])
+"""
+
+import mmap
+import os
+import struct
+
+
+MAGIC = b"DCCA"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sHIQQ")
+_ENTRY = struct.Struct("<QIII")
+
+
+def is_archive(path):
+    """
+    Checks if the file 'path' starts with the magic of an archive.
+
+    Example:
+        >>> is_archive("archive.py")
+        False
+    """
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def write_archive(path, programs):
+    """
+    Writes the 'programs', an iterable of pairs (name, text), into an archive
+    in the file 'path'. The text of a program can be a string or a list of
+    lines. Programs are written as they are produced, so they do not need to
+    be in memory all at once. The header is written last, once the position
+    of the index is known.
+    """
+    entries = []
+    names = bytearray()
+    with open(path, "wb") as f:
+        f.write(b"\0" * _HEADER.size)
+        offset = _HEADER.size
+        for name, text in programs:
+            if not isinstance(text, str):
+                text = "\n".join(line.rstrip("\n") for line in text) + "\n"
+            data = text.encode("utf-8")
+            name_data = name.encode("utf-8")
+            entries.append((offset, len(data), len(names), len(name_data)))
+            names += name_data
+            f.write(data)
+            offset += len(data)
+        index_offset = offset
+        for entry in entries:
+            f.write(_ENTRY.pack(*entry))
+        names_offset = index_offset + len(entries) * _ENTRY.size
+        f.write(names)
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, VERSION, len(entries), index_offset, names_offset))
+
+
+def pack(path, files):
+    """
+    Writes the program files in 'files' into an archive in the file 'path'.
+    Each program is named after its file.
+    """
+
+    def programs():
+        for name in files:
+            with open(name, encoding="utf-8") as f:
+                yield (name, f.read())
+
+    write_archive(path, programs())
+
+
+class Archive:
+    """
+    An archive opened for reading. The file is mapped into memory, and the
+    text of a program is decoded only when it is requested. An Archive can
+    be iterated, to stream all its programs in order, as pairs (name, lines).
+
+    Example:
+        >>> import os, tempfile
+        >>> path = os.path.join(tempfile.mkdtemp(), "progs.dca")
+        >>> write_archive(path, ((f"p{i}", [f'{{"x": {i}}}']) for i in range(1000)))
+        >>> archive = Archive(path)
+        >>> archive.name(742), archive.text(742)
+        ('p742', '{"x": 742}\\n')
+        >>> [name for name, _ in archive][-2:]
+        ['p998', 'p999']
+        >>> archive.lines(1000)
+        Traceback (most recent call last):
+        ...
+        IndexError: program 1000 is not in the archive
+        >>> archive.close()
+    """
+
+    def __init__(s, path):
+        s.path = path
+        with open(path, "rb") as f:
+            s.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if s.buffer.size() < _HEADER.size or s.buffer[:4] != MAGIC:
+            s.buffer.close()
+            raise ValueError(f"not an archive: {os.path.basename(path)}")
+        _, version, s.count, s.index_offset, s.names_offset = _HEADER.unpack_from(
+            s.buffer
+        )
+        if version != VERSION:
+            s.buffer.close()
+            raise ValueError(f"unsupported version {version} of the archive format")
+
+    def __len__(s):
+        return s.count
+
+    def __iter__(s):
+        for i in range(s.count):
+            yield (s.name(i), s.lines(i))
+
+    def __enter__(s):
+        return s
+
+    def __exit__(s, *exc):
+        s.close()
+
+    def close(s):
+        s.buffer.close()
+
+    def _entry(s, i):
+        if not 0 <= i < s.count:
+            raise IndexError(f"program {i} is not in the archive")
+        return _ENTRY.unpack_from(s.buffer, s.index_offset + i * _ENTRY.size)
+
+    def name(s, i):
+        """
+        The name of the i-th program.
+        """
+        _, _, offset, size = s._entry(i)
+        offset += s.names_offset
+        return s.buffer[offset : offset + size].decode("utf-8")
+
+    def text(s, i):
+        """
+        The text of the i-th program.
+        """
+        offset, size, _, _ = s._entry(i)
+        return s.buffer[offset : offset + size].decode("utf-8")
+
+    def lines(s, i):
+        """
+        The lines of the i-th program, which can be given to the parser.
+        """
+        return s.text(i).splitlines()
+
+
+if __name__ == "__main__":
+    """
+    Packs the programs in the files and folders given on the command line
+    into an archive, e.g.: "python3 archive.py programs.dca tests/".
+    """
+    import sys
+
+    from batch import program_files
+
+    files = program_files(sys.argv[2:])
+    pack(sys.argv[1], files)
+    print(f"{len(files)} programs written into {sys.argv[1]}")
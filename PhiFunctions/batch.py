@@ -0,0 +1,195 @@
+"""
+This file implements a batch mode for the driver. Instead of reading a single
+program from the standard input, the batch mode receives a list of files and
+directories, e.g., `python3 driver.py tests/`, and runs the analysis of the
+driver on every program it finds. Programs are parsed and analysed in a pool
+of processes, and the output of each program is printed as soon as it is
+ready. At the end, some throughput statistics are printed on stderr. Files
+can also be archives that pack many programs (see archive.py); then every
+program in the archive is analysed.
+
+Each process of the pool has its own copy of `lang.Inst.next_index`. This
+counter is reset before each program is parsed, so that the instructions of
+a program get the same IDs that they would get in a serial run of the driver.
+"""
+
+import contextlib
+import io
+import os
+import sys
+import time
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import archive
+import lang
+import parser
+
+
+def program_files(paths):
+    """
+    Expands the list 'paths' into a list of program files: directories are
+    replaced by the .txt files that they contain, in alphabetical order.
+
+    Example:
+        >>> program_files(["batch.py", "driver.py"])
+        ['batch.py', 'driver.py']
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(
+                os.path.join(path, name)
+                for name in os.listdir(path)
+                if name.endswith(".txt")
+            )
+        else:
+            files.append(path)
+    return files
+
+
+def program_sources(paths):
+    """
+    Expands the list 'paths' into the list of programs to analyse. Programs
+    in files are given by their path (see `program_files`). Programs in
+    archives are given by triples (path, index, name), one per program. A
+    path such as "progs.dca:N" selects only the N-th program of an archive.
+
+    Example:
+        >>> import os, tempfile
+        >>> path = os.path.join(tempfile.mkdtemp(), "progs.dca")
+        >>> archive.write_archive(path, [("p", "{}"), ("q", "{}")])
+        >>> [source[1:] for source in program_sources([path])]
+        [(0, 'p'), (1, 'q')]
+        >>> [source[1:] for source in program_sources([path + ":1"])]
+        [(1, 'q')]
+    """
+    sources = []
+    for path in program_files(paths):
+        base, _, index = path.rpartition(":")
+        if not os.path.exists(path) and index.isdigit() and archive.is_archive(base):
+            with archive.Archive(base) as programs:
+                sources.append((base, int(index), programs.name(int(index))))
+        elif archive.is_archive(path):
+            with archive.Archive(path) as programs:
+                sources += [(path, i, programs.name(i)) for i in range(len(programs))]
+        else:
+            sources.append(path)
+    return sources
+
+
+def source_name(source):
+    """
+    The name of a program in the output of the batch mode.
+
+    Example:
+        >>> source_name(("progs.dca", 3, "tests/fib.txt"))
+        'progs.dca:tests/fib.txt'
+    """
+    if isinstance(source, tuple):
+        path, _, name = source
+        return f"{path}:{name}"
+    return source
+
+
+# The archives opened by this process, so that each one is mapped only once,
+# however many of its programs the process analyses.
+_archives = {}
+
+
+def open_program(source):
+    """
+    Opens the text of the program 'source' (see `program_sources`).
+    """
+    if isinstance(source, tuple):
+        path, index, _ = source
+        if path not in _archives:
+            _archives[path] = archive.Archive(path)
+        return io.StringIO(_archives[path].text(index))
+    return open(source)
+
+
+def parse_program(source):
+    """
+    Parses the program in 'source', a file object, with the parser of this
+    lab. Raises a ValueError if the text has instructions, but the parser
+    returns none, e.g., because parser.py still has to be implemented, so
+    that the analyses are never run on empty programs by mistake.
+
+    Example:
+        >>> import io
+        >>> env, program = parse_program(io.StringIO('{"a": 1}\\n\\n'))
+        >>> env.get("a"), program
+        (1, [])
+    """
+    lines = list(parser.read_lines(source))
+    env, program = parser.file2cfg_and_env(lines)
+    if not program and any(line.strip() for line in lines[1:]):
+        raise ValueError("the parser returned no instructions; see parser.py")
+    return (env, program)
+
+
+def run_file(analyse, source):
+    """
+    Parses the program 'source', which is either a file or a program in an
+    archive, and calls `analyse(env, program)` on it. Returns the name of
+    the program, whatever the analysis printed, the number of instructions
+    in the program, and the time spent on it, in seconds. A ValueError is
+    raised if the parser of the lab returns no instructions (see
+    `parse_program`).
+    """
+    start = time.perf_counter()
+    lang.Inst.next_index = 0
+    output = io.StringIO()
+    with open_program(source) as f, contextlib.redirect_stdout(output):
+        env, program = parse_program(f)
+        analyse(env, program)
+    elapsed = time.perf_counter() - start
+    return (source_name(source), output.getvalue(), len(program), elapsed)
+
+
+def run_batch(paths, analyse, max_workers=None, out=sys.stdout, stats=sys.stderr):
+    """
+    Runs `analyse(env, program)` on every program in 'paths' (see
+    `program_sources`), using a pool of 'max_workers' processes. The function
+    'analyse' must be defined at the top level of a module, so that it can
+    be sent to the processes of the pool. The output of each program is
+    written into 'out', preceded by a header with the name of the file, in
+    the order in which the programs finish. Returns the number of programs
+    whose parsing or analysis raised an exception. If every program failed,
+    then the error of the first one is repeated on 'stats', so that a lab
+    whose parser is not implemented yet does not go unnoticed.
+    """
+    sources = program_sources(paths)
+    num_insts = 0
+    failures = 0
+    first_error = None
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers) as pool:
+        futures = {
+            pool.submit(run_file, analyse, source): source_name(source)
+            for source in sources
+        }
+        for future in as_completed(futures):
+            try:
+                name, text, size, elapsed = future.result()
+            except Exception as e:
+                failures += 1
+                error = f"{futures[future]}: {type(e).__name__}: {e}"
+                first_error = first_error or error
+                print(f"== {error}", file=out)
+                continue
+            num_insts += size
+            print(f"== {name} ({size} instructions, {elapsed * 1e3:.2f}ms)", file=out)
+            out.write(text)
+            out.flush()
+    wall = time.perf_counter() - start
+    if sources and failures == len(sources):
+        print(f"Every program failed, e.g., {first_error}", file=stats)
+    print(f"Programs: {len(sources)} ({failures} failed)", file=stats)
+    print(f"Instructions: {num_insts}", file=stats)
+    print(f"Wall time: {wall:.3f}s", file=stats)
+    if wall > 0:
+        print(f"Throughput: {len(sources) / wall:.1f} programs/s,", end=" ", file=stats)
+        print(f"{num_insts / wall:.1f} instructions/s", file=stats)
+    return failures
@@ -0,0 +1,91 @@
+"""
+This file contains micro-benchmarks for the evaluation of phi-functions. The
+benchmarks compare the environment of lang.py, which keeps a timestamp per
+variable, against an environment that answers `get_from_list` by scanning its
+stack of bindings. To run all the benchmarks, do:
+
+    python3 bench.py
+
+The argument of the programs can be passed on the command line, e.g.:
+"python3 bench.py 5000".
+"""
+
+import sys
+import timeit
+
+import programs
+from lang import Env
+
+
+class ScanEnv(Env):
+    """
+    An environment that finds the most recent binding of a list of variables
+    by walking its journal, from the newest binding to the oldest. It is kept
+    here only as a baseline for the benchmarks.
+
+    Example:
+        >>> e = ScanEnv({"a": 1, "b": 2})
+        >>> e.set("a", 3)
+        >>> e.get_from_list(["b", "a"])
+        3
+    """
+
+    def __init__(s, initial_args={}):
+        super().__init__(initial_args, journal=True)
+
+    def get_from_list(s, vars):
+        for var, value in s.journal:
+            if var in vars:
+                return value
+        raise LookupError(f"Absent keys {vars}")
+
+
+def time_program(program, n, env_class):
+    """
+    Returns the wall-clock time, in seconds, that `program(n)` takes when the
+    programs of programs.py create their environments with 'env_class'.
+
+    Example:
+        >>> time_program(programs.test_fib, 10, ScanEnv) > 0
+        True
+    """
+    old_env = programs.Env
+    programs.Env = env_class
+    try:
+        start = timeit.default_timer()
+        program(n)
+        return timeit.default_timer() - start
+    finally:
+        programs.Env = old_env
+
+
+def bench_programs(n):
+    """
+    Runs the Fibonacci and factorial programs with both environments.
+    """
+    for program in [programs.test_fib, programs.test_fact]:
+        t_scan = time_program(program, n, ScanEnv)
+        t_stamp = time_program(program, n, Env)
+        print(f"{program.__name__}({n}):")
+        print(f"  scan:       {t_scan:.4f}s")
+        print(f"  timestamps: {t_stamp:.4f}s ({t_scan / t_stamp:.2f}x)")
+
+
+def bench_history(size, calls=1000):
+    """
+    Measures `get_from_list` on a variable that was bound before 'size' other
+    bindings. The scan walks the whole history; the timestamps do not.
+    """
+    print(f"get_from_list, {size} bindings of history:")
+    for env_class in [ScanEnv, Env]:
+        env = env_class({"old": 1})
+        for i in range(size):
+            env.set("x", i)
+        t = timeit.timeit(lambda: env.get_from_list(["old", "y"]), number=calls)
+        print(f"  {env_class.__name__}: {1e6 * t / calls:.2f}us per call")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    bench_programs(n)
+    bench_history(10 * n)
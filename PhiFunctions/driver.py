@@ -1,10 +1,36 @@
 import sys
+import lang
+import batch
+import parser
 from programs import *
 
+
+def run(env, program):
+    """
+    Runs a program read from a text file (see parser.py), and prints its
+    final environment.
+    """
+    interp(program[0], env).dump()
+
+
 if __name__ == "__main__":
+    """
+    This function reads the name of one of the programs in programs.py,
+    followed by its inputs, from the standard input, and prints the result
+    of that program, e.g.: "python3 driver.py < tests/fib0.txt". If the first
+    line is an environment instead, then the input is a program in SSA form,
+    which is parsed and run, e.g.: "python3 driver.py < tests/ssa/fact.txt".
+    Program files can also be run in batch, e.g.: "python3 driver.py
+    tests/ssa/".
+    """
+    if len(sys.argv) > 1:
+        sys.exit(1 if batch.run_batch(sys.argv[1:], run) else 0)
     lines = sys.stdin.readlines()
     option = lines[0].strip()
-    if option == "test_min":
+    if option.startswith("{"):
+        lang.Inst.next_index = 0
+        run(*parser.file2cfg_and_env(lines))
+    elif option == "test_min":
         print(test_min(int(lines[1]), int(lines[2])))
     elif option == "test_min3":
         print(test_min3(int(lines[1]), int(lines[2]), int(lines[3])))
@@ -1,10 +1,11 @@
 """
 This file contains the implementation of a simple interpreter of low-level
 instructions. The interpreter takes a program, represented as its first
-instruction, plus an environment, which is a stack of bindings. Bindings are
-pairs of variable names and values. New bindings are added to the stack
-whenever new variables are defined. Bindings are never removed from the stack.
-In this way, we can inspect the history of state transformations caused by the
+instruction, plus an environment, which maps variable names to values. The
+environment can also keep a journal: a stack of bindings. Bindings are pairs
+of variable names and values. New bindings are added to the stack whenever
+new variables are defined. Bindings are never removed from the stack. In this
+way, we can inspect the history of state transformations caused by the
 interpretation of a program. The difference between this file and the files of
 same name in the previous lab is the presence of phi-functions. In other words,
 this new language contains two extra instructions: phi-functions and phi-blocks.
@@ -22,9 +23,14 @@ from abc import ABC, abstractmethod
 
 class Env:
     """
-    A table that associates variables with values. The environment is
-    implemented as a stack, so that previous bindings of a variable V remain
-    available in the environment if V is overassigned.
+    A table that associates variables with values. The current binding of
+    each variable is kept in a dictionary, so that reading and updating a
+    variable takes constant time. If the environment is created with
+    'journal=True', then every binding is also pushed onto a stack, so that
+    previous bindings of a variable V remain available if V is overassigned.
+    Every binding receives a timestamp from a counter that grows with each
+    assignment, so that we can tell which one of several variables was bound
+    last without scanning the history of the environment.
 
     Example:
         >>> e = Env()
@@ -37,19 +43,28 @@ class Env:
         >>> e.set("a", 2)
         >>> e.get("a") + e.get("b")
         7
+
+        >>> e = Env({"a": 1}, journal=True)
+        >>> e.set("b", 2)
+        >>> e.set("a", 3)
+        >>> list(e.journal)
+        [('a', 3), ('b', 2), ('a', 1)]
     """
 
-    def __init__(s, initial_args={}):
-        s.env = deque()
+    def __init__(s, initial_args={}, journal=False):
+        s.bindings = {}
+        s.stamps = {}
+        s.clock = 0
+        s.journal = deque() if journal else None
         for var, value in initial_args.items():
-            s.env.appendleft((var, value))
+            s.set(var, value)
 
     def get(self, var):
         """
-        Finds the first occurrence of variable 'var' in the environment stack,
-        and returns the value associated with it.
+        Finds the current binding of variable 'var' in the environment, and
+        returns the value associated with it.
         """
-        val = next((value for (e_var, value) in self.env if e_var == var), None)
+        val = self.bindings.get(var)
         if val is not None:
             return val
         else:
@@ -59,6 +74,9 @@ class Env:
         """
         Finds the first occurrence of any variable 'vr' in the list 'vars' that
         has a binding in the environment, and returns the associated value.
+        The first occurrence is the binding with the largest timestamp, so
+        this method takes time proportional to the length of 'vars', and not
+        to the number of bindings made so far.
 
         Example:
             >>> e = Env()
@@ -75,23 +93,62 @@ class Env:
             >>> e.set("a", 4)
             >>> e.get_from_list(["b", "a"])
             4
+
+            >>> Env({"a": 1}).get_from_list(["b", "c"])
+            Traceback (most recent call last):
+            ...
+            LookupError: Absent keys ['b', 'c']
         """
-        # TODO: Implement this method
-        return 0
+        stamps = self.stamps
+        last, last_stamp = None, 0
+        for var in vars:
+            stamp = stamps.get(var, 0)
+            if stamp > last_stamp:
+                last, last_stamp = var, stamp
+        if last is None:
+            raise LookupError(f"Absent keys {vars}")
+        return self.get(last)
 
     def set(s, var, value):
         """
-        This method adds 'var' to the environment, by placing the binding
-        '(var, value)' onto the top of the environment stack.
+        This method binds 'var' to 'value' in the environment. The binding is
+        moved to the end of the dictionary, so that the dictionary is ordered
+        from the oldest to the newest binding. If the environment keeps a
+        journal, then the binding '(var, value)' is also placed onto the top
+        of the journal stack.
         """
-        s.env.appendleft((var, value))
+        s.bindings.pop(var, None)
+        s.bindings[var] = value
+        s.clock += 1
+        s.stamps[var] = s.clock
+        if s.journal is not None:
+            s.journal.appendleft((var, value))
 
     def dump(s):
         """
-        Prints the contents of the environment. This method is mostly used for
-        debugging purposes.
+        Prints the contents of the environment, from the newest to the oldest
+        binding. If the environment keeps a journal, then all the bindings in
+        the history are printed; otherwise, only the current ones. This method
+        is mostly used for debugging purposes.
+
+        Example:
+            >>> e = Env({"a": 1}, journal=True)
+            >>> e.set("a", 2)
+            >>> e.dump()
+            a: 2
+            a: 1
+
+            >>> e = Env({"a": 1, "b": 2})
+            >>> e.set("a", 3)
+            >>> e.dump()
+            a: 3
+            b: 2
         """
-        for var, value in s.env:
+        if s.journal is not None:
+            bindings = s.journal
+        else:
+            bindings = reversed(s.bindings.items())
+        for var, value in bindings:
             print(f"{var}: {value}")
 
 
@@ -102,18 +159,50 @@ class Inst(ABC):
     attribute determines the next instruction that will be fetched after this
     instruction runs. Also, every instruction has an index, which is always
     different. The index is incremented whenever a new instruction is created.
+
+    Instructions declare their attributes in __slots__, so that they do not
+    carry a dictionary each. Instructions that are not branches keep their
+    successor in the next_inst field, and the list 'nexts' is built only when
+    it is read. In the rare case where a non-branch instruction has more than
+    one successor, the extra successors are kept in the more_nexts list.
     """
 
+    __slots__ = ("ID", "preds", "compiled")
+
     next_index = 0
 
     def __init__(self):
-        self.nexts = []
         self.preds = []
         self.ID = Inst.next_index
         Inst.next_index += 1
 
+    @property
+    def nexts(self):
+        """
+        The list of successors of this instruction.
+
+        Example:
+            >>> a = Add("a", "b", "c")
+            >>> m = Mul("m", "a", "a")
+            >>> a.nexts
+            []
+            >>> a.add_next(m)
+            >>> a.nexts == [m] and m.preds == [a]
+            True
+        """
+        if self.next_inst is None:
+            return []
+        if self.more_nexts is None:
+            return [self.next_inst]
+        return [self.next_inst] + self.more_nexts
+
     def add_next(self, next_inst):
-        self.nexts.append(next_inst)
+        if self.next_inst is None:
+            self.next_inst = next_inst
+        elif self.more_nexts is None:
+            self.more_nexts = [next_inst]
+        else:
+            self.more_nexts.append(next_inst)
         next_inst.preds.append(self)
 
     @classmethod
@@ -127,10 +216,18 @@ class Inst(ABC):
         raise NotImplementedError
 
     def get_next(self):
-        if len(self.nexts) > 0:
-            return self.nexts[0]
-        else:
-            return None
+        return self.next_inst
+
+    def step(self, env, PC):
+        """
+        Evaluates this instruction and returns the instruction that must run
+        next. 'PC' is the ID of the instruction that ran before this one; only
+        phi-blocks read it. Unlike the pair 'eval' and 'get_next', this method
+        does not store anything in the instruction; hence, the same program
+        can be run by many interpreters at the same time.
+        """
+        self.eval(env)
+        return self.next_inst
 
 
 class Phi(Inst):
@@ -165,9 +262,13 @@ class Phi(Inst):
         1
     """
 
+    __slots__ = ("dst", "args", "next_inst", "more_nexts")
+
     def __init__(s, dst, args):
         s.dst = dst
         s.args = args
+        s.next_inst = None
+        s.more_nexts = None
         super().__init__()
 
     def definition(s):
@@ -212,6 +313,60 @@ class Phi(Inst):
         return inst_s + pred_s + next_s
 
 
+def sequentialize(copies):
+    """
+    Converts a parallel copy into a sequence of moves with the same effect.
+    The parallel copy is a list of pairs (dst, src): all the sources are read,
+    and then all the destinations are written at once. The result is a list
+    of pairs (dst, src) that must be run one after the other. The algorithm
+    follows Boissinot et al. ('Revisiting Out-of-SSA Translation for
+    Correctness, Code Quality, and Efficiency', 2009): a move is emitted as
+    soon as its destination is no longer needed by any pending move. Only
+    cycles of copies need a temporary. All the cycles can share the same one,
+    because each cycle is finished before the next is broken. The temporary
+    is represented by None.
+
+    Example:
+        >>> sequentialize([("a", "b"), ("b", "c")])
+        [('a', 'b'), ('b', 'c')]
+        >>> sequentialize([("a0", "a1"), ("a1", "a0")])
+        [(None, 'a0'), ('a0', 'a1'), ('a1', None)]
+        >>> sequentialize([("a", "b"), ("b", "a"), ("c", "a"), ("d", "d")])
+        [('c', 'a'), ('a', 'b'), ('b', 'c')]
+    """
+    pending = {dst: src for dst, src in copies if dst != src}
+    loc = {src: src for src in pending.values()}
+    ready = [dst for dst in pending if dst not in loc]
+    moves = []
+    while pending:
+        while ready:
+            dst = ready.pop()
+            src = pending.pop(dst)
+            moves.append((dst, loc[src]))
+            if loc[src] == src:
+                # The value of 'src' is now in 'dst' too, so 'src' is free.
+                loc[src] = dst
+                if src in pending:
+                    ready.append(src)
+        if pending:
+            # Only cycles are left. Save one of their values and go on.
+            dst = next(iter(pending))
+            moves.append((None, dst))
+            loc[dst] = None
+            ready.append(dst)
+    return moves
+
+
+ENTRY = 0
+"""
+The PC of a program that has just started: `interp` runs its first
+instruction as if it had been reached from the instruction whose ID is 0.
+A phi-block selects its entry column with ENTRY, and so that column is also
+the one of instruction 0; a program whose phi-blocks need both must start
+with a PC that is not the ID of any of its instructions.
+"""
+
+
 class PhiBlock(Inst):
     """
     PhiBlocks implement a correct semantics for groups of phi-functions. A
@@ -244,12 +399,17 @@ class PhiBlock(Inst):
         2
     """
 
+    __slots__ = ("phis", "selectors", "moves", "next_inst", "more_nexts")
+
     def __init__(self, phis, selector_IDs):
         """
         A phi-block represents an M*N matrix, where each one of the M lines is
         a phi-function, and each phi-function reads from N different parameters.
         Each one of these N columns is associated with a 'selector', which is
-        the ID of the instruction that leads to that parallel assignment.
+        the ID of the instruction that leads to that parallel assignment, or
+        ENTRY, for the column used when the program starts at the phi-block. The
+        parallel assignment of each column is converted into a sequence of
+        moves (see `sequentialize`) once, when the phi-block is created.
 
         Examples:
             >>> a0 = Phi("a0", ["a0", "a1"])
@@ -265,10 +425,13 @@ class PhiBlock(Inst):
             ['a0', 'a1']
         """
         self.phis = phis
-        # TODO: implement the rest of this method
-        # here...
-        # self.selectors = ...
-        #########################################
+        self.next_inst = None
+        self.more_nexts = None
+        self.selectors = {ID: column for column, ID in enumerate(selector_IDs)}
+        self.moves = [
+            sequentialize([(phi.dst, phi.args[column]) for phi in phis])
+            for column in range(len(selector_IDs))
+        ]
         super().__init__()
 
     def definition(self):
@@ -301,9 +464,46 @@ class PhiBlock(Inst):
         return sum([phi.uses() for phi in self.phis], [])
 
     def eval(self, env: Env, PC: int):
-        # TODO: Read all the definitions
-        # TODO: Assign all the uses:
-        pass
+        """
+        Runs the parallel assignment selected by 'PC', the ID of the
+        instruction that led to this phi-block. The assignment is run as the
+        sequence of moves computed when the phi-block was created, holding
+        the temporary of that sequence, if any, in a local variable.
+
+        Example:
+            >>> a0 = Phi("a0", ["a0", "a1"])
+            >>> a1 = Phi("a1", ["a1", "a0"])
+            >>> aa = PhiBlock([a0, a1], [10, 31])
+            >>> aa.eval(Env(), 20)
+            Traceback (most recent call last):
+            ...
+            LookupError: No selector 20
+        """
+        column = self.selectors.get(PC)
+        if column is None:
+            raise LookupError(f"No selector {PC}")
+        tmp = None
+        for dst, src in self.moves[column]:
+            val = tmp if src is None else env.get(src)
+            if dst is None:
+                tmp = val
+            else:
+                env.set(dst, val)
+
+    def step(self, env, PC):
+        """
+        Runs the parallel assignment selected by 'PC' (see Inst.step).
+
+        Example:
+            >>> a0 = Phi("a0", ["a0", "a1"])
+            >>> a1 = Phi("a1", ["a1", "a0"])
+            >>> aa = PhiBlock([a0, a1], [10, 31])
+            >>> e = Env({"a0": 1, "a1": 3})
+            >>> aa.step(e, 31) is None, e.get("a0"), e.get("a1")
+            (True, 3, 1)
+        """
+        self.eval(env, PC)
+        return self.next_inst
 
     def __str__(self):
         block_str = "\n".join([str(phi) for phi in self.phis])
@@ -317,10 +517,14 @@ class BinOp(Inst):
     defined value, and the list of used values.
     """
 
+    __slots__ = ("dst", "src0", "src1", "next_inst", "more_nexts")
+
     def __init__(s, dst, src0, src1):
         s.dst = dst
         s.src0 = src0
         s.src1 = src1
+        s.next_inst = None
+        s.more_nexts = None
         super().__init__()
 
     @classmethod
@@ -356,6 +560,8 @@ class Add(BinOp):
         True
     """
 
+    __slots__ = ()
+
     def eval(self, env):
         env.set(self.dst, env.get(self.src0) + env.get(self.src1))
 
@@ -373,6 +579,8 @@ class Mul(BinOp):
         6
     """
 
+    __slots__ = ()
+
     def eval(s, env):
         env.set(s.dst, env.get(s.src0) * env.get(s.src1))
 
@@ -390,6 +598,8 @@ class Lth(BinOp):
         True
     """
 
+    __slots__ = ()
+
     def eval(s, env):
         env.set(s.dst, env.get(s.src0) < env.get(s.src1))
 
@@ -407,6 +617,8 @@ class Geq(BinOp):
         False
     """
 
+    __slots__ = ()
+
     def eval(s, env):
         env.set(s.dst, env.get(s.src0) >= env.get(s.src1))
 
@@ -430,6 +642,8 @@ class Bt(Inst):
         True
     """
 
+    __slots__ = ("cond", "nexts", "next_iter")
+
     def __init__(s, cond, true_dst=None, false_dst=None):
         super().__init__()
         s.cond = cond
@@ -468,6 +682,23 @@ class Bt(Inst):
     def get_next(s):
         return s.nexts[s.next_iter]
 
+    def step(s, env, PC):
+        """
+        Returns the successor chosen by the condition, without storing the
+        choice in the branch (see Inst.step).
+
+        Example:
+            >>> a = Add("x", "x", "x")
+            >>> m = Mul("x", "x", "x")
+            >>> b = Bt("t", a, m)
+            >>> b.step(Env({"t": 0}), 0) is m
+            True
+        """
+        if env.get(s.cond):
+            return s.nexts[0]
+        else:
+            return s.nexts[1]
+
     def __str__(self):
         inst_s = f"{self.ID}: bt {self.cond}"
         pred_s = f"\n  P: {', '.join([str(inst.ID) for inst in self.preds])}"
@@ -475,19 +706,298 @@ class Bt(Inst):
         return inst_s + pred_s + next_s
 
 
-def interp(instruction: Inst, environment: Env, PC=0):
+def freeze_preds(insts):
+    """
+    Replaces the list of predecessors of each instruction in 'insts' with a
+    tuple, which takes less memory. Once this is done, no new edges can be
+    added to these instructions.
+
+    Example:
+        >>> a = Add("a", "b", "c")
+        >>> m = Mul("m", "a", "a")
+        >>> a.add_next(m)
+        >>> freeze_preds([a, m])
+        >>> m.preds == (a,)
+        True
+    """
+    for inst in insts:
+        inst.preds = tuple(inst.preds)
+
+
+class Observer:
+    """
+    The base class of the objects that watch the interpreter as it runs a
+    program, e.g., to collect coverage or to track the flow of values. An
+    observer overrides the methods of the events that it wants to see; the
+    other methods are never called. The hooks 'before', 'after' and
+    'on_branch' are the same in every lab, so that an observer written for
+    one lab can watch the programs of another one.
+
+    Example:
+        >>> class Phis(Observer):
+        ...     def __init__(self):
+        ...         self.log = []
+        ...     def on_phi(self, inst, PC, column, env):
+        ...         self.log.append((PC, column))
+        >>> a0 = Phi("a0", ["a0", "a1"])
+        >>> a1 = Phi("a1", ["a1", "a0"])
+        >>> aa = PhiBlock([a0, a1], [10, 31])
+        >>> obs = Phis()
+        >>> env = interp(aa, Env({"a0": 1, "a1": 3}), 31, observers=[obs])
+        >>> obs.log, env.get("a0"), env.get("a1")
+        ([(31, 1)], 3, 1)
+    """
+
+    def before(self, inst, env):
+        """
+        Called before 'inst' runs.
+        """
+        pass
+
+    def after(self, inst, env, next_inst):
+        """
+        Called after 'inst' runs. 'next_inst' is the instruction that will
+        run next, or None, if the program ends.
+        """
+        pass
+
+    def on_branch(self, inst, taken, env):
+        """
+        Called after a branch runs. 'taken' is True if the program jumps to
+        the first successor of the branch, and False if it falls through to
+        the second one.
+        """
+        pass
+
+    def on_phi(self, inst, PC, column, env):
+        """
+        Called before a phi-function or a phi-block runs. 'column' is the
+        index of the argument that the phi-function will read, or the column
+        of the phi-block that the selector 'PC' chooses.
+        """
+        pass
+
+
+class Trace(Observer, ABC):
+    """
+    A trace is a sink that receives one record per instruction that the
+    interpreter evaluates. Traces have levels: at level OFF, nothing is
+    recorded, and `interp` runs as if no trace had been given; at level INST,
+    only the instructions are recorded; at level FULL, each record also
+    contains the variables that the instruction has updated, together with
+    their new values (the difference between the environment before and after
+    the instruction). The trace keeps, in 'PC', the ID of the instruction that
+    ran last; `interp` sets it to its own PC before the program starts.
+    """
+
+    OFF = 0
+    INST = 1
+    FULL = 2
+
+    def __init__(s, level=INST):
+        s.level = level
+        s.PC = 0
+
+    @abstractmethod
+    def record(s, PC, inst, env):
+        """
+        Records the evaluation of instruction 'inst', which was reached from
+        the instruction whose ID is 'PC', and which has just updated 'env'.
+        """
+        raise NotImplementedError
+
+    def after(s, inst, env, next_inst):
+        s.record(s.PC, inst, env)
+        s.PC = inst.ID
+
+    def close(s):
+        """
+        Writes any record that is still buffered.
+        """
+        pass
+
+    def __enter__(s):
+        return s
+
+    def __exit__(s, *exc):
+        s.close()
+
+    def changes(s, inst, env):
+        """
+        The list of pairs (variable, value) for the variables that 'inst'
+        defines, as they are in 'env' after 'inst' runs.
+
+        Example:
+            >>> e = Env({"a": 1, "b": 2})
+            >>> PrintTrace().changes(Add("c", "a", "b"), e)
+            [('c', None)]
+            >>> e.set("c", 3)
+            >>> PrintTrace().changes(Phi("c", ["a", "b"]), e)
+            [('c', 3)]
+        """
+        defs = inst.definition()
+        if isinstance(defs, str):
+            defs = [defs]
+        return [(var, env.bindings.get(var)) for var in defs]
+
+
+class PrintTrace(Trace):
+    """
+    A trace in human-readable form, written into a text file (the standard
+    output, by default). Each record shows the instruction that ran, and, at
+    level FULL, the variables that it updated.
+
+    Example:
+        >>> e = Env({"m": 3, "n": 2, "zero": 0})
+        >>> a = Add("m", "m", "zero")
+        >>> p = Lth("p", "n", "m")
+        >>> b = Bt("p")
+        >>> a.add_next(p)
+        >>> p.add_next(b)
+        >>> a.ID, p.ID, b.ID = 6, 7, 8
+        >>> p.eval(e)
+        >>> PrintTrace(Trace.FULL).record(6, p, e)
+        ----------------------------------------------------------
+        7: p = n<m
+          P: 6
+          N: 8
+          p: True
+    """
+
+    def __init__(s, level=Trace.INST, file=None):
+        super().__init__(level)
+        s.file = file
+
+    def record(s, PC, inst, env):
+        lines = ["----------------------------------------------------------"]
+        lines.append(str(inst))
+        if s.level >= Trace.FULL:
+            lines += [f"  {var}: {val}" for var, val in s.changes(inst, env)]
+        print("\n".join(lines), file=s.file)
+
+
+class JsonlTrace(Trace):
+    """
+    A compact trace, with one JSON object per line, written into a text
+    file. Each record contains the ID of the instruction that ran ("id") and
+    the ID of the instruction that ran before it ("pc"). At level FULL, the
+    record also has a dictionary ("set") with the variables that the
+    instruction updated. Records are kept in a buffer, and written into the
+    file in chunks of 'buffer_size' records, or when the trace is closed.
+
+    Example:
+        >>> import io
+        >>> out = io.StringIO()
+        >>> e = Env({"a": 1, "b": 2})
+        >>> c = Add("c", "a", "b")
+        >>> c.ID = 3
+        >>> c.eval(e)
+        >>> with JsonlTrace(out) as trace:
+        ...     trace.record(2, c, e)
+        ...     trace.level = Trace.INST
+        ...     trace.record(3, c, e)
+        >>> print(out.getvalue(), end="")
+        {"pc": 2, "id": 3, "set": {"c": 3}}
+        {"pc": 3, "id": 3}
+    """
+
+    def __init__(s, file, level=Trace.FULL, buffer_size=4096):
+        super().__init__(level)
+        s.file = file
+        s.buffer = []
+        s.buffer_size = buffer_size
+
+    def record(s, PC, inst, env):
+        import json
+
+        entry = {"pc": PC, "id": inst.ID}
+        if s.level >= Trace.FULL:
+            entry["set"] = dict(s.changes(inst, env))
+        s.buffer.append(json.dumps(entry))
+        if len(s.buffer) >= s.buffer_size:
+            s.flush()
+
+    def flush(s):
+        """
+        Writes the buffered records into the file.
+        """
+        if s.buffer:
+            s.file.write("\n".join(s.buffer) + "\n")
+            s.buffer = []
+
+    def close(s):
+        s.flush()
+
+
+class ExecutionAborted(RuntimeError):
+    """
+    The error raised when the interpreter stops a program before its end.
+    Besides the message, the error carries:
+
+        reason: why the program was stopped: "fuel", if it ran out of its
+            step budget.
+        env: the environment, with the values that the program had computed
+            when it was stopped.
+        inst: the instruction that would run next.
+        steps: the number of instructions that ran.
+
+    Example:
+        >>> env = Env({"t": True})
+        >>> b = Bt("t")
+        >>> b.add_true_next(b)
+        >>> try:
+        ...     interp(b, env, max_steps=10)
+        ... except ExecutionAborted as e:
+        ...     print(e.reason, e.inst is b, e.steps, e.env.get("t"))
+        fuel True 10 True
+    """
+
+    def __init__(s, reason, message, env, inst, steps):
+        super().__init__(message)
+        s.reason = reason
+        s.env = env
+        s.inst = inst
+        s.steps = steps
+
+
+def _out_of_fuel(max_steps, env, inst):
+    message = f"step budget of {max_steps} instructions exhausted"
+    return ExecutionAborted("fuel", message, env, inst, max_steps)
+
+
+def interp(
+    instruction: Inst,
+    environment: Env,
+    PC=0,
+    max_steps=None,
+    trace: Trace = None,
+    observers=None,
+):
     """
     This function evaluates a program until there is no more instructions to
     evaluate. Notice that, in contrast to the previous labs, the interpreter
     now receives three arguments. The third argument is necessary to implement
     the correct semantics of phi-functions using phi-blocks. This argument can
     be used to select the correct parallel copy that a PhiBlock implements.
+    The interpreter is a flat dispatch loop, so the number of instructions
+    that it can run is not bounded by the recursion limit of Python. The
+    interpreter keeps all its state in the environment and in local variables
+    (see Inst.step); thus, the same program can be run by many threads at
+    once, each one with its own environment.
 
     Parameters:
     -----------
         instruction: the instruction that will be interpreted
         environment: the list that associates variable names with their values
-        PC: the identifier of the last instruction that was interpreted.
+        PC: the identifier of the last instruction that was interpreted, or
+            ENTRY (0), if the program is starting.
+        max_steps: the maximum number of instructions that can be evaluated.
+            If the program does not end within this budget, then an
+            ExecutionAborted error is raised. No limit is imposed if it is None.
+        trace: a Trace that receives one record per instruction. Nothing is
+            recorded if it is None, or if its level is Trace.OFF.
+        observers: a list of Observer objects, which are notified of each
+            instruction, branch and phi selection (see `interp_observed`).
 
     Example:
         >>> env = Env({"m": 3, "n": 2, "zero": 0})
@@ -498,17 +1008,97 @@ def interp(instruction: Inst, environment: Env, PC=0):
         >>> p.add_next(b)
         >>> interp(p, env).get("answer")
         2
+
+        >>> from concurrent.futures import ThreadPoolExecutor
+        >>> def run(n):
+        ...     return interp(p, Env({"m": 3, "n": n, "zero": 0})).get("answer")
+        >>> with ThreadPoolExecutor(max_workers=4) as pool:
+        ...     list(pool.map(run, [1, 5, 2, 7]))
+        [1, 3, 2, 3]
     """
-    if instruction:
-        print("----------------------------------------------------------")
-        print(instruction)
-        environment.dump()
-        if isinstance(instruction, PhiBlock):
-            # TODO: implement this part:
-            pass
-        else:
-            # TODO: implement this part:
-            pass
-        return interp(instruction.get_next(), environment, instruction.ID)
-    else:
-        return environment
+    if trace is not None and trace.level != Trace.OFF:
+        trace.PC = PC
+        observers = list(observers or []) + [trace]
+    if observers:
+        return interp_observed(instruction, environment, observers, PC, max_steps)
+    steps = 0
+    while instruction:
+        if max_steps is not None and steps >= max_steps:
+            raise _out_of_fuel(max_steps, environment, instruction)
+        PC, instruction = instruction.ID, instruction.step(environment, PC)
+        steps += 1
+    return environment
+
+
+def _hooks(observers, name):
+    """
+    The bound methods 'name' of the observers that override it.
+    """
+    default = getattr(Observer, name)
+    return [
+        getattr(obs, name)
+        for obs in observers
+        if getattr(type(obs), name, default) is not default
+    ]
+
+
+def interp_observed(instruction, environment, observers, PC=0, max_steps=None):
+    """
+    This function evaluates a program, like `interp`, but notifies the
+    observers in the list 'observers' of each event. The `interp` function
+    calls this one whenever it receives observers or a trace, so the plain
+    dispatch loop never checks whether there is someone watching. Only the
+    methods that the observers override are called.
+
+    Example:
+        >>> class Events(Observer):
+        ...     def __init__(self):
+        ...         self.log = []
+        ...     def on_branch(self, inst, taken, env):
+        ...         self.log.append(("bt", taken))
+        ...     def on_phi(self, inst, PC, column, env):
+        ...         self.log.append(("phi", column))
+        >>> env = Env({"m": 3, "n": 2, "zero": 0})
+        >>> m_min = Add("m_min", "m", "zero")
+        >>> n_min = Add("n_min", "n", "zero")
+        >>> answer = Phi("answer", ["m_min", "n_min"])
+        >>> p = Lth("p", "n", "m")
+        >>> b = Bt("p", n_min, m_min)
+        >>> p.add_next(b)
+        >>> n_min.add_next(answer)
+        >>> m_min.add_next(answer)
+        >>> obs = Events()
+        >>> interp(p, env, observers=[obs]).get("answer")
+        2
+        >>> obs.log
+        [('bt', True), ('phi', 1)]
+    """
+    befores = _hooks(observers, "before")
+    afters = _hooks(observers, "after")
+    branches = _hooks(observers, "on_branch")
+    phis = _hooks(observers, "on_phi")
+    steps = 0
+    while instruction:
+        if max_steps is not None and steps >= max_steps:
+            raise _out_of_fuel(max_steps, environment, instruction)
+        for hook in befores:
+            hook(instruction, environment)
+        if phis and isinstance(instruction, PhiBlock):
+            for hook in phis:
+                hook(instruction, PC, instruction.selectors.get(PC), environment)
+        elif phis and isinstance(instruction, Phi):
+            stamps = environment.stamps
+            args = instruction.args
+            column = max(range(len(args)), key=lambda i: stamps.get(args[i], 0))
+            for hook in phis:
+                hook(instruction, PC, column, environment)
+        nxt = instruction.step(environment, PC)
+        if branches and isinstance(instruction, Bt):
+            taken = nxt is instruction.nexts[0]
+            for hook in branches:
+                hook(instruction, taken, environment)
+        for hook in afters:
+            hook(instruction, environment, nxt)
+        PC, instruction = instruction.ID, nxt
+        steps += 1
+    return environment
@@ -0,0 +1,254 @@
+"""
+This file implements a parser for programs in SSA form: a function that reads
+a text file, and returns a control-flow graph of instructions plus an
+environment mapping variables to integer values. The format is the one used
+in the previous labs, plus two constructs:
+
+    x = phi a b c
+        A phi-function that assigns to x the last bound variable among a, b
+        and c (see lang.Phi).
+
+    phis L0 L1 ... Ln
+    x0 = phi a0 a1 ... an
+    ...
+    end
+        A phi-block (see lang.PhiBlock): the phi-functions between 'phis'
+        and 'end' are evaluated together, as parallel copies. Each phi-function
+        has one argument per label. A label is either the index of the
+        instruction that jumps to the phi-block, or 'entry', which selects the
+        column used when the program starts at the phi-block (see lang.ENTRY).
+        As a program starts with the PC 0, 'entry' cannot be used together
+        with the label of the instruction whose ID is 0.
+
+A phi-block counts as a single instruction, so the instruction that follows
+its 'end' line has the next index. As an example, the program below computes
+the N-th Fibonacci number. The instruction at index 5 jumps back to the
+phi-block, which then reads its second column:
+
+    {"N": 6, "zero": 0, "one": 1}
+    phis entry 5
+    a = phi zero b
+    b = phi one sum
+    c = phi zero c1
+    end
+    p = geq c N
+    bt p 6
+    sum = add a b
+    c1 = add c one
+    bt one 0
+    answer = add a zero
+"""
+
+import mmap
+import sys
+
+from lang import *
+
+
+def line2env(line):
+    """
+    Maps a string (the line) to a dictionary in python. This function reads
+    the first line of the text file, which contains the initial environment
+    of the program.
+
+    Example
+        >>> line2env('{"zero": 0, "one": 1, "three": 3, "iter": 9}').get('one')
+        1
+    """
+    import json
+
+    env_dict = json.loads(line)
+    env_lang = Env()
+    for k, v in env_dict.items():
+        env_lang.set(k, v)
+    return env_lang
+
+
+def read_lines(source):
+    """
+    Iterates over the lines of 'source', which can be any iterable of
+    strings, such as a list or a text file, or an object that has a readline
+    method, such as a binary file or an mmap. Lines in bytes are decoded as
+    UTF-8.
+
+    Example:
+        >>> import io
+        >>> list(read_lines(io.BytesIO(b"a = phi b c\\nbt a 0\\n")))
+        ['a = phi b c\\n', 'bt a 0\\n']
+    """
+    if isinstance(source, mmap.mmap) or (
+        hasattr(source, "readline") and not hasattr(source, "__next__")
+    ):
+        source = iter(source.readline, b"")
+    for line in source:
+        yield line.decode("utf-8") if isinstance(line, bytes) else line
+
+
+_BINOPS = {"add": Add, "mul": Mul, "lth": Lth, "geq": Geq}
+
+
+def _is_index(token):
+    return token.isdigit() and token.isascii()
+
+
+def tokenize(line):
+    """
+    Splits 'line' into the tokens of an instruction, and checks its shape.
+    Returns None for blank lines, and raises a ValueError for lines that are
+    not instructions.
+
+    Example:
+        >>> tokenize("x = phi a b c")
+        ['x', '=', 'phi', 'a', 'b', 'c']
+        >>> tokenize("phis entry 12")
+        ['phis', 'entry', '12']
+        >>> tokenize("x = phi")
+        Traceback (most recent call last):
+        ...
+        ValueError: not an instruction: 'x = phi'
+    """
+    tokens = line.split()
+    if not tokens:
+        return None
+    n = len(tokens)
+    if n >= 4 and tokens[1] == "=" and tokens[0].isidentifier():
+        if tokens[2] == "phi" or (n == 5 and tokens[2] in _BINOPS):
+            if all(name.isidentifier() for name in tokens[3:]):
+                return tokens
+    elif tokens[0] == "bt":
+        if n == 3 and tokens[1].isidentifier() and _is_index(tokens[2]):
+            return tokens
+    elif tokens[0] == "phis":
+        if n > 1 and all(t == "entry" or _is_index(t) for t in tokens[1:]):
+            return tokens
+    elif tokens == ["end"]:
+        return tokens
+    raise ValueError(f"not an instruction: {line.strip()!r}")
+
+
+def _phi(tokens):
+    return Phi(sys.intern(tokens[0]), [sys.intern(arg) for arg in tokens[3:]])
+
+
+def file2cfg_and_env(lines):
+    """
+    Builds a control-flow graph representation for the strings stored in
+    `lines`, which can be any source accepted by `read_lines`. The first
+    string represents the environment. The other strings represent
+    instructions, phi-functions and phi-blocks. The lines are parsed as they
+    are read. The target of a branch is resolved as soon as the instruction
+    that it jumps to is created, and the labels of phi-blocks are resolved
+    once every instruction exists, as they might refer to later ones.
+
+    Example:
+        >>> l0 = '{"m": 3, "n": 2, "zero": 0}'
+        >>> l1 = 'p = lth n m'
+        >>> l2 = 'bt p 4'
+        >>> l3 = 'x = add m zero'
+        >>> l4 = 'bt zero 5'
+        >>> l5 = 'y = add n zero'
+        >>> l6 = 'answer = phi x y'
+        >>> env, prog = file2cfg_and_env([l0, l1, l2, l3, l4, l5, l6])
+        >>> interp(prog[0], env).get("answer")
+        2
+
+        >>> lines = ['{"N": 6, "zero": 0, "one": 1}', 'phis entry 5',
+        ...          'a = phi zero b', 'b = phi one sum', 'c = phi zero c1',
+        ...          'end', 'p = geq c N', 'bt p 6', 'sum = add a b',
+        ...          'c1 = add c one', 'bt one 0', 'answer = add a zero']
+        >>> env, prog = file2cfg_and_env(lines)
+        >>> len(prog), interp(prog[0], env).get("answer")
+        (7, 8)
+
+        >>> file2cfg_and_env(['{}', 'phis entry 3', 'a = phi b c', 'end'])
+        Traceback (most recent call last):
+        ...
+        ValueError: phi-block label 3 is not an instruction
+
+        >>> Inst.next_index = 0
+        >>> lines = ['{}', 'x = add a b', 'phis entry 0', 'a = phi b c', 'end']
+        >>> file2cfg_and_env(lines)
+        Traceback (most recent call last):
+        ...
+        ValueError: phi-block labels entry and 0 both select 0 (see lang.ENTRY)
+    """
+    lines = read_lines(lines)
+    env = line2env(next(lines))
+    insts = []
+
+    # The branches that jump to an instruction that does not exist yet, keyed
+    # by the index of that instruction.
+    pending_targets = {}
+    # The phi-blocks, with their labels, and the phi-functions of the block
+    # that is still open, if any.
+    blocks = []
+    group = None
+
+    prev = None
+    for ln in lines:
+        tokens = tokenize(ln)
+        if tokens is None:
+            continue
+
+        if group is not None:
+            labels, phis = group
+            if tokens == ["end"]:
+                inst = PhiBlock(phis, labels)
+                blocks.append((inst, labels))
+                group = None
+            elif tokens[1:3] == ["=", "phi"] and len(tokens) - 3 == len(labels):
+                phis.append(_phi(tokens))
+                continue
+            else:
+                raise ValueError(
+                    f"expected a phi with {len(labels)} arguments: {ln.strip()!r}"
+                )
+        elif tokens[0] == "phis":
+            group = (tokens[1:], [])
+            continue
+        elif tokens[0] == "end":
+            raise ValueError("'end' without 'phis'")
+        elif tokens[0] == "bt":
+            inst = Bt(sys.intern(tokens[1]))
+            target = int(tokens[2])
+            if target < len(insts):
+                inst.add_true_next(insts[target])
+            elif target == len(insts):
+                inst.add_true_next(inst)
+            else:
+                pending_targets.setdefault(target, []).append(inst)
+        elif tokens[2] == "phi":
+            inst = _phi(tokens)
+        else:
+            dst, _, iname, op1, op2 = map(sys.intern, tokens)
+            inst = _BINOPS[iname](dst, op1, op2)
+
+        for bt in pending_targets.pop(len(insts), ()):
+            bt.add_true_next(inst)
+        if prev is not None:
+            prev.add_next(inst)
+        insts.append(inst)
+        prev = inst
+
+    if group is not None:
+        raise ValueError("'phis' without 'end'")
+    if pending_targets:
+        raise ValueError(f"bt to missing instruction {min(pending_targets)}")
+    for block, labels in blocks:
+        selectors = {}
+        for column, label in enumerate(labels):
+            if label == "entry":
+                selector = ENTRY
+            elif int(label) < len(insts):
+                selector = insts[int(label)].ID
+            else:
+                raise ValueError(f"phi-block label {label} is not an instruction")
+            if selector in selectors:
+                first = labels[selectors[selector]]
+                raise ValueError(
+                    f"phi-block labels {first} and {label} both select {selector}"
+                    " (see lang.ENTRY)"
+                )
+            selectors[selector] = column
+        block.selectors = selectors
+    return (env, insts)
@@ -14,9 +14,13 @@ class DataFlowEq(ABC):
             Remember to zero this attribute once you start a new static
             analysis, so that you can correctly count how many times each
             equation had to be evaluated to solve the analysis.
+        forward whether information flows along the edges of the program
+            (True), as in reaching definitions, or against them (False), as
+            in liveness. The worklist solver uses it to order the equations.
     """
 
     num_evals = 0
+    forward = True
 
     def __init__(self, instruction):
         """
@@ -222,6 +226,86 @@ class ReachingDefs_Bt_OUT_Eq(OUT_Eq):
         return f"{self.name()}: {gen_set}{kill_set}"
 
 
+class ReachingDefs_Block_OUT_Eq(OUT_Eq):
+    """
+    This concrete class implements the equations that affect OUT facts of the
+    reaching-definitions analysis for basic blocks (see lang.basic_blocks). A
+    block generates the last definition of each variable that it defines, and
+    kills any other definition of these variables.
+    """
+
+    def gen_set(self):
+        """
+        The definitions that reach the end of the block. Ex.:
+            >>> from lang import Add, basic_blocks
+            >>> Inst.next_index = 0
+            >>> i0 = Add('x', 'a', 'b')
+            >>> i1 = Add('y', 'x', 'b')
+            >>> i2 = Add('x', 'x', 'y')
+            >>> i0.add_next(i1)
+            >>> i1.add_next(i2)
+            >>> df = ReachingDefs_Block_OUT_Eq(basic_blocks([i0, i1, i2])[0])
+            >>> sorted(df.gen_set())
+            [('x', 2), ('y', 1)]
+        """
+        gen = {}
+        for inst in self.inst.insts:
+            for v in inst.definition():
+                gen[v] = inst.ID
+        return set(gen.items())
+
+    def eval_aux(self, data_flow_env):
+        """
+        Evaluates this equation, where:
+        OUT[b] = gen(b) + (IN[b] - kill(b))
+
+        Example:
+            >>> from lang import Add, basic_blocks
+            >>> Inst.next_index = 0
+            >>> i0 = Add('x', 'a', 'b')
+            >>> i1 = Add('x', 'x', 'b')
+            >>> i0.add_next(i1)
+            >>> df = ReachingDefs_Block_OUT_Eq(basic_blocks([i0, i1])[0])
+            >>> sorted(df.eval_aux({'IN_0': {('x', 5), ('y', 2)}}))
+            [('x', 1), ('y', 2)]
+        """
+        gen = self.gen_set()
+        kill = {v for (v, _) in gen}
+        in_set = data_flow_env[name_in(self.inst.ID)]
+        new_set = {(v, p) for (v, p) in in_set if v not in kill}
+        return new_set.union(gen)
+
+    def deps(self):
+        """
+        The list of dependencies of this equation. Ex.:
+            >>> from lang import Add, basic_blocks
+            >>> Inst.next_index = 0
+            >>> add = Add('x', 'a', 'b')
+            >>> df = ReachingDefs_Block_OUT_Eq(basic_blocks([add])[0])
+            >>> df.deps()
+            ['IN_0']
+        """
+        return [name_in(self.inst.ID)]
+
+    def __str__(self):
+        """
+        A string representation of a reaching-defs equation representing a
+        basic block. Eg.:
+            >>> from lang import Add, basic_blocks
+            >>> Inst.next_index = 0
+            >>> i0 = Add('x', 'a', 'b')
+            >>> i1 = Add('y', 'x', 'b')
+            >>> i0.add_next(i1)
+            >>> df = ReachingDefs_Block_OUT_Eq(basic_blocks([i0, i1])[0])
+            >>> str(df)
+            'OUT_0: (x, 0), (y, 1) + (IN_0 - (x, _), (y, _))'
+        """
+        gen = sorted(self.gen_set())
+        gen_set = ", ".join(f"({v}, {p})" for (v, p) in gen)
+        kill_set = ", ".join(f"({v}, _)" for (v, _) in gen)
+        return f"{self.name()}: {gen_set} + ({name_in(self.inst.ID)} - {kill_set})"
+
+
 class ReachingDefs_IN_Eq(IN_Eq):
     """
     This concrete class implements the meet operation for reaching-definition
@@ -263,8 +347,7 @@ class ReachingDefs_IN_Eq(IN_Eq):
             >>> sorted(df.deps())
             ['OUT_0', 'OUT_1']
         """
-        # TODO: Implement this method
-        return []
+        return [name_out(pred.ID) for pred in self.inst.preds]
 
     def __str__(self):
         """
@@ -308,6 +391,37 @@ def reaching_defs_constraint_gen(insts):
     return in0 + in1 + out
 
 
+def reaching_defs_block_constraint_gen(blocks):
+    """
+    Builds a list of equations to solve Reaching-Definition Analysis for the
+    given list of basic blocks. There are two equations per block, rather than
+    two per instruction. The OUT set of a block is the OUT set of its last
+    instruction in the instruction-level analysis.
+
+    Example:
+        >>> from lang import Add, Lth, basic_blocks
+        >>> Inst.next_index = 0
+        >>> i0 = Add('x', 'a', 'b')
+        >>> i1 = Add('c', 'x', 'b')
+        >>> i2 = Lth('d', 'c', 'b')
+        >>> i3 = Add('c', 'x', 'x')
+        >>> i0.add_next(i1)
+        >>> i1.add_next(i2)
+        >>> i2.add_next(i3)
+        >>> i3.add_next(i1)
+        >>> blocks = basic_blocks([i0, i1, i2, i3])
+        >>> eqs = reaching_defs_block_constraint_gen(blocks)
+        >>> [str(eq) for eq in eqs][1]
+        'OUT_1: (c, 3), (d, 2) + (IN_1 - (c, _), (d, _))'
+        >>> (sol, num_evals) = abstract_interp(eqs)
+        >>> sorted(sol['OUT_1'])
+        [('c', 3), ('d', 2), ('x', 0)]
+    """
+    out = [ReachingDefs_Block_OUT_Eq(block) for block in blocks]
+    ins = [ReachingDefs_IN_Eq(block) for block in blocks]
+    return out + ins
+
+
 def abstract_interp(equations):
     """
     This function iterates on the equations, solving them in the order in which
@@ -336,9 +450,13 @@ def abstract_interp(equations):
 
 def build_dependence_graph(equations) -> dict[str, list[DataFlowEq]]:
     """
-    This function builds the dependence graph of equations.
+    This function builds the dependence graph of equations. The graph maps
+    the name of each equation E to the list of the equations that depend on
+    E, that is, the equations whose `deps` contain the name of E. These are
+    the equations that must be evaluated again once E changes.
 
     Example:
+        >>> from lang import Add, Mul
         >>> Inst.next_index = 0
         >>> i0 = Add('c', 'a', 'b')
         >>> i1 = Mul('d', 'c', 'a')
@@ -347,19 +465,109 @@ def build_dependence_graph(equations) -> dict[str, list[DataFlowEq]]:
         >>> deps = build_dependence_graph(eqs)
         >>> [eq.name() for eq in deps['IN_0']]
         ['OUT_0']
+        >>> [eq.name() for eq in deps['OUT_0']]
+        ['IN_1']
     """
-    # TODO: implement this method
     dep_graph = {eq.name(): [] for eq in equations}
+    for eq in equations:
+        for name in eq.deps():
+            if name in dep_graph:
+                dep_graph[name].append(eq)
     return dep_graph
 
 
+def postorder(insts):
+    """
+    The instructions in 'insts' in postorder: each instruction comes after
+    the instructions that a depth-first search visits from it. The search
+    starts from the instructions without predecessors, in the order in which
+    they appear in 'insts', and then from any instruction not visited yet, so
+    that instructions only reachable through cycles are not left out. Only
+    the successors in 'insts' are visited. Reversing this list gives the
+    reverse postorder, where each instruction comes before its successors,
+    except for back edges.
+
+    Example:
+        >>> from lang import Add
+        >>> Inst.next_index = 0
+        >>> i0 = Add('x', 'a', 'b')
+        >>> i1 = Bt('x')
+        >>> i2 = Add('y', 'x', 'x')
+        >>> i3 = Add('z', 'x', 'y')
+        >>> i0.add_next(i1)
+        >>> i1.add_true_next(i3)
+        >>> i1.add_next(i2)
+        >>> i2.add_next(i3)
+        >>> [inst.ID for inst in postorder([i0, i1, i2, i3])]
+        [3, 2, 1, 0]
+    """
+    nodes = {id(inst) for inst in insts}
+    visited = set()
+    order = []
+    roots = [inst for inst in insts if not inst.preds] + list(insts)
+    for root in roots:
+        if id(root) in visited:
+            continue
+        visited.add(id(root))
+        stack = [(root, iter(root.nexts))]
+        while stack:
+            inst, succs = stack[-1]
+            for succ in succs:
+                if succ is not None and id(succ) in nodes and id(succ) not in visited:
+                    visited.add(id(succ))
+                    stack.append((succ, iter(succ.nexts)))
+                    break
+            else:
+                stack.pop()
+                order.append(inst)
+    return order
+
+
+def worklist_priorities(equations) -> list[tuple[int, int]]:
+    """
+    The priority of each equation in the worklist: a smaller priority is
+    evaluated first. Equations are ordered by their instructions, in reverse
+    postorder for forward analyses, and in postorder for backward ones, so
+    that an equation usually runs after the equations it depends upon. Among
+    the equations of the same instruction, those that depend on the others
+    come last, e.g., OUT_p comes after IN_p in reaching definitions.
+
+    Example:
+        >>> from lang import Add, Mul
+        >>> Inst.next_index = 0
+        >>> i0 = Add('c', 'a', 'b')
+        >>> i1 = Mul('d', 'c', 'a')
+        >>> i0.add_next(i1)
+        >>> eqs = reaching_defs_constraint_gen([i0, i1])
+        >>> [eq.name() for _, eq in sorted(zip(worklist_priorities(eqs), eqs))]
+        ['IN_0', 'OUT_0', 'IN_1', 'OUT_1']
+    """
+    insts = list({id(eq.inst): eq.inst for eq in equations}.values())
+    order = postorder(insts)
+    if all(eq.forward for eq in equations):
+        order.reverse()
+    rank = {id(inst): i for i, inst in enumerate(order)}
+    names = {}
+    for eq in equations:
+        names.setdefault(id(eq.inst), set()).add(eq.name())
+    return [
+        (rank[id(eq.inst)], int(any(d in names[id(eq.inst)] for d in eq.deps())))
+        for eq in equations
+    ]
+
+
 def abstract_interp_worklist(equations) -> tuple[Env, int]:
     """
     This function solves the system of equations using a worklist. Once an
     equation E is evaluated, and the evaluation changes the environment, only
-    the dependencies of E are pushed onto the worklist.
+    the dependencies of E are pushed onto the worklist. The worklist is a
+    priority queue (see `worklist_priorities`): the next equation is always
+    the pending one that comes first in reverse postorder (or in postorder,
+    for backward analyses). An equation that is already in the worklist is
+    not pushed again. Returns the solution and the number of evaluations.
 
     Example for reaching-definition analysis:
+        >>> from lang import Add, Mul, Lth
         >>> Inst.next_index = 0
         >>> i0 = Add('c', 'a', 'b')
         >>> i1 = Mul('d', 'c', 'a')
@@ -368,10 +576,43 @@ def abstract_interp_worklist(equations) -> tuple[Env, int]:
         >>> (sol, num_evals) = abstract_interp_worklist(eqs)
         >>> f"OUT_0: {sorted(sol['OUT_0'])}"
         "OUT_0: [('c', 0)]"
+        >>> num_evals
+        4
+
+        >>> Inst.next_index = 0
+        >>> i0 = Add('x', 'a', 'b')
+        >>> i1 = Add('y', 'x', 'x')
+        >>> i2 = Lth('p', 'y', 'a')
+        >>> i3 = Bt('p')
+        >>> i0.add_next(i1)
+        >>> i1.add_next(i2)
+        >>> i2.add_next(i3)
+        >>> i3.add_next(i1)
+        >>> eqs = reaching_defs_constraint_gen([i0, i1, i2, i3])
+        >>> (sol, num_evals) = abstract_interp_worklist(eqs)
+        >>> sol == abstract_interp(eqs)[0], num_evals < abstract_interp(eqs)[1]
+        (True, True)
     """
-    # TODO: implement this method
-    from collections import defaultdict
+    import heapq
 
     DataFlowEq.num_evals = 0
-    env = defaultdict(list)
+    env = {eq.name(): set() for eq in equations}
+    dep_graph = build_dependence_graph(equations)
+    priorities = worklist_priorities(equations)
+    # Equations are identified by their positions in the list; the position
+    # breaks ties between equations of the same priority.
+    position = {id(eq): i for i, eq in enumerate(equations)}
+    worklist = [(priority, i) for i, priority in enumerate(priorities)]
+    heapq.heapify(worklist)
+    queued = set(range(len(equations)))
+    while worklist:
+        _, i = heapq.heappop(worklist)
+        queued.discard(i)
+        eq = equations[i]
+        if eq.eval(env):
+            for user in dep_graph[eq.name()]:
+                j = position[id(user)]
+                if j not in queued:
+                    queued.add(j)
+                    heapq.heappush(worklist, (priorities[j], j))
     return (env, DataFlowEq.num_evals)
@@ -1,6 +1,6 @@
 import sys
 import lang
-import parser
+import batch
 import dataflow
 
 from lang import interp
@@ -16,15 +16,29 @@ def worklist_solver(program):
     return dataflow.abstract_interp_worklist(equations)
 
 
-if __name__ == "__main__":
+def analyse(env, program):
     """
-    This function reads a program, and solves reaching definition analysis
-    for it, using either chaotic iterations or the worklist-based algorithm.
+    Solves reaching definitions with chaotic iterations and with the worklist
+    algorithm, and compares the two solutions.
     """
-    lang.Inst.next_index = 0
-    lines = sys.stdin.readlines()
-    env, program = parser.file2cfg_and_env(lines)
     (env_chaotic, n_chaotic) = chaotic_solver(program)
     (env_worklist, n_worklist) = worklist_solver(program)
     print(f"Are the environments the same? {env_chaotic == env_worklist}")
     print(f"Used less than {n_chaotic} iterations? {n_worklist <= n_chaotic}")
+
+
+if __name__ == "__main__":
+    """
+    This function reads a program, and solves reaching definition analysis
+    for it, using either chaotic iterations or the worklist-based algorithm.
+    The option "--cache=DIR" keeps parsed programs in the directory DIR (see
+    parsecache.py), and "--no-cache" turns it off again.
+    """
+    args, cache_dir = batch.cache_option(sys.argv[1:])
+    if args:
+        sys.exit(1 if batch.run_batch(args, analyse, cache_dir=cache_dir) else 0)
+    lang.Inst.next_index = 0
+    env, program = batch.parse_program(sys.stdin, cache_dir)
+    analyse(env, program)
+    if cache_dir is not None:
+        print(batch.parse_cache(cache_dir).stats(), file=sys.stderr)
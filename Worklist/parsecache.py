@@ -0,0 +1,224 @@
+"""
+This file implements an on-disk cache for the parser. Programs are identified
+by a hash of their text: parsing the same text again loads the program from
+the cache, in the binary format of cfgfile.py, instead of tokenizing its lines
+and resolving the targets of its branches. Each cached program is a file
+named after the hash of its text, in the cache directory. The cache is
+bounded in size: once the files in the directory take more than 'max_bytes',
+the least recently used ones are removed. Every hit updates the modification
+time of its file, and the files with the oldest times are removed first.
+
+The cache does not depend on the parser of the lab: the function that parses
+a program is given to the cache, e.g., `parser.file2cfg_and_env`. The examples
+below use a small parser of their own (see `_parse_example`).
+
+Example:
+    >>> import tempfile
+    >>> cache = ParseCache(tempfile.mkdtemp(), _parse_example)
+    >>> lines = ['{"a": 1, "b": 3, "c": 5}', 'x a b', 'x x c']
+    >>> for _ in range(3):
+    ...     env, prog = cache.parse(lines)
+    >>> interp(prog[0], env).get("x")
+    9
+    >>> cache.hits, cache.misses
+    (2, 1)
+"""
+
+import hashlib
+import json
+import os
+import struct
+import sys
+import tempfile
+import time
+
+import cfgfile
+from lang import Add, Env, interp
+
+
+def _parse_example(lines):
+    """
+    Parses programs whose instructions are additions, written as "dst src0
+    src1", for the examples of this file.
+
+    Example:
+        >>> env, prog = _parse_example(['{"a": 2}', 'x a a', 'y x a'])
+        >>> interp(prog[0], env).get("y")
+        6
+    """
+    insts = [Add(*line.split()) for line in lines[1:]]
+    for inst, next_inst in zip(insts, insts[1:]):
+        inst.add_next(next_inst)
+    return (Env(json.loads(lines[0])), insts)
+
+
+def _touch(path):
+    """
+    Sets the modification time of 'path' to the current time. The time is
+    read from the clock, because the file system might keep coarser times.
+    """
+    now = time.time_ns()
+    try:
+        os.utime(path, ns=(now, now))
+    except OSError:
+        pass
+
+
+def _source_hash(function):
+    """
+    The hash of the source file of the module that defines 'function', or
+    an empty string, if that file cannot be read.
+
+    Example:
+        >>> len(_source_hash(_parse_example)), _source_hash(len)
+        (32, b'')
+    """
+    module = sys.modules.get(getattr(function, "__module__", None))
+    try:
+        with open(module.__file__, "rb") as f:
+            return hashlib.sha256(f.read()).digest()
+    except (AttributeError, OSError):
+        return b""
+
+
+class ParseCache:
+    """
+    A directory of parsed programs, indexed by the hash of their text.
+    Programs that are not in the cache are parsed by 'parser', a function
+    that receives the list of lines of a program, and returns its
+    environment and its list of instructions. The counters 'hits', 'misses'
+    and 'evictions' count what happened since the cache was created. Several
+    processes can share the same directory: files are written under a
+    temporary name and then renamed, so that no process reads a file that is
+    not complete.
+
+    Example:
+        >>> import os, tempfile
+        >>> cache = ParseCache(tempfile.mkdtemp(), _parse_example, max_bytes=120)
+        >>> for n in range(4):
+        ...     _ = cache.parse([f'{{"a": {n}}}', 'x a a'])
+        >>> cache.misses, cache.evictions, len(os.listdir(cache.directory))
+        (4, 2, 2)
+        >>> env, _ = cache.parse(['{"a": 3}', 'x a a'])
+        >>> env.get("a"), cache.hits
+        (3, 1)
+    """
+
+    def __init__(s, directory, parser, max_bytes=64 * 2**20):
+        s.directory = directory
+        s.parser = parser
+        s.parser_hash = _source_hash(parser)
+        s.max_bytes = max_bytes
+        s.hits = 0
+        s.misses = 0
+        s.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def key(s, lines):
+        """
+        The hash that identifies a program whose text is 'lines'. The version
+        of the binary format and the source of the parser are part of the
+        hash, so that files written in an older format, or by an older
+        version of the parser, are never read.
+
+        Example:
+            >>> cache = ParseCache(tempfile.mkdtemp(), _parse_example)
+            >>> cache.key(["{}", "x = add a b"]) == cache.key(["{}\\n", "x = add a b"])
+            True
+        """
+        text = "\n".join(line.rstrip("\n") for line in lines)
+        data = b"%d\n" % cfgfile.VERSION + s.parser_hash + text.encode("utf-8")
+        return hashlib.sha256(data).hexdigest()
+
+    def path(s, key):
+        return os.path.join(s.directory, key + ".cfg")
+
+    def parse(s, lines, journal=False, slots=False):
+        """
+        Returns the environment and the program whose text is the list of
+        strings 'lines', like the parser does. If the program is in the
+        cache, then it is loaded from there. Otherwise, it is parsed and
+        stored into the cache. The arguments 'journal' and 'slots' are given
+        to the parser only if they are set, as the parsers of most labs do
+        not take them. Files in the cache that cannot be read, e.g., because
+        they are truncated or corrupt, are treated as misses, and replaced.
+
+        Example:
+            >>> cache = ParseCache(tempfile.mkdtemp(), _parse_example)
+            >>> lines = ['{"a": 2}', 'x a a']
+            >>> _ = cache.parse(lines)
+            >>> with open(cache.path(cache.key(lines)), "r+b") as f:
+            ...     _ = f.seek(-3, 2)
+            ...     _ = f.write(b"\\xff\\xff\\xff")
+            >>> env, prog = cache.parse(lines)
+            >>> interp(prog[0], env).get("x"), cache.hits, cache.misses
+            (4, 0, 2)
+        """
+        path = s.path(s.key(lines))
+        try:
+            result = cfgfile.load(path, journal=journal, slots=slots)
+        except (OSError, ValueError, LookupError, struct.error):
+            pass
+        else:
+            s.hits += 1
+            _touch(path)
+            return result
+        s.misses += 1
+        options = {}
+        if journal is not False:
+            options["journal"] = journal
+        if slots:
+            options["slots"] = slots
+        env, insts = s.parser(lines, **options)
+        s.store(path, insts, env)
+        return (env, insts)
+
+    def store(s, path, insts, env):
+        """
+        Writes the program into the file 'path' of the cache, and then evicts
+        the least recently used files, if the cache is too large.
+        """
+        fd, tmp = tempfile.mkstemp(dir=s.directory, suffix=".tmp")
+        os.close(fd)
+        try:
+            cfgfile.save(tmp, insts, env)
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        _touch(path)
+        s.evict()
+
+    def evict(s):
+        """
+        Removes the files with the oldest modification times until the files
+        of the cache take at most 'max_bytes' bytes.
+        """
+        entries = []
+        for entry in os.scandir(s.directory):
+            if entry.name.endswith(".cfg"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= s.max_bytes:
+                break
+            try:
+                os.remove(path)
+                s.evictions += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def stats(s):
+        """
+        A line that summarizes the counters of the cache.
+
+        Example:
+            >>> ParseCache(tempfile.mkdtemp(), _parse_example).stats()
+            'parse cache: 0 hits, 0 misses, 0 evictions'
+        """
+        return f"parse cache: {s.hits} hits, {s.misses} misses, {s.evictions} evictions"